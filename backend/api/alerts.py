@@ -0,0 +1,132 @@
+"""告警规则和告警事件相关的API路由"""
+from typing import List, Optional
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from core.database import get_db
+from models.alert_rule import AlertRuleModel
+from schemas.alert import AlertRule, AlertRuleUpdate, AlertEvent
+from schemas.user import User
+from services import alert_rules, sensor_config_service
+from api.auth import get_current_active_user, require_admin
+
+router = APIRouter()
+
+
+def _rule_response(rule: AlertRuleModel) -> dict:
+    """告警规则附带所属设备和传感器类型"""
+    return {
+        "id": rule.id,
+        "sensor_config_id": rule.sensor_config_id,
+        "device_id": rule.sensor_config.device_id,
+        "type": rule.sensor_config.type,
+        "enabled": rule.enabled,
+        "warning_high": rule.warning_high,
+        "alert_high": rule.alert_high,
+        "warning_low": rule.warning_low,
+        "alert_low": rule.alert_low,
+        "hysteresis": rule.hysteresis,
+        "min_duration_seconds": rule.min_duration_seconds,
+        "updated_at": rule.updated_at,
+    }
+
+
+@router.get("/rules", response_model=List[AlertRule])
+def get_alert_rules(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取所有告警规则（需要认证）"""
+    return [_rule_response(rule) for rule in alert_rules.get_alert_rules(db)]
+
+
+@router.get("/rules/device/{device_id}/type/{sensor_type}", response_model=AlertRule)
+def get_alert_rule(
+    device_id: int,
+    sensor_type: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取传感器的告警规则（需要认证）"""
+    config = sensor_config_service.get_sensor_config_by_device_and_type(db, device_id, sensor_type)
+    if not config:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    rule = alert_rules.get_alert_rule(db, config.id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return _rule_response(rule)
+
+
+@router.put("/rules/device/{device_id}/type/{sensor_type}", response_model=AlertRule)
+def update_alert_rule(
+    device_id: int,
+    sensor_type: str,
+    update_data: AlertRuleUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    创建或更新传感器的告警规则（仅管理员，立即对数据接收生效）
+
+    - 读数高于 alert_high 或低于 alert_low 为 alert，高于 warning_high 或低于 warning_low 为 warning
+    - hysteresis: 告警恢复时读数需回到阈值以内该幅度，避免在阈值附近反复变化
+    - min_duration_seconds: 读数持续超过阈值该时间后才升级告警
+
+    没有告警规则的传感器按类型使用默认阈值（温度 28 / 30，湿度 65 / 70）。
+    """
+    if update_data.warning_high is not None and update_data.alert_high is not None \
+            and update_data.warning_high > update_data.alert_high:
+        raise HTTPException(status_code=400, detail="warning_high must not exceed alert_high")
+    if update_data.warning_low is not None and update_data.alert_low is not None \
+            and update_data.warning_low < update_data.alert_low:
+        raise HTTPException(status_code=400, detail="warning_low must not be below alert_low")
+
+    config = sensor_config_service.get_sensor_config_by_device_and_type(db, device_id, sensor_type)
+    if not config:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    rule = alert_rules.upsert_alert_rule(db, config.id, **update_data.model_dump())
+    return _rule_response(rule)
+
+
+@router.delete("/rules/device/{device_id}/type/{sensor_type}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_alert_rule(
+    device_id: int,
+    sensor_type: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """删除传感器的告警规则，恢复按类型的默认阈值（仅管理员）"""
+    config = sensor_config_service.get_sensor_config_by_device_and_type(db, device_id, sensor_type)
+    if not config or not alert_rules.delete_alert_rule(db, config.id):
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return None
+
+
+@router.get("/events", response_model=List[AlertEvent])
+def get_alert_events(
+    device_id: Optional[int] = Query(None, description="设备ID，为空则返回所有设备"),
+    sensor_type: Optional[str] = Query(None, description="传感器类型"),
+    start_time: Optional[datetime] = Query(None, description="开始时间（ISO 格式）"),
+    end_time: Optional[datetime] = Query(None, description="结束时间（ISO 格式）"),
+    limit: int = Query(100, ge=1, le=1000, description="最多返回的事件数量"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取告警事件（告警状态变化记录，按时间倒序，需要认证）"""
+    events = alert_rules.get_alert_events(db, device_id, sensor_type, start_time, end_time, limit)
+    return [
+        {
+            "id": event.id,
+            "sensor_config_id": event.sensor_config_id,
+            "device_id": config.device_id,
+            "type": config.type,
+            "display_name": config.display_name,
+            "previous_status": event.previous_status,
+            "status": event.status,
+            "value": event.value,
+            "timestamp": event.timestamp,
+        }
+        for event, config in events
+    ]
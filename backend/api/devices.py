@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.database import get_db, get_read_db
 from schemas.device import Device, DeviceCreate, DeviceUpdate
 from schemas.user import User
 from services import device_service as device_service_module
@@ -25,7 +25,7 @@ def require_admin_or_readonly(current_user: User = Depends(get_current_active_us
 def get_devices(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取设备列表（需要认证）"""
@@ -36,7 +36,7 @@ def get_devices(
 @router.get("/{device_id}", response_model=Device)
 def get_device(
     device_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取单个设备（需要认证）"""
@@ -49,7 +49,7 @@ def get_device(
 @router.get("/{device_id}/publish-topic")
 def get_device_publish_topic_api(
     device_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取设备的发布主题（用于继电器控制等）"""
@@ -148,7 +148,7 @@ def update_relay_in_display_name(
 @router.get("/{device_id}/latest-sensors", response_model=List[SensorData])
 def get_latest_device_sensors(
     device_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取设备的最新传感器数据（需要认证）"""
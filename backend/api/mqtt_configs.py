@@ -7,6 +7,7 @@ from core.database import get_db
 from schemas.mqtt_config import MQTTConfig, MQTTConfigCreate, MQTTConfigUpdate
 from schemas.user import User
 from services import mqtt_config_service as mqtt_config_service_module
+from services.mqtt_service import get_mqtt_service
 from api.auth import get_current_active_user, require_admin
 
 router = APIRouter()
@@ -23,6 +24,14 @@ def get_mqtt_configs(
     return mqtt_config_service_module.get_mqtt_configs(db, skip=skip, limit=limit)
 
 
+@router.get("/connections")
+def get_mqtt_connections(
+    current_user: User = Depends(require_admin)
+):
+    """获取各MQTT服务器客户端的连接状态（仅管理员）"""
+    return get_mqtt_service().get_broker_status()
+
+
 @router.get("/{config_id}", response_model=MQTTConfig)
 def get_mqtt_config(
     config_id: int, 
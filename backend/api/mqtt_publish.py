@@ -1,13 +1,18 @@
 """MQTT消息发布API"""
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+from core.config import settings
 from core.database import get_db
 from schemas.user import User
+from services import device_service
 from services.mqtt_service import get_mqtt_service
+from services.publish_tracker import STATUS_FAILED, STATUS_PENDING, STATUS_PUBLISHED
 from core.logging_config import get_logger
-from api.auth import require_admin
+from api.auth import require_admin, get_current_active_user
 
 logger = get_logger(__name__)
 
@@ -19,37 +24,161 @@ class MQTTPublishRequest(BaseModel):
     topic: str
     message: str = ""
     qos: int = 0
+    # 继电器命令：指定设备后按设备上报的继电器状态确认命令是否生效（/relay/commands 查询）
+    device_id: Optional[int] = None
+    sensor_type: Optional[str] = None  # 用于确认的继电器状态类型，为空则使用 relay_status / Relay Status
+    expected_value: Optional[int] = Field(default=None, ge=0, le=1)  # 期望状态，为空则按设备的开启/关闭消息判断
+
+
+class RelayBulkRequest(BaseModel):
+    """批量继电器命令请求：按设备ID列表、位置（房间）或主题配置选择设备，多个条件同时满足"""
+    action: Literal["on", "off"]
+    device_ids: Optional[List[int]] = None
+    location: Optional[str] = None
+    topic_config_id: Optional[int] = None
+    qos: int = Field(default=1, ge=0, le=2)
 
 
-@router.post("/publish")
-async def publish_message(
+@router.post("/publish", status_code=202)
+def publish_message(
     request: MQTTPublishRequest, 
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """发布消息到MQTT主题（仅管理员）"""
-    try:
-        mqtt_service = get_mqtt_service()
-        success = mqtt_service.publish_message(request.topic, request.message, request.qos)
-        
-        if success:
-            return {
-                "success": True,
-                "message": f"消息已成功发布到主题 {request.topic}",
-                "topic": request.topic,
-                "payload": request.message
-            }
+    """
+    发布消息到MQTT主题（仅管理员）
+    
+    不等待MQTT服务器，提交后立即返回 command_id，发布结果通过 /commands/{command_id} 查询。
+    指定 device_id 时作为继电器命令登记，设备上报的继电器状态确认结果通过 /relay/commands 查询。
+    """
+    expected_value = request.expected_value
+    if request.device_id is not None and expected_value is None:
+        device = device_service.get_device(db, request.device_id)
+        if not device:
+            raise HTTPException(status_code=404, detail="Device not found")
+        if request.message == device_service.get_device_relay_payload(db, device, True):
+            expected_value = 1
+        elif request.message == device_service.get_device_relay_payload(db, device, False):
+            expected_value = 0
         else:
-            raise HTTPException(
-                status_code=500,
-                detail="发布消息失败，请检查MQTT连接状态"
-            )
-    except Exception as e:
-        logger.error(f"发布消息API错误: {e}", exc_info=True)
+            raise HTTPException(status_code=400, detail="expected_value is required for this message")
+    
+    mqtt_service = get_mqtt_service()
+    command = mqtt_service.publish_async(request.topic, request.message, request.qos)
+    
+    if command.status == STATUS_FAILED:
         raise HTTPException(
-            status_code=500,
-            detail=f"发布消息时出错: {str(e)}"
+            status_code=503,
+            detail=f"发布消息失败: {command.error}"
+        )
+    if request.device_id is not None:
+        mqtt_service.relay_commands.register(
+            command.command_id, request.device_id, expected_value, request.sensor_type, command.created_at
         )
+    return {
+        "success": True,
+        "message": f"消息已提交发布到主题 {request.topic}",
+        "topic": request.topic,
+        "payload": request.message,
+        "command_id": command.command_id,
+        "status": command.status
+    }
+
+
+@router.get("/commands/{command_id}")
+def get_publish_command(
+    command_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """查询发布命令的结果：pending / published / failed / timeout（需要认证）"""
+    command = get_mqtt_service().publish_tracker.get(command_id)
+    if command is None:
+        raise HTTPException(status_code=404, detail="Publish command not found")
+    return command.to_dict()
+
+
+@router.post("/relay/bulk")
+def publish_relay_bulk(
+    request: RelayBulkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    批量发送继电器开启/关闭命令（仅管理员）
+    
+    每个设备的消息取自设备（或其主题配置）的 relay_on_payload / relay_off_payload，
+    发布主题取自设备的发布主题。所有消息以流水线方式发布（同时在途的消息数有上限），
+    等待确认后一次返回每个设备的结果。
+    """
+    if request.device_ids is None and request.location is None and request.topic_config_id is None:
+        raise HTTPException(status_code=400, detail="device_ids, location or topic_config_id is required")
+    
+    devices = device_service.get_devices_by_selector(
+        db, request.device_ids, request.location, request.topic_config_id
+    )
+    turn_on = request.action == "on"
+    
+    results = []
+    messages = []
+    for device in devices:
+        result = {
+            "device_id": device.id,
+            "device_name": device.name,
+            "topic": device_service.get_device_publish_topic(db, device),
+            "payload": device_service.get_device_relay_payload(db, device, turn_on),
+            "command_id": None,
+            "status": STATUS_FAILED,
+            "error": None,
+        }
+        if result["payload"]:
+            messages.append((result["topic"], result["payload"]))
+        else:
+            result["error"] = "未配置继电器控制格式"
+        results.append(result)
+    
+    mqtt_service = get_mqtt_service()
+    commands = iter(mqtt_service.publish_bulk(
+        messages, qos=request.qos, max_in_flight=settings.mqtt_bulk_max_in_flight
+    ))
+    for result in results:
+        if result["payload"]:
+            command = next(commands)
+            result.update(command_id=command.command_id, status=command.status, error=command.error)
+            if command.status != STATUS_FAILED:
+                mqtt_service.relay_commands.register(
+                    command.command_id, result["device_id"], turn_on, created_at=command.created_at
+                )
+    
+    published = sum(1 for result in results if result["status"] == STATUS_PUBLISHED)
+    pending = sum(1 for result in results if result["status"] == STATUS_PENDING)
+    logger.info(f"批量继电器命令 {request.action}: 共 {len(results)} 个设备，成功 {published} 个，未确认 {pending} 个")
+    return {
+        "action": request.action,
+        "total": len(results),
+        "published": published,
+        "pending": pending,  # 等待超时仍未确认，可通过 /commands/{command_id} 继续查询
+        "failed": len(results) - published - pending,
+        "results": results
+    }
+
+
+@router.get("/relay/commands")
+def get_relay_commands(
+    device_id: Optional[List[int]] = Query(None, description="设备ID，可重复，为空则返回所有设备"),
+    command_id: Optional[List[str]] = Query(None, description="命令ID，可重复"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    查询最近继电器命令的确认结果（内存查询，需要认证）
+    
+    - pending: 等待设备上报继电器状态
+    - confirmed: 设备上报的状态与命令一致
+    - contradicted: 命令发出一段时间后设备上报的状态仍与命令不一致
+    - timeout: 超时没有收到设备上报
+    - superseded: 确认前同一继电器又发出了新命令
+    """
+    commands = get_mqtt_service().relay_commands.query(device_id, command_id)
+    return [command.to_dict() for command in commands]
 
 
 @router.get("/clients")
@@ -0,0 +1,79 @@
+"""数据保留策略和保留任务相关的API路由"""
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from core.database import get_db
+from schemas.retention import RetentionPolicy, RetentionPolicyUpdate
+from schemas.user import User
+from services import retention
+from api.auth import require_admin
+
+router = APIRouter()
+
+
+@router.get("/policies", response_model=List[RetentionPolicy])
+def get_retention_policies(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """获取所有保留策略（仅管理员）"""
+    return retention.get_retention_policies(db)
+
+
+@router.put("/policies", response_model=RetentionPolicy)
+def update_retention_policy(
+    update_data: RetentionPolicyUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    创建或更新设备 / 传感器类型的保留策略（仅管理员，下次保留任务生效）
+
+    - 同时指定 device_id 和 sensor_type 时只作用于该设备的该类传感器
+    - 同一传感器匹配多条策略时：设备+类型 > 设备 > 类型 > 全局设置 RETENTION_*_DAYS
+    - 天数为空表示沿用下一级策略，0 表示永久保留
+    """
+    if update_data.device_id is None and update_data.sensor_type is None:
+        raise HTTPException(status_code=400, detail="device_id or sensor_type is required")
+    fields = update_data.model_dump(exclude={"device_id", "sensor_type"})
+    return retention.upsert_retention_policy(db, update_data.device_id, update_data.sensor_type, **fields)
+
+
+@router.delete("/policies/{policy_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_retention_policy(
+    policy_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """删除保留策略（仅管理员）"""
+    if not retention.delete_retention_policy(db, policy_id):
+        raise HTTPException(status_code=404, detail="Retention policy not found")
+    return None
+
+
+@router.get("/status")
+def get_retention_status(current_user: User = Depends(require_admin)):
+    """
+    保留任务状态（仅管理员）
+
+    last_run 为最近一次执行结果：各类数据删除的行数、删除的分区、释放的空间（字节）和耗时；
+    leader 为 false 时保留任务由本机的其他进程执行
+    """
+    from core.config import settings
+    result = retention.get_retention_scheduler().status()
+    result["enabled"] = settings.retention_enabled
+    return result
+
+
+@router.post("/run", status_code=202)
+def run_retention(current_user: User = Depends(require_admin)):
+    """立即执行一次保留任务（仅管理员，在后台线程中执行，结果通过 /status 查询）"""
+    scheduler = retention.get_retention_scheduler()
+    if not scheduler.is_running():
+        raise HTTPException(status_code=409, detail="Retention scheduler is not running")
+    if not scheduler.is_leader():
+        raise HTTPException(status_code=409, detail="Retention runs in another process")
+    scheduler.trigger()
+    return {"message": "Retention run triggered"}
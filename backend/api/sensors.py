@@ -5,10 +5,11 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from core.database import get_db
-from schemas.sensor import SensorData, SensorDataUpdate
+from core.database import get_db, get_read_db
+from schemas.sensor import SensorData, SensorDataUpdate, SensorStoragePolicy, SensorStoragePolicyUpdate
 from schemas.user import User
 from services import sensor_service as sensor_service_module
+from services import sensor_rollups
 from api.auth import get_current_active_user, require_admin
 
 router = APIRouter()
@@ -17,7 +18,7 @@ router = APIRouter()
 @router.get("/device/{device_id}", response_model=List[SensorData])
 def get_device_sensors(
     device_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取设备的所有传感器数据（需要认证）"""
@@ -28,7 +29,7 @@ def get_device_sensors(
 @router.get("/device/{device_id}/latest", response_model=List[SensorData])
 def get_latest_device_sensors(
     device_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取设备的最新传感器数据（按类型分组，需要认证）"""
@@ -59,7 +60,11 @@ def get_device_sensor_history(
         None,
         description="最多返回的数据点数量"
     ),
-    db: Session = Depends(get_db),
+    resolution: Optional[str] = Query(
+        None,
+        description="数据粒度：raw（原始读数）/ 1m / 1h / 1d（汇总），不传则按时间范围自动选择"
+    ),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -67,6 +72,8 @@ def get_device_sensor_history(
 
     优先使用 time_range（day/week/month）自动计算时间范围；
     如果未提供 time_range，则使用 start_time / end_time。
+    时间范围不超过 2 天返回原始读数，更长的范围返回小时（超过 90 天为天）汇总，
+    每个时间段一个点（value 为平均值）。
     """
     # 计算时间范围
     if time_range:
@@ -92,6 +99,25 @@ def get_device_sensor_history(
         start_dt = datetime.fromisoformat(start_time) if start_time else None
         end_dt = datetime.fromisoformat(end_time) if end_time else None
 
+    if resolution is None:
+        resolution = sensor_rollups.choose_resolution(start_dt, end_dt)
+    elif resolution not in sensor_rollups.RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid resolution. Use one of: {', '.join(sensor_rollups.RESOLUTIONS)}."
+        )
+
+    if resolution != sensor_rollups.RESOLUTION_RAW:
+        return sensor_service_module.get_device_sensor_rollups(
+            db=db,
+            device_id=device_id,
+            resolution=resolution,
+            sensor_type=sensor_type,
+            start_time=start_dt,
+            end_time=end_dt,
+            limit=limit,
+        )
+
     sensors = sensor_service_module.get_device_sensors_by_time_range(
         db=db,
         device_id=device_id,
@@ -106,7 +132,7 @@ def get_device_sensor_history(
 @router.get("/latest", response_model=List[SensorData])
 def get_latest_sensors(
     limit: int = 50, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """获取最新的传感器数据（需要认证）"""
@@ -144,4 +170,59 @@ def update_sensor_display_name_by_type(
     )
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
-    return sensor
\ No newline at end of file
+    return sensor
+
+
+@router.get("/device/{device_id}/type/{sensor_type}/storage-policy", response_model=SensorStoragePolicy)
+def get_sensor_storage_policy(
+    device_id: int,
+    sensor_type: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取传感器的存储策略（需要认证）"""
+    from services import sensor_config_service
+    
+    config = sensor_config_service.get_sensor_config_by_device_and_type(db, device_id, sensor_type)
+    if not config:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return config
+
+
+@router.put("/device/{device_id}/type/{sensor_type}/storage-policy", response_model=SensorStoragePolicy)
+def update_sensor_storage_policy(
+    device_id: int,
+    sensor_type: str,
+    update_data: SensorStoragePolicyUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    更新传感器的存储策略（仅管理员）
+    
+    - always: 每条读数都写入
+    - on_change: 值变化时写入
+    - deadband / deadband_pct: 与上次写入值的差达到死区（绝对值 / 百分比）时写入
+    - interval: 每隔 min_interval_seconds 写入一次
+    
+    min_interval_seconds 限制两次写入的最小间隔，heartbeat_seconds 在长时间没有写入时强制写入一条。
+    """
+    from services import sensor_config_service
+    
+    if update_data.storage_policy in ("deadband", "deadband_pct") and update_data.deadband is None:
+        raise HTTPException(status_code=400, detail="deadband is required for deadband policies")
+    if update_data.storage_policy == "interval" and not update_data.min_interval_seconds:
+        raise HTTPException(status_code=400, detail="min_interval_seconds is required for interval policy")
+    
+    config = sensor_config_service.update_sensor_config_storage_policy(
+        db,
+        device_id,
+        sensor_type,
+        update_data.storage_policy,
+        deadband=update_data.deadband,
+        min_interval_seconds=update_data.min_interval_seconds,
+        heartbeat_seconds=update_data.heartbeat_seconds
+    )
+    if not config:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return config
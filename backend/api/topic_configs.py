@@ -1,5 +1,5 @@
 """主题配置相关的API路由"""
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
@@ -7,6 +7,7 @@ from core.database import get_db
 from schemas.topic_config import TopicConfig, TopicConfigCreate, TopicConfigUpdate
 from schemas.user import User
 from services import topic_config_service as topic_config_service_module
+from services import payload_codecs
 from api.auth import get_current_active_user, require_admin
 
 router = APIRouter()
@@ -43,6 +44,7 @@ def create_topic_config(
     current_user: User = Depends(require_admin)
 ):
     """创建主题配置（仅管理员）"""
+    _validate_payload_codec(config.payload_codec, config.codec_options)
     return topic_config_service_module.create_topic_config(db, config)
 
 
@@ -54,7 +56,17 @@ def update_topic_config(
     current_user: User = Depends(require_admin)
 ):
     """更新主题配置（仅管理员）"""
-    # 如果更新了激活状态，需要重启MQTT服务
+    fields = config_update.model_fields_set
+    if "payload_codec" in fields or "codec_options" in fields:
+        existing = topic_config_service_module.get_topic_config(db, config_id)
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Topic Config not found")
+        _validate_payload_codec(
+            config_update.payload_codec if "payload_codec" in fields else existing.payload_codec,
+            config_update.codec_options if "codec_options" in fields else existing.codec_options
+        )
+
+    # 如果更新了激活状态
     if config_update.is_active is not None:
         if config_update.is_active:
             success = topic_config_service_module.activate_topic_config(db, config_id)
@@ -62,14 +74,14 @@ def update_topic_config(
             success = topic_config_service_module.deactivate_topic_config(db, config_id)
         if not success:
             raise HTTPException(status_code=404, detail="Topic Config not found")
-        
-        # 重启MQTT服务以应用新的订阅设置
-        from services.mqtt_service import restart_mqtt_service
-        restart_mqtt_service()
     
     config = topic_config_service_module.update_topic_config(db, config_id, config_update)
     if not config:
         raise HTTPException(status_code=404, detail="Topic Config not found")
+    
+    # 在后台增量调整订阅（激活状态、订阅主题或MQTT服务器可能已变化）
+    from services.mqtt_service import schedule_reconcile
+    schedule_reconcile()
     return config
 
 
@@ -84,9 +96,9 @@ def delete_topic_config(
     if not success:
         raise HTTPException(status_code=404, detail="Topic Config not found")
     
-    # 重启MQTT服务以更新订阅列表
-    from services.mqtt_service import restart_mqtt_service
-    restart_mqtt_service()
+    # 在后台退订已删除配置的主题
+    from services.mqtt_service import schedule_reconcile
+    schedule_reconcile()
     
     return None
 
@@ -102,9 +114,19 @@ def activate_topic_config(
     if not success:
         raise HTTPException(status_code=404, detail="Topic Config not found")
     
-    # 重启MQTT服务
-    from services.mqtt_service import restart_mqtt_service
-    restart_mqtt_service()
+    # 在后台订阅新激活的主题
+    from services.mqtt_service import schedule_reconcile
+    schedule_reconcile()
     
     config = topic_config_service_module.get_topic_config(db, config_id)
-    return config
\ No newline at end of file
+    return config
+
+
+def _validate_payload_codec(payload_codec: Optional[str], codec_options: Optional[str]):
+    """校验消息编解码器名称和选项，无效时返回400"""
+    if not payload_codec:
+        return
+    try:
+        payload_codecs.create_codec(payload_codec, codec_options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+以已有的原始读数重建传感器数据汇总（1 分钟 / 1 小时 / 1 天）
+
+新写入的读数由写缓冲增量更新汇总；升级前已有的数据、或汇总与原始读数不一致时，
+用本脚本按天重建。每天一个事务，可以在应用运行时执行。
+
+用法:
+    python backfill_sensor_rollups.py                          # 重建所有数据的汇总
+    python backfill_sensor_rollups.py --start 2026-01-01       # 从指定日期开始重建
+    python backfill_sensor_rollups.py --start 2026-01-01 --end 2026-02-01
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, SessionLocal, engine
+from services import sensor_partitions, sensor_rollups
+
+
+def parse_day(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以原始读数重建传感器数据汇总")
+    parser.add_argument("--start", type=parse_day, help="开始日期 YYYY-MM-DD（UTC，默认最早的读数）")
+    parser.add_argument("--end", type=parse_day, help="结束日期 YYYY-MM-DD（UTC，不含当天，默认最新的读数之后）")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        start, end = args.start, args.end
+        if start is None:
+            oldest = sensor_partitions.fetch_rows(db, limit=1)
+            if not oldest:
+                print("没有原始读数，无需重建")
+                return
+            start = sensor_rollups.bucket_start(oldest[0].timestamp, sensor_rollups.RESOLUTION_DAY)
+        if end is None:
+            newest = sensor_partitions.fetch_rows(db, limit=1, newest_first=True)
+            last = newest[0].timestamp if newest else start
+            end = sensor_rollups.bucket_start(last, sensor_rollups.RESOLUTION_DAY) + timedelta(days=1)
+        if end <= start:
+            parser.error("--end 必须晚于 --start")
+
+        print(f"重建汇总: {start:%Y-%m-%d} ~ {end:%Y-%m-%d}（不含）")
+        started = time.perf_counter()
+        total = 0
+        day = start
+        while day < end:
+            next_day = day + timedelta(days=1)
+            try:
+                count = sensor_rollups.rebuild(db, day, next_day)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            total += count
+            if count:
+                print(f"  {day:%Y-%m-%d}: {count} 条汇总")
+            day = next_day
+
+        print(f"完成：共写入 {total} 条汇总，耗时 {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
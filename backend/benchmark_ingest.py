@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+MQTT数据接收吞吐基准测试
+
+不连接MQTT服务器，直接把 (topic, payload) 消息流送入 MQTTService.process_sensor_data，
+写入临时SQLite数据库，统计每秒处理消息数、单条消息处理延迟（p50/p99）和写入的读数条数。
+
+用法:
+    python benchmark_ingest.py                         # 运行全部场景
+    python benchmark_ingest.py -s json_config -n 20000 # 只运行指定场景
+    python benchmark_ingest.py --replay messages.jsonl # 回放录制的消息（每行 {"topic": ..., "payload": ...}）
+    python benchmark_ingest.py --replay data/mqtt_capture  # 回放 MQTT_CAPTURE_ENABLED 录制的文件或目录
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models.mqtt_config import MQTTConfigModel
+from models.topic_config import TopicConfigModel
+from services import sensor_config_service, topic_config_service, payload_parser, payload_codecs, sensor_partitions
+from services.mqtt_service import MQTTService
+from services.traffic_capture import is_capture_file, read_capture
+
+Message = Tuple[str, Union[str, bytes]]
+
+# 带JSON解析配置的主题
+JSON_PARSE_CONFIG = {
+    "temperature": {"type": "temperature", "unit": "°C", "display_name": "温度"},
+    "humidity": {"type": "humidity", "unit": "%", "display_name": "湿度"},
+    "relay1": {"type": "relay1", "unit": "", "display_name": "继电器1"},
+    "voltage": {"type": "voltage", "unit": "V"},
+}
+
+# 定长结构体主题：温度、湿度（0.1精度的 int16）和继电器状态（uint8）
+STRUCT_CODEC_OPTIONS = {
+    "format": "<hhB",
+    "fields": [
+        {"type": "Temperature1", "scale": 0.1, "unit": "°C"},
+        {"type": "Humidity1", "scale": 0.1, "unit": "%"},
+        "Relay Status",
+    ],
+}
+STRUCT_FORMAT = struct.Struct(STRUCT_CODEC_OPTIONS["format"])
+
+
+def gen_json_config(i: int, devices: int) -> Message:
+    payload = {
+        "temperature": round(random.uniform(18, 32), 1),
+        "humidity": round(random.uniform(30, 80), 1),
+        "relay1": random.choice(["on", "off"]),
+        "voltage": round(random.uniform(3.0, 3.6), 2),
+    }
+    return f"benchcfg/dev{i % devices}/data", json.dumps(payload)
+
+
+def gen_default_json(i: int, devices: int) -> Message:
+    payload = {
+        "Temperature1": round(random.uniform(18, 32), 1),
+        "Humidity1": round(random.uniform(30, 80), 1),
+        "relay2": random.randint(0, 1),
+        "PB8 Level": random.randint(0, 1),
+    }
+    return f"benchjson/dev{i % devices}/data", json.dumps(payload)
+
+
+def gen_text(i: int, devices: int) -> Message:
+    payload = (
+        f"Temperature1: {random.uniform(18, 32):.1f} C, Humidity1: {random.uniform(30, 80):.1f} %, "
+        f"Temperature2: {random.uniform(18, 32):.1f} C, Humidity2: {random.uniform(30, 80):.1f} %, "
+        f"Relay Status: {random.randint(0, 1)}, PB8 Level: {random.randint(0, 1)}"
+    )
+    return f"benchtext/dev{i % devices}/data", payload
+
+
+def gen_batch(i: int, devices: int) -> Message:
+    # 设备离线缓存后补发：一条消息包含10组带时间偏移的读数
+    payload = {
+        "base_ts": int(time.time()) - 600,
+        "readings": [
+            {"offset": k * 60, "Temperature1": round(random.uniform(18, 32), 1),
+             "Humidity1": round(random.uniform(30, 80), 1)}
+            for k in range(10)
+        ],
+    }
+    return f"benchbatch/dev{i % devices}/data", json.dumps(payload)
+
+
+def gen_struct(i: int, devices: int) -> Message:
+    payload = STRUCT_FORMAT.pack(
+        random.randint(180, 320), random.randint(300, 800), random.randint(0, 1)
+    )
+    return f"benchstruct/dev{i % devices}/data", payload
+
+
+def gen_relay(i: int, devices: int) -> Message:
+    return f"benchrelay/dev{i % devices}/cmd", random.choice(["relayon", "relayoff"])
+
+
+SCENARIOS: Dict[str, Callable[[int, int], Message]] = {
+    "json_config": gen_json_config,
+    "default_json": gen_default_json,
+    "text": gen_text,
+    "batch": gen_batch,
+    "struct": gen_struct,
+    "relay": gen_relay,
+}
+
+
+def load_replay(path: str) -> List[Message]:
+    """读取录制的消息（MQTT录制文件/目录，或 JSON Lines，每行包含 topic 和 payload）"""
+    if os.path.isdir(path) or is_capture_file(path):
+        return [
+            (message.topic, message.payload)
+            for message in read_capture(path)
+        ]
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                messages.append((record["topic"], record["payload"]))
+    return messages
+
+
+def setup_database(db_path: str):
+    """创建临时数据库并写入基准测试用的主题配置"""
+    engine = create_database_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    bind_engine(engine)
+
+    db = SessionLocal()
+    mqtt_config = MQTTConfigModel(name="benchmark", server="127.0.0.1", port=1883, is_active=True)
+    db.add(mqtt_config)
+    db.commit()
+    db.add(TopicConfigModel(
+        name="benchcfg",
+        subscribe_topics="benchcfg/+/data",
+        is_active=True,
+        mqtt_config_id=mqtt_config.id,
+        json_parse_config=json.dumps(JSON_PARSE_CONFIG, ensure_ascii=False)
+    ))
+    db.add(TopicConfigModel(
+        name="benchstruct",
+        subscribe_topics="benchstruct/+/data",
+        is_active=True,
+        mqtt_config_id=mqtt_config.id,
+        payload_codec="struct",
+        codec_options=json.dumps(STRUCT_CODEC_OPTIONS, ensure_ascii=False)
+    ))
+    db.commit()
+    db.close()
+    return engine
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name: str, messages: Iterable[Message], warmup: List[Message]) -> Dict[str, float]:
+    """运行一个场景，返回统计结果"""
+    service = MQTTService()
+    service.write_buffer.start()
+    try:
+        # 预热：每个主题先处理一条消息，建立设备、传感器配置和路由缓存
+        for topic, payload in warmup:
+            service.process_sensor_data(payload, topic)
+        service.write_buffer.flush()
+        rows_before = service.write_buffer.rows_written
+
+        latencies = []
+        start = time.perf_counter()
+        for topic, payload in messages:
+            t0 = time.perf_counter()
+            service.process_sensor_data(payload, topic)
+            latencies.append(time.perf_counter() - t0)
+        # 总耗时包含缓冲中剩余读数的写入
+        service.write_buffer.stop()
+        elapsed = time.perf_counter() - start
+    finally:
+        service.write_buffer.stop()
+        service.stop()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "scenario": name,
+        "messages": count,
+        "seconds": elapsed,
+        "msgs_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rows": service.write_buffer.rows_written - rows_before,
+    }
+
+
+def print_results(results: List[Dict[str, float]]):
+    print()
+    print(f"{'场景':<14}{'消息数':>10}{'msgs/s':>12}{'p50(ms)':>10}{'p99(ms)':>10}{'写入读数':>12}")
+    print("-" * 68)
+    for r in results:
+        print(
+            f"{r['scenario']:<14}{r['messages']:>10}{r['msgs_per_sec']:>12.0f}"
+            f"{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['rows']:>12}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT数据接收吞吐基准测试")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="要运行的场景（可重复指定，默认全部）")
+    parser.add_argument("-n", "--messages", type=int, default=5000, help="每个场景的消息数")
+    parser.add_argument("-d", "--devices", type=int, default=20, help="模拟的设备数")
+    parser.add_argument("--replay", help="回放录制的消息（MQTT录制文件/目录或 JSON Lines），代替合成场景")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    random.seed(args.seed)
+
+    tmp_dir = tempfile.mkdtemp(prefix="ingest-bench-")
+    engine = setup_database(os.path.join(tmp_dir, "bench.db"))
+    results = []
+    try:
+        if args.replay:
+            messages = load_replay(args.replay)
+            first_per_topic = list({topic: (topic, payload) for topic, payload in messages}.values())
+            results.append(run_scenario("replay", messages, first_per_topic))
+        else:
+            for name in args.scenario or list(SCENARIOS):
+                generate = SCENARIOS[name]
+                warmup = [generate(i, args.devices) for i in range(args.devices)]
+                messages = [generate(i, args.devices) for i in range(args.messages)]
+                results.append(run_scenario(name, messages, warmup))
+
+        db = SessionLocal()
+        total_rows = sensor_partitions.count_rows(db)
+        db.close()
+    finally:
+        bind_engine()
+        topic_config_service.invalidate_routing_table()
+        sensor_config_service.invalidate_sensor_config_cache()
+        payload_parser.clear_parser_cache()
+        sensor_partitions.clear_partition_cache()
+        payload_codecs.clear_codec_cache()
+        engine.dispose()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+        print(f"\n数据库中共 {total_rows} 条读数（含预热）")
+
+
+if __name__ == "__main__":
+    main()
@@ -66,11 +66,64 @@ class Settings(BaseSettings):
         abs_path = db_path.absolute()
         return f"sqlite:///{abs_path}"
     
+    # SQLite 性能配置（每个连接建立时设置）
+    sqlite_wal: bool = Field(default=True)  # 使用 WAL 日志模式，读取不会被写入阻塞
+    sqlite_synchronous: str = Field(default="NORMAL")  # WAL 模式下 NORMAL 只在检查点时同步到磁盘
+    sqlite_cache_size_kb: int = Field(default=16384)  # 每个连接的页缓存（KB）
+    sqlite_mmap_size_mb: int = Field(default=256)  # 内存映射读取的大小（MB），0 表示不使用
+    sqlite_busy_timeout_ms: int = Field(default=5000)  # 数据库被其他连接锁定时的等待时间（毫秒）
+    sqlite_read_pool_size: int = Field(default=5)  # 只读连接池大小（API 查询）
+    
     # MQTT默认配置
     mqtt_default_port: int = Field(default=1883)
     mqtt_default_timeout: int = Field(default=60)
     mqtt_keepalive: int = Field(default=60)
-    
+    # 共享订阅分组名，设置后以 $share/<分组>/<主题> 订阅，多个后端进程分摊消息（为空则普通订阅）
+    mqtt_shared_group: str = Field(default="")
+    # MQTT会话：客户端ID为 <mqtt_client_id>-<MQTT配置ID>，mqtt_client_id 为空时使用 mqtt-iot-<主机名>
+    # （本机其他进程已使用时依次加 -2、-3 … 后缀，按 mqtt_session_dir 下的锁文件判断）
+    mqtt_client_id: str = Field(default="")
+    mqtt_clean_session: bool = Field(default=False)  # False 使用持久会话，重启期间的QoS 1消息由服务器保存并补发
+    mqtt_subscribe_qos: int = Field(default=1)  # 订阅QoS（0 / 1 / 2）
+    mqtt_session_dir: str = Field(default="data/mqtt_session")  # 持久会话已订阅主题的记录目录
+    mqtt_drain_idle_ms: int = Field(default=1000)  # 恢复会话后服务器连续多久没有推送消息视为积压已排空（毫秒）
+    mqtt_drain_max_seconds: int = Field(default=300)  # 排空状态最长持续时间（秒）
+    mqtt_drain_batch_size: int = Field(default=5000)  # 排空期间写缓冲的批大小
+    mqtt_bulk_max_in_flight: int = Field(default=20)  # 批量继电器命令同时在途（未确认）的消息数上限
+    mqtt_publish_timeout_seconds: int = Field(default=10)  # 发布命令超过该时间仍未完成（QoS 1 未收到确认）视为超时
+    relay_confirm_timeout_seconds: int = Field(default=15)  # 继电器命令发出后该时间内没有收到状态上报视为超时
+    relay_confirm_grace_seconds: float = Field(default=2.0)  # 继电器命令发出该时间后上报的状态仍不一致才判定为未生效
+    # MQTT流量录制（用于离线回放压测）
+    mqtt_capture_enabled: bool = Field(default=False)  # 是否录制收到的原始消息
+    mqtt_capture_dir: str = Field(default="data/mqtt_capture")  # 录制文件目录
+    mqtt_capture_max_bytes: int = Field(default=67108864)  # 单个录制文件最大字节数（64MB）
+    mqtt_capture_backup_count: int = Field(default=10)  # 保留的录制文件数量
+
+    # 传感器数据写入配置（批量写缓冲）
+    ingest_batch_size: int = Field(default=500)  # 累计多少条读数触发一次批量写入
+    ingest_flush_interval_ms: int = Field(default=1000)  # 两次批量写入的最长间隔（毫秒）
+    ingest_max_pending_rows: int = Field(default=20000)  # 缓冲区上限，超过后由写入方同步刷盘
+    ingest_workers: int = Field(default=2)  # 解析和入库的工作线程数
+    ingest_queue_size: int = Field(default=10000)  # 待处理消息队列容量
+    ingest_overflow_policy: str = Field(default="block")  # 队列满时的策略: block / drop_oldest / spill
+    ingest_spill_dir: str = Field(default="data/ingest_spill")  # spill 策略下溢出消息的存放目录
+    ingest_max_timestamp_age_days: int = Field(default=30)  # 设备时间早于接收时间超过该天数时使用接收时间（0 表示不检查）
+    ingest_max_timestamp_skew_seconds: int = Field(default=300)  # 设备时间晚于接收时间超过该秒数时使用接收时间
+    ingest_cache_sync_interval_ms: int = Field(default=1000)  # 检查其他进程是否修改了配置（缓存代数）的间隔（毫秒）
+
+    # 数据保留配置（后台线程分批删除过期数据，保留天数为 0 表示永久保留，可按设备/传感器类型单独设置）
+    retention_enabled: bool = Field(default=True)  # 是否启动后台保留任务（同时负责 ANALYZE 和增量 VACUUM）
+    retention_interval_minutes: int = Field(default=60)  # 两次保留任务的间隔（分钟）
+    retention_raw_days: int = Field(default=0)  # 原始读数默认保留天数
+    retention_rollup_1m_days: int = Field(default=0)  # 1 分钟汇总默认保留天数
+    retention_rollup_1h_days: int = Field(default=0)  # 1 小时汇总默认保留天数
+    retention_rollup_1d_days: int = Field(default=0)  # 1 天汇总默认保留天数
+    retention_batch_size: int = Field(default=1000)  # 每批删除的行数（每批单独提交）
+    retention_batch_pause_ms: int = Field(default=50)  # 两批之间的间隔（毫秒），让出写锁给数据接收
+    retention_vacuum_pages: int = Field(default=1000)  # 每步增量 VACUUM 释放的页数
+    retention_analyze_interval_hours: int = Field(default=24)  # 两次 ANALYZE 的最短间隔（小时）
+    retention_lock_file: str = Field(default="data/retention.lock")  # 多进程时只有持有该锁文件的进程执行保留任务
+
     # 日志配置
     log_level: str = Field(default="INFO")
     log_file: str = Field(default="logs/app.log")
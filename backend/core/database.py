@@ -1,30 +1,107 @@
 """
 数据库配置和会话管理
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from typing import Generator, Optional
 
 from core.config import settings
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False}  # 仅用于SQLite
-)
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool):
+    """新建 SQLite 连接时设置性能参数"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        if not read_only and settings.sqlite_wal:
+            # WAL 模式记录在数据库文件中，只读连接打开后自动使用
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def create_database_engine(database_url: str, read_only: bool = False, **kwargs) -> Engine:
+    """
+    创建数据库引擎，SQLite 连接建立时设置 WAL、synchronous、缓存等参数
+
+    Args:
+        database_url: 数据库连接URL
+        read_only: 只读连接（PRAGMA query_only），用于 API 查询
+        **kwargs: 传给 create_engine 的其他参数（如连接池大小）
+    """
+    if not database_url.startswith("sqlite"):
+        return create_engine(database_url, **kwargs)
+
+    new_engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False},  # 仅用于SQLite
+        **kwargs
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, read_only)
+
+    return new_engine
+
+
+# 创建数据库引擎（API 写操作、脚本）
+# 不经过专用写连接排队：只有数据接收的写入在进程内串行化，API 写入（配置修改，频率低）
+# 与写连接争抢 SQLite 写锁时按 busy_timeout 等待，超时返回 database is locked
+engine = create_database_engine(settings.database_url)
+
+if settings.database_url.startswith("sqlite") and ":memory:" not in settings.database_url:
+    # 数据接收专用写引擎：消息处理（设备、传感器配置的自动创建和告警事件）、读数批量写入和数据保留任务
+    # 共用一个连接，写入在进程内排队，不互相争抢 SQLite 写锁
+    writer_engine = create_database_engine(settings.database_url, pool_size=1, max_overflow=0)
+    # 只读引擎：API 查询（仪表盘轮询）使用，WAL 模式下不会被写入阻塞
+    read_engine = create_database_engine(
+        settings.database_url,
+        read_only=True,
+        pool_size=settings.sqlite_read_pool_size,
+        max_overflow=settings.sqlite_read_pool_size
+    )
+else:
+    # 其他数据库（或内存数据库）不区分读写连接
+    writer_engine = read_engine = engine
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+WriterSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=writer_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # 基础模型类
 Base = declarative_base()
 
 
+def bind_engine(bind: Optional[Engine] = None):
+    """所有会话工厂改用指定的引擎（测试和脚本切换数据库时使用），为空时恢复默认引擎"""
+    SessionLocal.configure(bind=bind or engine)
+    WriterSessionLocal.configure(bind=bind or writer_engine)
+    ReadSessionLocal.configure(bind=bind or read_engine)
+
+
 def get_db() -> Generator:
     """数据库依赖注入"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db() -> Generator:
+    """只读数据库依赖注入（只查询的API使用）"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
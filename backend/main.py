@@ -3,7 +3,7 @@ FastAPI主应用
 前后端分离架构 - 提供API服务和静态文件服务
 """
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -78,6 +78,20 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # 注册API路由
 app.include_router(api_router, prefix=settings.api_prefix)
 
+# 健康检查端点（需在前端路由之前注册，避免被SPA通配路由覆盖）
+@app.get("/health")
+async def health_check():
+    """健康检查"""
+    return {"status": "ok", "version": settings.app_version}
+
+# 运行指标端点（Prometheus文本格式）
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """数据接收运行指标"""
+    from services import mqtt_service  # 导入时注册MQTT服务的指标采集函数
+    from services.metrics import registry
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # 静态文件服务（用于部署版本）
 static_dir = Path(__file__).parent / "static"
 if static_dir.exists() and static_dir.is_dir():
@@ -129,12 +143,6 @@ else:
             "api_prefix": settings.api_prefix
         }
 
-# 健康检查端点
-@app.get("/health")
-async def health_check():
-    """健康检查"""
-    return {"status": "ok", "version": settings.app_version}
-
 # 启动时启动MQTT服务
 @app.on_event("startup")
 async def startup_event():
@@ -151,6 +159,13 @@ async def startup_event():
     except Exception as e:
         logger.error(f"启动MQTT服务失败: {e}", exc_info=True)
 
+    try:
+        from services.retention import start_retention_scheduler
+        if start_retention_scheduler():
+            logger.info("数据保留任务启动成功")
+    except Exception as e:
+        logger.error(f"启动数据保留任务失败: {e}", exc_info=True)
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行"""
@@ -161,6 +176,11 @@ async def shutdown_event():
         logger.info("MQTT服务已停止")
     except Exception as e:
         logger.error(f"停止MQTT服务失败: {e}", exc_info=True)
+    try:
+        from services.retention import stop_retention_scheduler
+        stop_retention_scheduler()
+    except Exception as e:
+        logger.error(f"停止数据保留任务失败: {e}", exc_info=True)
 
 
 if __name__ == "__main__":
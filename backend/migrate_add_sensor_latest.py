@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：创建 sensor_latest 表（每个传感器配置的最新读数），并用已有读数填充
+（只在升级时执行一次，之后由写缓冲在写入读数时更新；可以重复执行）
+执行方式: python3 migrate_add_sensor_latest.py
+"""
+import sqlite3
+import os
+from pathlib import Path
+import re
+
+# 使用和应用相同的配置逻辑来获取数据库路径
+def get_database_path():
+    """获取数据库文件路径，使用和应用相同的逻辑"""
+    # 尝试从环境变量或配置文件读取
+    database_url = os.getenv("DATABASE_URL", "sqlite:///../mqtt_iot.db")
+    
+    # 解析 SQLite URL: sqlite:///./mqtt_iot.db 或 sqlite:////absolute/path
+    if database_url.startswith("sqlite:///"):
+        # 移除 sqlite:/// 前缀
+        path_part = database_url[10:]
+        
+        # 如果是绝对路径（以 / 开头）
+        if path_part.startswith("/"):
+            return Path(path_part)
+        # 如果是相对路径（以 ./ 或 ../ 开头）
+        elif path_part.startswith("./"):
+            # 相对于当前工作目录
+            return Path.cwd() / path_part[2:]
+        elif path_part.startswith("../"):
+            # 相对于当前工作目录的父目录（项目根目录）
+            return Path.cwd().parent / path_part[3:]
+        else:
+            # 直接是文件名，先尝试项目根目录
+            script_dir = Path(__file__).parent
+            project_root = script_dir.parent
+            root_db = project_root / path_part
+            if root_db.exists():
+                return root_db
+            # 如果项目根目录不存在，则使用当前工作目录
+            return Path.cwd() / path_part
+    else:
+        # 如果不是 SQLite URL，直接作为路径处理
+        return Path(database_url)
+
+db_path = get_database_path()
+
+# 读数ID = 分区键(YYYYMM) * ID_STRIDE + 分区内ID（与 services/sensor_partitions.py 一致）
+ID_STRIDE = 10 ** 10
+
+DDL = [
+    """CREATE TABLE IF NOT EXISTS sensor_latest (
+        sensor_config_id INTEGER NOT NULL,
+        reading_id INTEGER NOT NULL,
+        value FLOAT NOT NULL,
+        timestamp DATETIME NOT NULL,
+        alert_status VARCHAR,
+        PRIMARY KEY (sensor_config_id),
+        FOREIGN KEY(sensor_config_id) REFERENCES sensor_configs (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_sensor_latest_timestamp ON sensor_latest (timestamp)",
+]
+
+def upsert_latest(cursor, table, id_offset):
+    """把表中每个传感器配置最后一条读数写入 sensor_latest（只覆盖更早的最新读数）"""
+    cursor.execute(
+        f"""INSERT INTO sensor_latest (sensor_config_id, reading_id, value, timestamp, alert_status)
+            SELECT d.sensor_config_id, d.id + ?, d.value, d.timestamp, d.alert_status
+            FROM {table} d
+            JOIN (SELECT sensor_config_id, MAX(timestamp) AS timestamp FROM {table} GROUP BY sensor_config_id) m
+              ON d.sensor_config_id = m.sensor_config_id AND d.timestamp = m.timestamp
+            WHERE d.sensor_config_id IN (SELECT id FROM sensor_configs)
+            ON CONFLICT(sensor_config_id) DO UPDATE SET
+                reading_id = excluded.reading_id,
+                value = excluded.value,
+                timestamp = excluded.timestamp,
+                alert_status = excluded.alert_status
+            WHERE excluded.timestamp > sensor_latest.timestamp""",
+        (id_offset,)
+    )
+    return cursor.rowcount
+
+def migrate():
+    """执行数据库迁移"""
+    if not db_path.exists():
+        print(f"数据库文件不存在: {db_path}")
+        print("将在首次启动应用时自动创建数据库表")
+        return
+    
+    print(f"开始迁移数据库: {db_path}")
+    
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    
+    try:
+        for ddl in DDL:
+            cursor.execute(ddl)
+        print("✓ sensor_latest 表已创建")
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'sensor_data%'")
+        tables = []
+        for (name,) in cursor.fetchall():
+            match = re.match(r"^sensor_data_(\d{6})$", name)
+            if match:
+                tables.append((name, int(match.group(1)) * ID_STRIDE))
+            elif name == "sensor_data":
+                tables.append((name, 0))
+        
+        for name, id_offset in sorted(tables):
+            count = upsert_latest(cursor, name, id_offset)
+            print(f"✓ {name}: 更新 {count} 个传感器的最新读数")
+        
+        conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM sensor_latest")
+        print(f"\n数据库迁移完成！sensor_latest 表中共 {cursor.fetchone()[0]} 个传感器")
+            
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：启用增量 VACUUM（PRAGMA auto_vacuum=INCREMENTAL），供数据保留任务删除数据后缩小数据库文件
+（已有数据库需要执行一次 VACUUM 才能转换，耗时与数据库大小相关，执行前请停止应用；可以重复执行）
+执行方式: python3 migrate_enable_incremental_vacuum.py
+"""
+import sqlite3
+import os
+from pathlib import Path
+
+# 使用和应用相同的配置逻辑来获取数据库路径
+def get_database_path():
+    """获取数据库文件路径，使用和应用相同的逻辑"""
+    # 尝试从环境变量或配置文件读取
+    database_url = os.getenv("DATABASE_URL", "sqlite:///../mqtt_iot.db")
+    
+    # 解析 SQLite URL: sqlite:///./mqtt_iot.db 或 sqlite:////absolute/path
+    if database_url.startswith("sqlite:///"):
+        # 移除 sqlite:/// 前缀
+        path_part = database_url[10:]
+        
+        # 如果是绝对路径（以 / 开头）
+        if path_part.startswith("/"):
+            return Path(path_part)
+        # 如果是相对路径（以 ./ 或 ../ 开头）
+        elif path_part.startswith("./"):
+            # 相对于当前工作目录
+            return Path.cwd() / path_part[2:]
+        elif path_part.startswith("../"):
+            # 相对于当前工作目录的父目录（项目根目录）
+            return Path.cwd().parent / path_part[3:]
+        else:
+            # 直接是文件名，先尝试项目根目录
+            script_dir = Path(__file__).parent
+            project_root = script_dir.parent
+            root_db = project_root / path_part
+            if root_db.exists():
+                return root_db
+            # 如果项目根目录不存在，则使用当前工作目录
+            return Path.cwd() / path_part
+    else:
+        # 如果不是 SQLite URL，直接作为路径处理
+        return Path(database_url)
+
+db_path = get_database_path()
+
+# PRAGMA auto_vacuum 的取值：0 = NONE，1 = FULL，2 = INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+def migrate():
+    """执行数据库迁移"""
+    if not db_path.exists():
+        print(f"数据库文件不存在: {db_path}")
+        print("请先启动一次应用创建数据库，再执行该脚本")
+        return
+    
+    print(f"开始迁移数据库: {db_path}")
+    
+    conn = sqlite3.connect(str(db_path), isolation_level=None)  # VACUUM 不能在事务中执行
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            print("✓ 数据库已启用增量 VACUUM，无需迁移")
+            return
+        
+        size_before = db_path.stat().st_size
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        print("正在执行 VACUUM 转换数据库（数据库较大时需要较长时间）...")
+        cursor.execute("VACUUM")
+        
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            raise RuntimeError("VACUUM 后 auto_vacuum 仍未生效，请确认没有其他进程正在使用数据库")
+        size_after = db_path.stat().st_size
+        print(f"✓ 已启用增量 VACUUM，数据库文件 {size_before / 1024 / 1024:.1f} MB -> {size_after / 1024 / 1024:.1f} MB")
+        print("\n数据库迁移完成！")
+            
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：把旧的 sensor_data 表中的数据按月迁移到分区表 sensor_data_YYYYMM
+（迁移后的读数ID会变化；迁移期间请停止应用）
+执行方式: python3 migrate_partition_sensor_data.py
+"""
+import sqlite3
+import os
+from pathlib import Path
+import re
+
+# 使用和应用相同的配置逻辑来获取数据库路径
+def get_database_path():
+    """获取数据库文件路径，使用和应用相同的逻辑"""
+    # 尝试从环境变量或配置文件读取
+    database_url = os.getenv("DATABASE_URL", "sqlite:///../mqtt_iot.db")
+    
+    # 解析 SQLite URL: sqlite:///./mqtt_iot.db 或 sqlite:////absolute/path
+    if database_url.startswith("sqlite:///"):
+        # 移除 sqlite:/// 前缀
+        path_part = database_url[10:]
+        
+        # 如果是绝对路径（以 / 开头）
+        if path_part.startswith("/"):
+            return Path(path_part)
+        # 如果是相对路径（以 ./ 或 ../ 开头）
+        elif path_part.startswith("./"):
+            # 相对于当前工作目录
+            return Path.cwd() / path_part[2:]
+        elif path_part.startswith("../"):
+            # 相对于当前工作目录的父目录（项目根目录）
+            return Path.cwd().parent / path_part[3:]
+        else:
+            # 直接是文件名，先尝试项目根目录
+            script_dir = Path(__file__).parent
+            project_root = script_dir.parent
+            root_db = project_root / path_part
+            if root_db.exists():
+                return root_db
+            # 如果项目根目录不存在，则使用当前工作目录
+            return Path.cwd() / path_part
+    else:
+        # 如果不是 SQLite URL，直接作为路径处理
+        return Path(database_url)
+
+db_path = get_database_path()
+
+def partition_ddl(name):
+    """分区表结构（与 services/sensor_partitions.py 中的定义一致）"""
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER NOT NULL,
+            sensor_config_id INTEGER NOT NULL,
+            value FLOAT NOT NULL,
+            timestamp DATETIME NOT NULL,
+            alert_status VARCHAR,
+            PRIMARY KEY (id)
+        )""",
+        f"CREATE INDEX IF NOT EXISTS ix_{name}_config_timestamp ON {name} (sensor_config_id, timestamp)",
+        f"CREATE INDEX IF NOT EXISTS ix_{name}_timestamp ON {name} (timestamp)",
+    ]
+
+def next_month(month):
+    """'YYYY-MM' 的下一个月"""
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+
+def migrate():
+    """执行数据库迁移"""
+    if not db_path.exists():
+        print(f"数据库文件不存在: {db_path}")
+        print("将在首次启动应用时自动创建数据库表")
+        return
+    
+    print(f"开始迁移数据库: {db_path}")
+    
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sensor_data'")
+        if cursor.fetchone() is None:
+            print("✓ sensor_data 表不存在，跳过")
+            return
+        
+        cursor.execute("SELECT DISTINCT substr(timestamp, 1, 7) FROM sensor_data ORDER BY 1")
+        months = [row[0] for row in cursor.fetchall() if row[0]]
+        if not months:
+            print("✓ sensor_data 表中没有数据，跳过")
+            return
+        
+        total = 0
+        for month in months:
+            name = f"sensor_data_{month[:4]}{month[5:7]}"
+            for ddl in partition_ddl(name):
+                cursor.execute(ddl)
+            # 按时间索引范围复制该月的数据
+            cursor.execute(
+                f"""INSERT INTO {name} (sensor_config_id, value, timestamp, alert_status)
+                    SELECT sensor_config_id, value, timestamp, alert_status FROM sensor_data
+                    WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp""",
+                (f"{month}-01", f"{next_month(month)}-01")
+            )
+            total += cursor.rowcount
+            print(f"✓ {month}: {cursor.rowcount} 条 -> {name}")
+        
+        cursor.execute("SELECT COUNT(*) FROM sensor_data")
+        legacy_count = cursor.fetchone()[0]
+        if legacy_count != total:
+            raise RuntimeError(f"迁移条数 {total} 与 sensor_data 表条数 {legacy_count} 不一致")
+        
+        # 不带条件的 DELETE 由 SQLite 直接清空表
+        cursor.execute("DELETE FROM sensor_data")
+        conn.commit()
+        print(f"\n数据库迁移完成！共迁移 {total} 条数据到 {len(months)} 个分区")
+        print("如需回收旧表占用的磁盘空间，可在停止应用后执行: sqlite3 <数据库文件> VACUUM")
+            
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -5,6 +5,11 @@ from .sensor_data_new import SensorDataModel  # 传感器数据模型（新架
 from .mqtt_config import MQTTConfigModel
 from .topic_config import TopicConfigModel
 from .user import UserModel
+from .alert_rule import AlertRuleModel, AlertEventModel  # 告警规则和告警事件
+from .sensor_rollup import SensorRollupModel  # 传感器数据汇总
+from .retention_policy import RetentionPolicyModel  # 数据保留策略
+from .sensor_latest import SensorLatestModel  # 传感器最新读数
+from .cache_generation import CacheGenerationModel  # 多进程缓存同步
 
 # 注意：旧的 sensor.py 模型已废弃，但文件保留作为备份
 # 如需访问旧表，请直接使用：from models.sensor import SensorDataModel as SensorDataModelOld
@@ -16,4 +21,10 @@ __all__ = [
     "MQTTConfigModel",
     "TopicConfigModel",
     "UserModel",
+    "AlertRuleModel",
+    "AlertEventModel",
+    "SensorRollupModel",
+    "RetentionPolicyModel",
+    "SensorLatestModel",
+    "CacheGenerationModel",
 ]
\ No newline at end of file
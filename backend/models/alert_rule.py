@@ -0,0 +1,49 @@
+"""告警规则和告警事件模型"""
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from core.database import Base
+
+
+class AlertRuleModel(Base):
+    """告警规则 - 每个传感器配置最多一条，没有规则时使用按传感器类型的默认阈值"""
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_config_id = Column(Integer, ForeignKey("sensor_configs.id"), nullable=False, unique=True, index=True)
+    enabled = Column(Boolean, nullable=False, default=True)  # 停用后该传感器不再告警
+    warning_high = Column(Float, nullable=True)  # 高于该值为 warning
+    alert_high = Column(Float, nullable=True)  # 高于该值为 alert
+    warning_low = Column(Float, nullable=True)  # 低于该值为 warning
+    alert_low = Column(Float, nullable=True)  # 低于该值为 alert
+    hysteresis = Column(Float, nullable=False, default=0.0)  # 回差：恢复时需回到阈值以内该幅度
+    min_duration_seconds = Column(Integer, nullable=False, default=0)  # 持续超过阈值该时间后才升级告警
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # 关系
+    sensor_config = relationship("SensorConfigModel", back_populates="alert_rule")
+
+    def __repr__(self):
+        return f"<AlertRule(id={self.id}, sensor_config_id={self.sensor_config_id}, enabled={self.enabled})>"
+
+
+class AlertEventModel(Base):
+    """告警事件 - 记录传感器告警状态的每次变化（normal / warning / alert 之间的转换）"""
+    __tablename__ = "alert_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_config_id = Column(Integer, ForeignKey("sensor_configs.id"), nullable=False, index=True)
+    previous_status = Column(String, nullable=False)  # 变化前的告警状态
+    status = Column(String, nullable=False)  # 变化后的告警状态
+    value = Column(Float, nullable=True)  # 触发变化的读数
+    timestamp = Column(DateTime, nullable=False, index=True, default=datetime.utcnow)
+
+    # 关系
+    sensor_config = relationship("SensorConfigModel", back_populates="alert_events")
+
+    def __repr__(self):
+        return (
+            f"<AlertEvent(id={self.id}, sensor_config_id={self.sensor_config_id}, "
+            f"{self.previous_status} -> {self.status}, timestamp={self.timestamp})>"
+        )
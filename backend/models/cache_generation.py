@@ -0,0 +1,16 @@
+"""配置缓存代数模型 - 多个进程之间同步缓存失效"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from core.database import Base
+
+
+class CacheGenerationModel(Base):
+    """缓存代数 - 修改设备、主题或传感器配置的进程递增代数，其他进程发现代数变化后清除本进程的缓存"""
+    __tablename__ = "cache_generations"
+
+    name = Column(String, primary_key=True)  # 缓存名称
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<CacheGeneration(name={self.name}, generation={self.generation})>"
@@ -0,0 +1,27 @@
+"""数据保留策略模型"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from core.database import Base
+
+
+class RetentionPolicyModel(Base):
+    """
+    数据保留策略 - 按设备、传感器类型或设备+传感器类型设置原始读数和各粒度汇总的保留天数
+
+    同一传感器匹配多条策略时，设备+类型 优先于 设备，设备 优先于 类型；
+    字段为空表示沿用下一级（最后为全局设置 RETENTION_*_DAYS），0 表示永久保留。
+    """
+    __tablename__ = "retention_policies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True, index=True)  # 为空表示所有设备
+    sensor_type = Column(String, nullable=True, index=True)  # 为空表示所有传感器类型
+    raw_days = Column(Integer, nullable=True)  # 原始读数保留天数
+    rollup_1m_days = Column(Integer, nullable=True)  # 1 分钟汇总保留天数
+    rollup_1h_days = Column(Integer, nullable=True)  # 1 小时汇总保留天数
+    rollup_1d_days = Column(Integer, nullable=True)  # 1 天汇总保留天数
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RetentionPolicy(id={self.id}, device_id={self.device_id}, sensor_type={self.sensor_type})>"
@@ -16,12 +16,19 @@ class SensorConfigModel(Base):
     unit = Column(String, nullable=False, default="")  # 单位
     min_value = Column(Float, nullable=True)  # 最小值
     max_value = Column(Float, nullable=True)  # 最大值
+    # 存储策略: always / on_change / deadband / deadband_pct / interval
+    storage_policy = Column(String, nullable=False, default="always")
+    deadband = Column(Float, nullable=True)  # 死区（deadband 为绝对值，deadband_pct 为百分比）
+    min_interval_seconds = Column(Integer, nullable=True)  # 两次写入的最小间隔（秒）
+    heartbeat_seconds = Column(Integer, nullable=True)  # 超过该时间未写入时强制写入（秒）
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # 关系
     device = relationship("DeviceModel", back_populates="sensor_configs")
     sensor_data = relationship("SensorDataModel", back_populates="sensor_config", cascade="all, delete-orphan")
+    alert_rule = relationship("AlertRuleModel", back_populates="sensor_config", uselist=False, cascade="all, delete-orphan")
+    alert_events = relationship("AlertEventModel", back_populates="sensor_config", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<SensorConfig(id={self.id}, device_id={self.device_id}, type={self.type}, display_name={self.display_name})>"
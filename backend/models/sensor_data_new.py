@@ -6,7 +6,12 @@ from core.database import Base
 
 
 class SensorDataModel(Base):
-    """传感器数据模型 - 时序数据"""
+    """
+    传感器数据模型 - 时序数据
+
+    新数据按读数时间写入同结构的月分区表 sensor_data_YYYYMM（见 services/sensor_partitions.py），
+    本表只保存分区之前的旧数据，可用 migrate_partition_sensor_data.py 迁移到分区。
+    """
     __tablename__ = "sensor_data"
 
     id = Column(Integer, primary_key=True, index=True)
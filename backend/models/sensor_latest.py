@@ -0,0 +1,17 @@
+"""传感器最新读数模型 - 每个传感器配置一条，写入读数时更新"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from core.database import Base
+
+
+class SensorLatestModel(Base):
+    """传感器最新读数 - 查询当前读数时只读取这张表，与历史数据量无关"""
+    __tablename__ = "sensor_latest"
+
+    sensor_config_id = Column(Integer, ForeignKey("sensor_configs.id"), primary_key=True)
+    reading_id = Column(Integer, nullable=False)  # 读数ID（分区中的全局ID）
+    value = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    alert_status = Column(String, nullable=True)
+
+    def __repr__(self):
+        return f"<SensorLatest(sensor_config_id={self.sensor_config_id}, value={self.value}, timestamp={self.timestamp})>"
@@ -0,0 +1,26 @@
+"""传感器数据汇总模型 - 按 1 分钟 / 1 小时 / 1 天汇总的读数"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from core.database import Base
+
+
+class SensorRollupModel(Base):
+    """传感器数据汇总 - 每个传感器配置每种粒度每个时间段一条，写入读数时增量更新"""
+    __tablename__ = "sensor_rollups"
+    __table_args__ = (
+        UniqueConstraint("resolution", "sensor_config_id", "bucket", name="uq_sensor_rollups_bucket"),
+        Index("ix_sensor_rollups_resolution_bucket", "resolution", "bucket"),  # 重建和过期删除按时间范围
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_config_id = Column(Integer, ForeignKey("sensor_configs.id"), nullable=False)
+    resolution = Column(String, nullable=False)  # 汇总粒度: 1m / 1h / 1d
+    bucket = Column(DateTime, nullable=False)  # 时间段开始时间（UTC）
+    sample_count = Column(Integer, nullable=False, default=0)  # 读数条数
+    value_sum = Column(Float, nullable=False, default=0.0)  # 读数之和（平均值 = value_sum / sample_count）
+    value_min = Column(Float, nullable=True)  # 最小值
+    value_max = Column(Float, nullable=True)  # 最大值
+    last_value = Column(Float, nullable=True)  # 时间段内最后一条读数
+    last_timestamp = Column(DateTime, nullable=True)  # 最后一条读数的时间
+
+    def __repr__(self):
+        return f"<SensorRollup(sensor_config_id={self.sensor_config_id}, resolution={self.resolution}, bucket={self.bucket})>"
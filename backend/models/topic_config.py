@@ -14,5 +14,7 @@ class TopicConfigModel(Base):
     is_active = Column(Boolean, default=False, nullable=False)
     mqtt_config_id = Column(Integer, nullable=True)
     json_parse_config = Column(String, nullable=True)  # JSON格式的解析配置
+    payload_codec = Column(String, nullable=True)  # 消息编解码器: json / text / msgpack / cbor / struct，为空时自动识别
+    codec_options = Column(String, nullable=True)  # 编解码器选项（JSON格式，如 struct 的字段布局）
     relay_on_payload = Column(String, nullable=True)  # 继电器开启的payload格式
     relay_off_payload = Column(String, nullable=True)  # 继电器关闭的payload格式
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回放MQTT流量录制文件
+
+把 MQTT_CAPTURE_ENABLED 录制的消息按原始节奏（或加速）送入数据接收流水线，
+不需要MQTT服务器。默认写入临时SQLite数据库，不影响正式数据。
+
+用法:
+    python replay_capture.py data/mqtt_capture               # 按原始速度回放整个目录
+    python replay_capture.py capture.mqcap --speed 10        # 10倍速回放
+    python replay_capture.py capture.mqcap --speed 0         # 不等待，尽可能快地回放
+    python replay_capture.py capture.mqcap --database sqlite:///./replay.db --keep-timestamps
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+from core.config import settings
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from services import sensor_config_service, storage_policy, alert_rules, sensor_partitions
+from services.ingest_pipeline import IngestPipeline
+from services.mqtt_service import MQTTService
+from services.traffic_capture import read_capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放MQTT流量录制文件")
+    parser.add_argument("capture", help="录制文件或录制目录")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="回放倍速：1 为原始速度，N 为 N 倍速，0 为不等待（默认 1）")
+    parser.add_argument("--database", help="写入的数据库URL（默认使用临时SQLite数据库）")
+    parser.add_argument("--keep-timestamps", action="store_true",
+                        help="使用录制时的接收时间作为读数时间（默认使用回放时的时间）")
+    parser.add_argument("--limit", type=int, help="最多回放的消息数")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args()
+
+    if args.speed < 0:
+        parser.error("--speed 不能为负数")
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    tmp_dir = None
+    if args.database:
+        database_url = args.database
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="mqtt-replay-")
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'replay.db')}"
+    engine = create_database_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    bind_engine(engine)
+
+    spill_dir = tempfile.mkdtemp(prefix="mqtt-replay-spill-")
+    service = MQTTService()
+    # 回放使用阻塞策略（不丢消息），也不能接管正式服务遗留的溢出文件
+    service.pipeline = IngestPipeline(
+        handler=service.handle_ingest_message,
+        workers=settings.ingest_workers,
+        queue_size=settings.ingest_queue_size,
+        spill_dir=spill_dir
+    )
+    try:
+        db = SessionLocal()
+        sensor_config_service.warm_sensor_config_cache(db)
+        storage_policy.load_storage_policies(db)
+        alert_rules.load_alert_rules(db)
+        db.close()
+
+        service.write_buffer.start()
+        service.pipeline.start()
+        rows_before = service.write_buffer.rows_written
+
+        print(f"开始回放: {args.capture} -> {database_url}（倍速: {args.speed or '不限'}）")
+        count = 0
+        first_ts = None
+        started = time.perf_counter()
+        for message in read_capture(args.capture):
+            if args.limit is not None and count >= args.limit:
+                break
+            if first_ts is None:
+                first_ts = message.received_at
+            if args.speed:
+                # 按录制时的消息间隔（除以倍速）等待
+                delay = (message.received_at - first_ts) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            received_at = message.received_at if args.keep_timestamps else None
+            service.pipeline.submit(message.topic, message.payload, received_at)
+            count += 1
+            if count % 10000 == 0:
+                print(f"  已回放 {count} 条，队列积压 {service.pipeline.depth} 条")
+
+        submitted_elapsed = time.perf_counter() - started
+        service.pipeline.stop(timeout=600)
+        service.write_buffer.stop()
+        elapsed = time.perf_counter() - started
+
+        db = SessionLocal()
+        total_rows = sensor_partitions.count_rows(db)
+        db.close()
+
+        print()
+        print(f"回放消息: {count} 条（送入耗时 {submitted_elapsed:.2f}s，处理完成耗时 {elapsed:.2f}s）")
+        print(f"处理速度: {count / elapsed if elapsed > 0 else 0:.0f} msgs/s")
+        print(f"已处理: {service.pipeline.processed} 条，丢弃: {service.pipeline.dropped} 条")
+        print(f"写入读数: {service.write_buffer.rows_written - rows_before} 条（数据库共 {total_rows} 条）")
+    finally:
+        service.stop()
+        bind_engine()
+        sensor_partitions.clear_partition_cache()
+        engine.dispose()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""告警规则和告警事件相关的Pydantic schemas"""
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class AlertRuleUpdate(BaseModel):
+    """告警规则更新模型（阈值为空表示不检查该方向）"""
+    enabled: bool = True
+    warning_high: Optional[float] = None  # 高于该值为 warning
+    alert_high: Optional[float] = None  # 高于该值为 alert
+    warning_low: Optional[float] = None  # 低于该值为 warning
+    alert_low: Optional[float] = None  # 低于该值为 alert
+    hysteresis: float = Field(default=0.0, ge=0)  # 回差：恢复时需回到阈值以内该幅度
+    min_duration_seconds: int = Field(default=0, ge=0)  # 持续超过阈值该时间（秒）后才升级告警
+
+
+class AlertRule(AlertRuleUpdate):
+    """告警规则"""
+    id: int
+    sensor_config_id: int
+    device_id: int
+    type: str
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class AlertEvent(BaseModel):
+    """告警事件（告警状态变化）"""
+    id: int
+    sensor_config_id: int
+    device_id: int
+    type: str
+    display_name: Optional[str] = None
+    previous_status: str
+    status: str
+    value: Optional[float] = None
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
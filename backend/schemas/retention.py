@@ -0,0 +1,23 @@
+"""数据保留策略相关的Pydantic schemas"""
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class RetentionPolicyUpdate(BaseModel):
+    """保留策略更新模型（天数为空表示沿用下一级策略，0 表示永久保留）"""
+    device_id: Optional[int] = None  # 为空表示所有设备
+    sensor_type: Optional[str] = None  # 为空表示所有传感器类型
+    raw_days: Optional[int] = Field(default=None, ge=0)  # 原始读数保留天数
+    rollup_1m_days: Optional[int] = Field(default=None, ge=0)  # 1 分钟汇总保留天数
+    rollup_1h_days: Optional[int] = Field(default=None, ge=0)  # 1 小时汇总保留天数
+    rollup_1d_days: Optional[int] = Field(default=None, ge=0)  # 1 天汇总保留天数
+
+
+class RetentionPolicy(RetentionPolicyUpdate):
+    """保留策略"""
+    id: int
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,6 @@
 """传感器数据相关的Pydantic schemas"""
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, Literal, Union
 from datetime import datetime
 
 
@@ -21,12 +21,35 @@ class SensorDataUpdate(BaseModel):
 
 
 class SensorData(SensorDataBase):
-    id: int
+    id: Union[int, str]  # 原始读数为全局ID；汇总为 "粒度:汇总ID"（如 "1h:12"）
     timestamp: datetime
     min_value: Optional[float] = None
     max_value: Optional[float] = None
     alert_status: Optional[str] = None
     display_name: Optional[str] = None  # 自定义显示名称
+    storage_policy: Optional[str] = None  # 存储策略（非 always 时历史数据只记录变化）
+    # 历史数据按汇总粒度返回时：value 为时间段内的平均值
+    resolution: Optional[str] = None  # 汇总粒度 1m / 1h / 1d，原始读数为空
+    value_min: Optional[float] = None  # 时间段内的最小值
+    value_max: Optional[float] = None  # 时间段内的最大值
+    sample_count: Optional[int] = None  # 时间段内的读数条数
+
+    class Config:
+        from_attributes = True
+
+
+class SensorStoragePolicyUpdate(BaseModel):
+    """传感器存储策略更新模型"""
+    storage_policy: Literal["always", "on_change", "deadband", "deadband_pct", "interval"] = "always"
+    deadband: Optional[float] = Field(default=None, ge=0)  # deadband 为绝对值，deadband_pct 为百分比
+    min_interval_seconds: Optional[int] = Field(default=None, ge=0)  # 两次写入的最小间隔（秒）
+    heartbeat_seconds: Optional[int] = Field(default=None, ge=0)  # 超过该时间未写入时强制写入（秒）
+
+
+class SensorStoragePolicy(SensorStoragePolicyUpdate):
+    """传感器存储策略"""
+    device_id: int
+    type: str
 
     class Config:
         from_attributes = True
\ No newline at end of file
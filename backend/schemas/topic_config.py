@@ -8,6 +8,8 @@ class TopicConfigBase(BaseModel):
     subscribe_topics: str
     publish_topic: Optional[str] = None
     json_parse_config: Optional[str] = None
+    payload_codec: Optional[str] = None  # 消息编解码器: json / text / msgpack / cbor / struct，为空时自动识别
+    codec_options: Optional[str] = None  # 编解码器选项（JSON格式）
     relay_on_payload: Optional[str] = None
     relay_off_payload: Optional[str] = None
 
@@ -23,6 +25,8 @@ class TopicConfigUpdate(BaseModel):
     mqtt_config_id: Optional[int] = None
     is_active: Optional[bool] = None
     json_parse_config: Optional[str] = None
+    payload_codec: Optional[str] = None
+    codec_options: Optional[str] = None
     relay_on_payload: Optional[str] = None
     relay_off_payload: Optional[str] = None
 
@@ -32,6 +36,8 @@ class TopicConfig(TopicConfigBase):
     is_active: bool = False
     mqtt_config_id: Optional[int] = None
     json_parse_config: Optional[str] = None
+    payload_codec: Optional[str] = None
+    codec_options: Optional[str] = None
     relay_on_payload: Optional[str] = None
     relay_off_payload: Optional[str] = None
 
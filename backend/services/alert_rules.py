@@ -0,0 +1,262 @@
+"""告警规则引擎 - 按传感器配置的告警规则判断读数的告警状态，并记录状态变化"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.logging_config import get_logger
+from models.alert_rule import AlertRuleModel, AlertEventModel
+from models.sensor_config import SensorConfigModel
+
+logger = get_logger(__name__)
+
+# 告警状态（按严重程度排列）
+STATUS_NORMAL = "normal"
+STATUS_WARNING = "warning"
+STATUS_ALERT = "alert"
+STATUSES = (STATUS_NORMAL, STATUS_WARNING, STATUS_ALERT)
+_SEVERITY = {status: level for level, status in enumerate(STATUSES)}
+
+# 没有告警规则时按传感器类型使用的默认阈值（兼容原有行为）：(类型关键字, warning_high, alert_high)
+DEFAULT_THRESHOLDS = (
+    ("temp", 28.0, 30.0),
+    ("hum", 65.0, 70.0),
+)
+
+
+class AlertEvaluator(NamedTuple):
+    """编译后的告警规则（阈值为空表示不检查该方向）"""
+    warning_high: Optional[float] = None
+    alert_high: Optional[float] = None
+    warning_low: Optional[float] = None
+    alert_low: Optional[float] = None
+    hysteresis: float = 0.0
+    min_duration: float = 0.0
+
+    def level(self, value: float, margin: float = 0.0) -> int:
+        """读数对应的告警级别（0 normal / 1 warning / 2 alert），margin 将阈值向安全一侧收紧"""
+        if (self.alert_high is not None and value > self.alert_high - margin) or \
+                (self.alert_low is not None and value < self.alert_low + margin):
+            return 2
+        if (self.warning_high is not None and value > self.warning_high - margin) or \
+                (self.warning_low is not None and value < self.warning_low + margin):
+            return 1
+        return 0
+
+
+class _AlertState:
+    """单个传感器配置的告警状态"""
+    __slots__ = ("level", "pending_since")
+
+    def __init__(self, level: int = 0):
+        self.level = level
+        self.pending_since: Optional[datetime] = None  # 读数开始超过当前级别阈值的时间（等待 min_duration）
+
+
+# 进程级告警规则缓存：sensor_configs.id -> 编译后的规则（None 表示不告警）
+_evaluators: Dict[int, Optional[AlertEvaluator]] = {}
+# 当前告警状态：sensor_configs.id -> 状态
+_states: Dict[int, _AlertState] = {}
+_lock = threading.Lock()
+
+
+def evaluator_from_rule(rule: AlertRuleModel) -> Optional[AlertEvaluator]:
+    """由告警规则构造编译后的规则，规则停用或没有任何阈值时返回 None"""
+    if not rule.enabled:
+        return None
+    thresholds = (rule.warning_high, rule.alert_high, rule.warning_low, rule.alert_low)
+    if all(threshold is None for threshold in thresholds):
+        return None
+    return AlertEvaluator(
+        *thresholds,
+        hysteresis=rule.hysteresis or 0.0,
+        min_duration=rule.min_duration_seconds or 0
+    )
+
+
+def default_evaluator(sensor_type: str) -> Optional[AlertEvaluator]:
+    """没有告警规则时按传感器类型使用的默认规则"""
+    type_lower = sensor_type.lower()
+    for keyword, warning_high, alert_high in DEFAULT_THRESHOLDS:
+        if keyword in type_lower:
+            return AlertEvaluator(warning_high=warning_high, alert_high=alert_high)
+    return None
+
+
+def load_alert_rules(db: Session) -> int:
+    """
+    加载所有告警规则，并以每个传感器最近一次告警事件恢复告警状态
+
+    Returns:
+        加载的规则数量
+    """
+    global _evaluators, _states
+
+    evaluators: Dict[int, Optional[AlertEvaluator]] = {}
+    rules = db.query(AlertRuleModel).all()
+    for rule in rules:
+        evaluators[rule.sensor_config_id] = evaluator_from_rule(rule)
+
+    latest = db.query(
+        AlertEventModel.sensor_config_id,
+        func.max(AlertEventModel.id).label("id")
+    ).group_by(AlertEventModel.sensor_config_id).subquery()
+    rows = db.query(AlertEventModel.sensor_config_id, AlertEventModel.status).join(
+        latest, AlertEventModel.id == latest.c.id
+    ).all()
+    states = {
+        config_id: _AlertState(_SEVERITY.get(status, 0))
+        for config_id, status in rows
+        if status != STATUS_NORMAL
+    }
+
+    with _lock:
+        _evaluators = evaluators
+        _states = states
+    return len(rules)
+
+
+def set_alert_rule(config_id: int, evaluator: Optional[AlertEvaluator]):
+    """更新单个配置的告警规则（修改规则后调用，立即对数据接收生效）"""
+    with _lock:
+        _evaluators[config_id] = evaluator
+        state = _states.get(config_id)
+        if state is not None:
+            state.pending_since = None
+
+
+def remove_alert_rule(config_id: int):
+    """删除单个配置的告警规则缓存，之后按传感器类型使用默认规则"""
+    with _lock:
+        _evaluators.pop(config_id, None)
+
+
+def reset_state(config_id: Optional[int] = None):
+    """清除告警状态（写入失败或配置删除后调用），下一条读数重新判断"""
+    with _lock:
+        if config_id is None:
+            _states.clear()
+        else:
+            _states.pop(config_id, None)
+
+
+def get_status(config_id: int) -> str:
+    """传感器当前的告警状态"""
+    state = _states.get(config_id)
+    return STATUSES[state.level] if state is not None else STATUS_NORMAL
+
+
+def evaluate(
+    config_id: int,
+    sensor_type: str,
+    value: Any,
+    timestamp: datetime
+) -> Tuple[str, Optional[str]]:
+    """
+    判断读数的告警状态（数据接收热路径，不查询数据库）
+
+    Returns:
+        (告警状态, 变化前的状态)，状态没有变化时第二项为 None
+    """
+    try:
+        evaluator = _evaluators[config_id]
+    except KeyError:
+        # 没有告警规则的配置：按传感器类型编译一次默认规则
+        evaluator = _evaluators[config_id] = default_evaluator(sensor_type)
+
+    state = _states.get(config_id)
+    if evaluator is None:
+        if state is None or state.level == 0:
+            return STATUS_NORMAL, None
+        level = 0  # 规则停用或删除后恢复正常
+    else:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return get_status(config_id), None
+        level = evaluator.level(value)
+
+    with _lock:
+        state = _states.get(config_id)
+        if state is None:
+            state = _states[config_id] = _AlertState()
+        current = state.level
+
+        if evaluator is not None:
+            if level < current and evaluator.hysteresis:
+                # 回差：读数回到阈值以内 hysteresis 幅度后才降级
+                level = min(current, evaluator.level(value, evaluator.hysteresis))
+            if level > current and evaluator.min_duration:
+                # 持续超过阈值 min_duration 秒后才升级
+                if state.pending_since is None:
+                    state.pending_since = timestamp
+                if (timestamp - state.pending_since).total_seconds() < evaluator.min_duration:
+                    return STATUSES[current], None
+
+        state.pending_since = None
+        if level == current:
+            return STATUSES[current], None
+        state.level = level
+    return STATUSES[level], STATUSES[current]
+
+
+def get_alert_rule(db: Session, config_id: int) -> Optional[AlertRuleModel]:
+    """获取传感器配置的告警规则"""
+    return db.query(AlertRuleModel).filter(AlertRuleModel.sensor_config_id == config_id).first()
+
+
+def get_alert_rules(db: Session) -> List[AlertRuleModel]:
+    """获取所有告警规则"""
+    return db.query(AlertRuleModel).order_by(AlertRuleModel.sensor_config_id).all()
+
+
+def upsert_alert_rule(db: Session, config_id: int, **fields) -> AlertRuleModel:
+    """创建或更新传感器配置的告警规则（立即对数据接收生效）"""
+    rule = get_alert_rule(db, config_id)
+    if rule is None:
+        rule = AlertRuleModel(sensor_config_id=config_id)
+        db.add(rule)
+    for key, value in fields.items():
+        setattr(rule, key, value)
+    rule.updated_at = datetime.utcnow()
+
+    db.commit()
+    db.refresh(rule)
+    set_alert_rule(config_id, evaluator_from_rule(rule))
+    return rule
+
+
+def delete_alert_rule(db: Session, config_id: int) -> bool:
+    """删除传感器配置的告警规则，之后按传感器类型使用默认阈值"""
+    rule = get_alert_rule(db, config_id)
+    if rule is None:
+        return False
+    db.delete(rule)
+    db.commit()
+    remove_alert_rule(config_id)
+    return True
+
+
+def get_alert_events(
+    db: Session,
+    device_id: Optional[int] = None,
+    sensor_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 100
+) -> List[Tuple[AlertEventModel, SensorConfigModel]]:
+    """按时间倒序查询告警事件"""
+    query = db.query(AlertEventModel, SensorConfigModel).join(
+        SensorConfigModel, AlertEventModel.sensor_config_id == SensorConfigModel.id
+    )
+    if device_id is not None:
+        query = query.filter(SensorConfigModel.device_id == device_id)
+    if sensor_type:
+        query = query.filter(SensorConfigModel.type == sensor_type)
+    if start_time:
+        query = query.filter(AlertEventModel.timestamp >= start_time)
+    if end_time:
+        query = query.filter(AlertEventModel.timestamp <= end_time)
+    return query.order_by(AlertEventModel.timestamp.desc(), AlertEventModel.id.desc()).limit(limit).all()
@@ -0,0 +1,40 @@
+"""多进程缓存同步 - 配置修改后递增数据库中的缓存代数，其他进程的数据接收定期检查并清除本进程的缓存"""
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from core.logging_config import get_logger
+from models.cache_generation import CacheGenerationModel
+
+logger = get_logger(__name__)
+
+# 数据接收使用的配置缓存（主题路由、主题路由表、传感器配置ID）
+INGEST_CONFIG = "ingest_config"
+
+
+def notify_changed(name: str = INGEST_CONFIG):
+    """配置已修改（调用方已提交）：递增缓存代数，使用单独的会话提交"""
+    table = CacheGenerationModel.__table__
+    stmt = sqlite_insert(table).values(name=name, generation=1, updated_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"generation": table.c.generation + 1, "updated_at": stmt.excluded.updated_at}
+    )
+    db = SessionLocal()
+    try:
+        db.execute(stmt)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"更新缓存代数失败，其他进程的缓存不会立即失效: {e}")
+    finally:
+        db.close()
+
+
+def get_generation(db: Session, name: str = INGEST_CONFIG) -> int:
+    """当前的缓存代数（从未修改过为 0）"""
+    table = CacheGenerationModel.__table__
+    return db.execute(select(table.c.generation).where(table.c.name == name)).scalar() or 0
@@ -58,11 +58,43 @@ def get_device_publish_topic(db: Session, device: DeviceModel) -> str:
     return f"pc/{device.id}"
 
 
+def get_devices_by_selector(
+    db: Session,
+    device_ids: Optional[List[int]] = None,
+    location: Optional[str] = None,
+    topic_config_id: Optional[int] = None
+) -> List[DeviceModel]:
+    """按设备ID列表、位置（如房间）或主题配置选择设备，多个条件同时满足"""
+    query = db.query(DeviceModel)
+    if device_ids is not None:
+        query = query.filter(DeviceModel.id.in_(device_ids))
+    if location is not None:
+        query = query.filter(DeviceModel.location == location)
+    if topic_config_id is not None:
+        query = query.filter(DeviceModel.topic_config_id == topic_config_id)
+    return query.order_by(DeviceModel.id).all()
+
+
+def get_device_relay_payload(db: Session, device: DeviceModel, turn_on: bool) -> Optional[str]:
+    """获取设备的继电器开启/关闭消息：优先使用设备级别的格式，其次使用关联主题配置的格式"""
+    payload = device.relay_on_payload if turn_on else device.relay_off_payload
+    if payload:
+        return payload
+    
+    if device.topic_config_id:
+        from services import topic_config_service
+        topic_config = topic_config_service.get_topic_config(db, device.topic_config_id)
+        if topic_config:
+            return topic_config.relay_on_payload if turn_on else topic_config.relay_off_payload
+    return None
+
+
 def create_device(db: Session, device: DeviceCreate) -> DeviceModel:
     """创建设备"""
     db_device = DeviceModel(**device.model_dump())
     db.add(db_device)
     db.commit()
+    _invalidate_mqtt_routes()
     db.refresh(db_device)
     return db_device
 
@@ -78,6 +110,7 @@ def update_device(db: Session, device_id: int, device_update: DeviceUpdate) -> O
         setattr(db_device, key, value)
     
     db.commit()
+    _invalidate_mqtt_routes()
     db.refresh(db_device)
     return db_device
 
@@ -88,6 +121,32 @@ def delete_device(db: Session, device_id: int) -> bool:
     if not db_device:
         return False
     
+    # 分区表中的读数、汇总和最新读数不在级联删除范围内，随设备一起删除
+    from services import sensor_latest, sensor_partitions, sensor_rollups
+    config_ids = [config.id for config in db_device.sensor_configs]
+    sensor_partitions.delete_config_rows(db, config_ids)
+    sensor_rollups.delete_config_rollups(db, config_ids)
+    sensor_latest.delete_config_latest(db, config_ids)
+    from models.retention_policy import RetentionPolicyModel
+    db.query(RetentionPolicyModel).filter(RetentionPolicyModel.device_id == device_id).delete()
     db.delete(db_device)
     db.commit()
-    return True
\ No newline at end of file
+    _invalidate_mqtt_routes()
+    
+    # 设备的传感器配置已级联删除；配置ID可能被新配置复用，清除其存储策略的上次写入值和告警状态
+    from services import alert_rules, sensor_config_service, storage_policy
+    sensor_config_service.invalidate_sensor_config_cache(device_id)
+    for config_id in config_ids:
+        storage_policy.set_storage_policy(config_id, storage_policy.ALWAYS)
+        storage_policy.forget(config_id)
+        alert_rules.remove_alert_rule(config_id)
+        alert_rules.reset_state(config_id)
+    return True
+
+
+def _invalidate_mqtt_routes():
+    """设备变更后使MQTT主题路由缓存失效（其他进程通过缓存代数得知，同时清除传感器配置ID缓存）"""
+    from services.mqtt_service import invalidate_route_cache
+    invalidate_route_cache()
+    from services import cache_sync
+    cache_sync.notify_changed()
@@ -0,0 +1,46 @@
+"""本机进程间互斥 - 非阻塞的排他文件锁，进程退出时由操作系统自动释放"""
+from pathlib import Path
+from typing import IO, Optional
+
+from core.logging_config import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = get_logger(__name__)
+
+
+def try_lock(path) -> Optional[IO]:
+    """
+    对锁文件加非阻塞排他锁
+
+    锁按打开的文件区分，同一进程内再次打开同一文件加锁也会失败。
+
+    Returns:
+        锁文件句柄（关闭即释放锁）；已被其他进程锁定时返回 None
+
+    Raises:
+        OSError: 无法创建或打开锁文件
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def release(handle: Optional[IO]):
+    """释放文件锁"""
+    if handle is not None:
+        handle.close()
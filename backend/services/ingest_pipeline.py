@@ -0,0 +1,334 @@
+"""MQTT数据接收流水线 - 网络线程只负责入队，解析和入库由工作线程完成"""
+import base64
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, TextIO
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 队列满时的处理策略
+OVERFLOW_BLOCK = "block"  # 阻塞网络线程，直到队列有空位
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃最早入队的消息
+OVERFLOW_SPILL = "spill"  # 溢出的消息写入磁盘文件，队列空闲后按顺序回放
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+# 每次从溢出文件回放的消息条数
+SPILL_READ_BATCH = 500
+
+
+class IngestMessage(NamedTuple):
+    """待处理的MQTT消息"""
+    topic: str
+    payload: bytes
+    received_at: float  # 接收时间（Unix时间戳）
+
+
+class _Shard:
+    """单个工作线程的消息队列及溢出文件"""
+
+    def __init__(self, index: int, maxsize: int, spill_path: Path):
+        self.index = index
+        self.queue: "queue.Queue[IngestMessage]" = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.spill_path = spill_path
+        self.spill_count = 0
+        self.spill_offset = 0
+        self.thread: Optional[threading.Thread] = None
+
+
+def shard_key(topic: str) -> str:
+    """消息分片键：主题前两级（与设备识别方式一致），保证同一设备的消息按顺序处理"""
+    return '/'.join(topic.split('/', 2)[:2])
+
+
+class IngestPipeline:
+    """
+    MQTT数据接收流水线
+
+    paho 网络线程只把 (topic, payload, 接收时间) 放入有界队列，
+    由固定数量的工作线程完成解析和入库。消息按设备分片到工作线程，
+    同一设备的消息按接收顺序处理。队列满时按 overflow_policy 处理：
+    block（阻塞网络线程）、drop_oldest（丢弃最早的消息）或 spill（写入磁盘，稍后回放）。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[IngestMessage], None],
+        workers: int = 2,
+        queue_size: int = 10000,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        spill_dir: str = "data/ingest_spill"
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning(f"未知的队列溢出策略 {overflow_policy}，使用 {OVERFLOW_BLOCK}")
+            overflow_policy = OVERFLOW_BLOCK
+
+        self.handler = handler
+        self.overflow_policy = overflow_policy
+        self.spill_dir = Path(spill_dir)
+
+        workers = max(1, workers)
+        shard_size = max(1, queue_size // workers)
+        self._shards: List[_Shard] = [
+            _Shard(i, shard_size, self.spill_dir / f"spill-{i}.jsonl") for i in range(workers)
+        ]
+        self._stopping = threading.Event()
+
+        # 统计信息（网络线程和各工作线程都会更新，修改时持有 _stats_lock）
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    @property
+    def depth(self) -> int:
+        """当前积压的消息数（队列 + 溢出文件）"""
+        return sum(shard.queue.qsize() + shard.spill_count for shard in self._shards)
+
+    @property
+    def is_running(self) -> bool:
+        return any(shard.thread and shard.thread.is_alive() for shard in self._shards)
+
+    def start(self):
+        """启动工作线程"""
+        if self.is_running:
+            return
+        self._stopping.clear()
+        self._recover_spill()
+        for shard in self._shards:
+            shard.thread = threading.Thread(
+                target=self._run, args=(shard,), name=f"ingest-worker-{shard.index}", daemon=True
+            )
+            shard.thread.start()
+        logger.info(
+            f"数据接收流水线已启动: workers={len(self._shards)}, "
+            f"queue_size={self._shards[0].queue.maxsize * len(self._shards)}, policy={self.overflow_policy}"
+        )
+
+    def submit(self, topic: str, payload: bytes, received_at: Optional[float] = None) -> bool:
+        """
+        提交一条消息（在 paho 网络线程中调用）
+
+        Returns:
+            消息是否被接收（drop_oldest 策略下新消息总会被接收，被丢弃的是旧消息）
+        """
+        message = IngestMessage(topic, payload, received_at if received_at is not None else time.time())
+        shard = self._shards[self._shard_index(topic)]
+        with self._stats_lock:
+            self.submitted += 1
+
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            while not self._stopping.is_set():
+                try:
+                    shard.queue.put(message, timeout=1.0)
+                    return True
+                except queue.Full:
+                    logger.warning(f"数据接收队列 {shard.index} 已满，网络线程等待中")
+            # 停止时队列仍然已满，消息未能入队
+            logger.warning(f"数据接收流水线已停止，丢弃消息: {topic}")
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+
+        with shard.lock:
+            if self.overflow_policy == OVERFLOW_SPILL:
+                # 溢出文件中还有消息时，新消息也写入溢出文件，保证顺序
+                if shard.spill_count == 0:
+                    try:
+                        shard.queue.put_nowait(message)
+                        return True
+                    except queue.Full:
+                        logger.warning(f"数据接收队列 {shard.index} 已满，消息写入溢出文件")
+                return self._spill(shard, message)
+
+            while True:
+                try:
+                    shard.queue.put_nowait(message)
+                    return True
+                except queue.Full:
+                    try:
+                        shard.queue.get_nowait()
+                        with self._stats_lock:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def _shard_index(self, topic: str) -> int:
+        """消息所属的分片（crc32 在各进程、各次运行中一致，hash() 则每个进程随机）"""
+        return zlib.crc32(shard_key(topic).encode("utf-8")) % len(self._shards)
+
+    def stop(self, timeout: float = 10.0):
+        """停止工作线程（先处理完已入队的消息）"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            if shard.thread:
+                shard.thread.join(timeout=max(0.0, deadline - time.monotonic()))
+                if shard.thread.is_alive():
+                    logger.warning(f"数据接收工作线程 {shard.index} 未能在超时前处理完队列")
+                shard.thread = None
+        logger.info(f"数据接收流水线已停止: 已处理 {self.processed} 条，丢弃 {self.dropped} 条")
+
+    def _run(self, shard: _Shard):
+        """工作线程主循环"""
+        while True:
+            try:
+                message = shard.queue.get(timeout=0.2)
+            except queue.Empty:
+                if shard.spill_count:
+                    self._drain_spill(shard)
+                elif self._stopping.is_set():
+                    break
+                continue
+            self._handle(message)
+
+    def _handle(self, message: IngestMessage):
+        try:
+            self.handler(message)
+        except Exception as e:
+            logger.error(f"处理消息时出错: {e}", exc_info=True)
+        with self._stats_lock:
+            self.processed += 1
+
+    def _spill(self, shard: _Shard, message: IngestMessage) -> bool:
+        """将消息追加到溢出文件（调用方持有 shard.lock）"""
+        record = {
+            "t": message.topic,
+            "p": base64.b64encode(message.payload).decode("ascii"),
+            "r": message.received_at
+        }
+        try:
+            shard.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(shard.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.error(f"写入溢出文件失败，丢弃消息: {e}")
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        shard.spill_count += 1
+        with self._stats_lock:
+            self.spilled += 1
+        return True
+
+    def _drain_spill(self, shard: _Shard):
+        """从溢出文件按顺序回放一批消息"""
+        messages = []
+        with shard.lock:
+            try:
+                with open(shard.spill_path, "r", encoding="utf-8") as f:
+                    f.seek(shard.spill_offset)
+                    for _ in range(SPILL_READ_BATCH):
+                        line = f.readline()
+                        if not line:
+                            break
+                        record = json.loads(line)
+                        messages.append(IngestMessage(record["t"], base64.b64decode(record["p"]), record["r"]))
+                    shard.spill_offset = f.tell()
+                    at_end = not f.readline()
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"读取溢出文件失败，丢弃剩余 {shard.spill_count} 条消息: {e}")
+                with self._stats_lock:
+                    self.dropped += shard.spill_count
+                at_end = True
+                messages = []
+
+            if at_end:
+                # 溢出文件已全部读出，之后的新消息重新进入内存队列
+                self._reset_spill(shard)
+            else:
+                shard.spill_count -= len(messages)
+
+        for message in messages:
+            self._handle(message)
+
+    def _reset_spill(self, shard: _Shard):
+        """清空溢出文件（调用方持有 shard.lock）"""
+        shard.spill_count = 0
+        shard.spill_offset = 0
+        try:
+            os.remove(shard.spill_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"删除溢出文件失败: {e}")
+
+    def _recover_spill(self):
+        """
+        启动时恢复上次运行遗留的溢出消息
+
+        扫描目录中所有 spill-*.jsonl（上次运行的工作线程数可能不同），按接收时间合并后
+        按当前分片重新写入各分片的溢出文件，同一设备的消息仍由同一个工作线程按顺序回放。
+        """
+        paths = sorted(self.spill_dir.glob("spill-*.jsonl"))
+        if not paths:
+            return
+        counts = [0] * len(self._shards)
+        outputs: Dict[int, TextIO] = {}
+        inputs: List[TextIO] = []
+        try:
+            inputs = [open(path, "r", encoding="utf-8") for path in paths]
+            records = heapq.merge(*(self._read_spill_records(f) for f in inputs), key=lambda record: record["r"])
+            for record in records:
+                index = self._shard_index(record["t"])
+                if index not in outputs:
+                    outputs[index] = open(self._recovering_path(index), "w", encoding="utf-8")
+                outputs[index].write(json.dumps(record, separators=(",", ":")) + "\n")
+                counts[index] += 1
+        except OSError as e:
+            logger.error(f"读取遗留溢出文件失败: {e}")
+            for index in outputs:
+                outputs[index].close()
+                self._recovering_path(index).unlink(missing_ok=True)
+            return
+        finally:
+            for f in inputs:
+                f.close()
+            for f in outputs.values():
+                f.close()
+
+        try:
+            for index in outputs:
+                os.replace(self._recovering_path(index), self._shards[index].spill_path)
+            replaced = {self._shards[index].spill_path for index in outputs}
+            for path in paths:
+                if path not in replaced:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"整理遗留溢出文件失败: {e}")
+
+        for shard in self._shards:
+            shard.spill_count = counts[shard.index] if shard.index in outputs else 0
+            shard.spill_offset = 0
+        total = sum(counts)
+        if total:
+            logger.info(f"发现 {total} 条遗留的溢出消息（{len(paths)} 个文件），将按顺序回放")
+
+    def _recovering_path(self, index: int) -> Path:
+        """恢复遗留溢出消息时分片 index 的临时文件"""
+        return self.spill_dir / f"spill-{index}.jsonl.recovering"
+
+    @staticmethod
+    def _read_spill_records(f: TextIO) -> Iterator[dict]:
+        """逐行读取溢出文件，跳过损坏的行"""
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict) or not isinstance(record.get("t"), str) \
+                        or not isinstance(record.get("r"), (int, float)) or "p" not in record:
+                    raise ValueError("缺少字段")
+            except ValueError as e:
+                logger.error(f"跳过损坏的溢出消息: {e}")
+                continue
+            yield record
@@ -0,0 +1,204 @@
+"""运行指标 - 计数器、直方图和Prometheus文本格式输出"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 指标样本：(标签, 值)，标签为 ((名称, 值), ...)
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    """单组标签值对应的计数"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter:
+    """
+    计数器
+
+    带标签时先用 labels() 取得该组标签值的计数对象，再调用 inc()。
+    inc() 只做一次属性自增，不加锁（依赖GIL，极端并发下可能少计个别次数）。
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: Dict[Tuple[str, ...], _CounterChild] = {}
+        self._lock = threading.Lock()
+        self._default = None if labelnames else self.labels()
+
+    def labels(self, *labelvalues) -> _CounterChild:
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, _CounterChild())
+        return child
+
+    def inc(self, amount: float = 1):
+        """无标签计数器自增"""
+        self._default.value += amount
+
+    def value(self, *labelvalues) -> float:
+        child = self._children.get(labelvalues)
+        return child.value if child else 0
+
+    def samples(self) -> List[Sample]:
+        return [
+            (self.name, tuple(zip(self.labelnames, labelvalues)), child.value)
+            for labelvalues, child in list(self._children.items())
+        ]
+
+
+class Histogram:
+    """直方图（累计分桶，和Prometheus一致）"""
+    kind = "histogram"
+    __slots__ = ("name", "documentation", "buckets", "_counts", "_sum", "_count")
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(self._counts)):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", (("le", _format_value(float(bound))),), cumulative))
+        samples.append((f"{self.name}_sum", (), self._sum))
+        samples.append((f"{self.name}_count", (), self._count))
+        return samples
+
+
+class MetricFamily:
+    """采集时生成的指标（如队列深度、连接次数），由采集函数返回"""
+
+    def __init__(self, name: str, kind: str, documentation: str, samples: Optional[List[Sample]] = None):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self._samples = samples or []
+
+    def add(self, value: float, **labels):
+        self._samples.append((self.name, tuple(labels.items()), value))
+
+    def samples(self) -> List[Sample]:
+        return self._samples
+
+
+class Registry:
+    """指标注册表：保存计数器、直方图和采集函数，输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """注册采集函数，每次输出指标时调用"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """输出Prometheus文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            families = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            families.extend(collector())
+
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+registry = Registry()
+
+# 数据接收指标
+MESSAGES_RECEIVED = registry.counter(
+    "mqtt_messages_received_total", "按主题配置统计的已处理MQTT消息数", ("topic_config",)
+)
+PARSE_FAILURES = registry.counter(
+    "mqtt_parse_failures_total", "按解析方式统计的解析失败消息数（json_config / default_json / regex / 编解码器名称）", ("path",)
+)
+INGEST_ERRORS = registry.counter("mqtt_ingest_errors_total", "处理时出错并回滚的消息数")
+ROWS_WRITTEN = registry.counter("sensor_data_rows_written_total", "写入sensor_data表的读数条数")
+ROWS_SKIPPED = registry.counter("sensor_data_rows_skipped_total", "被存储策略过滤掉的读数条数")
+ROWS_DROPPED = registry.counter("sensor_data_rows_dropped_total", "写入失败后丢弃的读数条数")
+COMMIT_SECONDS = registry.histogram("mqtt_ingest_commit_seconds", "单条消息事务提交耗时（秒）")
+FLUSH_SECONDS = registry.histogram("sensor_data_flush_seconds", "批量写入sensor_data的耗时（秒）")
+
+# 消息发布指标
+PUBLISH_COMMANDS = registry.counter(
+    "mqtt_publish_commands_total", "按结果统计的发布命令数（published / failed / timeout）", ("status",)
+)
+RELAY_COMMANDS = registry.counter(
+    "relay_commands_total", "按确认结果统计的继电器命令数（confirmed / contradicted / timeout / superseded）", ("status",)
+)
+
+# 数据保留指标
+RETENTION_ROWS_PRUNED = registry.counter(
+    "retention_rows_pruned_total", "保留任务删除的过期行数（raw / 1m / 1h / 1d）", ("kind",)
+)
+RETENTION_SECONDS = registry.histogram("retention_run_seconds", "单次保留任务耗时（秒）")
@@ -0,0 +1,368 @@
+"""MQTT服务器连接 - 每个MQTT配置对应一个客户端"""
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from core.logging_config import get_logger
+from services import file_lock
+
+logger = get_logger(__name__)
+
+# 同一主机上同一客户端ID最多可用的序号（进程数）
+MAX_CLIENT_ID_SLOTS = 64
+
+
+def _safe_name(client_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', client_id)
+
+
+def acquire_client_id(client_id: str, lock_dir: Optional[str]) -> Tuple[str, Optional[Any]]:
+    """
+    在本机占用客户端ID（文件锁，进程退出时自动释放）
+
+    同一主机的多个进程（uvicorn 多 worker、共享订阅的多个实例）使用相同的配置时客户端ID相同，
+    服务器会在同一客户端ID再次连接时断开先前的连接，持久会话记录文件也会互相覆盖。
+    依次尝试 <客户端ID>、<客户端ID>-2、<客户端ID>-3 …，使用第一个未被占用的ID；
+    进程数不变时重启后仍得到相同的ID，持久会话可以恢复。
+
+    Returns:
+        (客户端ID, 锁文件句柄)；无法加锁时返回原客户端ID和 None
+    """
+    if not client_id or not lock_dir:
+        return client_id, None
+    for slot in range(1, MAX_CLIENT_ID_SLOTS + 1):
+        candidate = client_id if slot == 1 else f"{client_id}-{slot}"
+        try:
+            handle = file_lock.try_lock(Path(lock_dir) / f"{_safe_name(candidate)}.lock")
+        except OSError as e:
+            logger.warning(f"无法创建客户端ID锁文件: {e}")
+            return client_id, None
+        if handle is not None:
+            if slot > 1:
+                logger.info(f"客户端ID {client_id} 已被本机其他进程使用，改用 {candidate}")
+            return candidate, handle
+    raise RuntimeError(f"本机已有 {MAX_CLIENT_ID_SLOTS} 个进程使用客户端ID {client_id}")
+
+
+def release_client_id(handle: Optional[Any]):
+    """释放客户端ID占用"""
+    file_lock.release(handle)
+
+
+class BrokerConnection:
+    """
+    单个MQTT服务器的客户端连接
+
+    每个连接有独立的 paho 客户端和网络循环，只订阅属于该服务器的主题配置中的主题，
+    收到的消息交给 on_message 回调（统一进入数据接收流水线）。
+
+    指定 client_id 且 clean_session=False 时使用持久会话：断开期间服务器按 QoS 1 保存的消息
+    在重连后补发。恢复会话后进入排空（drain）状态，直到服务器连续 drain_idle_seconds 秒
+    没有推送消息，期间通过 on_drain 回调通知调用方加快写入。
+    """
+
+    def __init__(
+        self,
+        mqtt_config_id: int,
+        name: str,
+        server: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        topics: Optional[List[str]] = None,
+        on_message: Optional[Callable] = None,
+        keepalive: int = 60,
+        shared_group: Optional[str] = None,
+        client_id: str = "",
+        clean_session: bool = True,
+        qos: int = 0,
+        session_dir: Optional[str] = None,
+        on_drain: Optional[Callable[["BrokerConnection", bool], None]] = None,
+        on_publish: Optional[Callable[["BrokerConnection", int], None]] = None,
+        drain_idle_seconds: float = 1.0,
+        drain_max_seconds: float = 300.0
+    ):
+        self.mqtt_config_id = mqtt_config_id
+        self.name = name
+        self.server = server
+        self.port = port
+        self._credentials = (username, password)
+        self.keepalive = keepalive
+        self.shared_group = shared_group or None
+        self.topics: List[str] = list(topics or [])
+        self._message_callback = on_message
+        self._publish_callback = on_publish
+        self._lock = threading.Lock()
+
+        # paho 要求持久会话必须指定 client_id；本机其他进程已使用该ID时加序号区分
+        self.client_id, self._client_id_lock = acquire_client_id(client_id, session_dir)
+        self.clean_session = clean_session or not client_id
+        self.qos = qos
+        # 持久会话中服务器会保留上次的订阅，记录已订阅的主题以便重启后退订已删除的主题
+        self._session_file: Optional[Path] = None
+        if not self.clean_session and session_dir:
+            self._session_file = Path(session_dir) / f"{_safe_name(self.client_id)}.json"
+
+        self.client = mqtt.Client(client_id=self.client_id, clean_session=self.clean_session)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_connect_fail = self.on_connect_fail
+        self.client.on_message = self.on_message
+        self.client.on_publish = self.on_publish
+        if username and password:
+            self.client.username_pw_set(username, password)
+
+        # 连接状态
+        self.is_connected = False
+        self.connect_count = 0
+        self.disconnect_count = 0
+        self.last_connected_at: Optional[datetime] = None
+        self.last_disconnected_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+        # 积压消息排空状态
+        self._drain_callback = on_drain
+        self.drain_idle_seconds = max(drain_idle_seconds, 0.1)
+        self.drain_max_seconds = drain_max_seconds
+        self.draining = False
+        self.drain_count = 0
+        self.drain_messages = 0  # 本次（或最近一次）排空收到的积压消息数
+        self.drain_seconds = 0.0
+        self._drain_started = 0.0
+        self._last_message_at = 0.0
+
+    def start(self) -> bool:
+        """异步连接并启动网络循环（连接失败时由 paho 自动重连）"""
+        try:
+            self.client.connect_async(self.server, self.port, self.keepalive)
+            self.client.loop_start()
+            logger.info(f"MQTT客户端已启动: {self.name} ({self.server}:{self.port})")
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"启动MQTT客户端失败: {self.name} ({self.server}:{self.port}): {e}", exc_info=True)
+            return False
+
+    def stop(self):
+        """停止网络循环并断开连接（持久会话在服务器上保留，断开期间的消息下次连接时补发）"""
+        try:
+            self.client.disconnect()
+            self.client.loop_stop()
+        except Exception as e:
+            logger.warning(f"停止MQTT客户端时出错: {self.name}: {e}")
+        self.is_connected = False
+        self._end_drain()
+        release_client_id(self._client_id_lock)
+        self._client_id_lock = None
+
+    def on_connect(self, client, userdata, flags, rc):
+        """连接成功回调"""
+        if rc == 0:
+            session_present = bool(flags.get("session present")) and not self.clean_session
+            logger.info(
+                f"MQTT连接成功: {self.name} ({self.server}:{self.port})"
+                f"{'，恢复持久会话' if session_present else ''}，开始订阅主题..."
+            )
+            self.is_connected = True
+            self.connect_count += 1
+            self.last_connected_at = datetime.utcnow()
+            self.last_error = None
+            if session_present:
+                # 服务器会补发断开期间保存的消息，先进入排空状态再订阅
+                self._begin_drain()
+            self.subscribe_to_topics()
+        else:
+            self.last_error = mqtt.connack_string(rc)
+            logger.error(f"MQTT连接失败: {self.name}，返回码: {rc} ({self.last_error})")
+
+    def on_connect_fail(self, client, userdata):
+        """连接失败回调（paho 会自动重试）"""
+        self.last_error = "连接失败，正在重试"
+        logger.warning(f"无法连接到MQTT服务器: {self.name} ({self.server}:{self.port})，稍后重试")
+
+    def on_disconnect(self, client, userdata, rc):
+        """断开连接回调"""
+        logger.warning(f"MQTT连接断开: {self.name} ({self.server}:{self.port})")
+        self.is_connected = False
+        self.disconnect_count += 1
+        self.last_disconnected_at = datetime.utcnow()
+        if rc != 0:
+            self.last_error = mqtt.error_string(rc)
+
+    def on_message(self, client, userdata, msg):
+        """消息接收回调"""
+        if self.draining:
+            self.drain_messages += 1
+            self._last_message_at = time.monotonic()
+        if self._message_callback:
+            self._message_callback(client, userdata, msg)
+
+    def on_publish(self, client, userdata, mid):
+        """发布完成回调：QoS 0 已写入连接，QoS 1 已收到 PUBACK"""
+        if self._publish_callback:
+            self._publish_callback(self, mid)
+
+    def subscribe_to_topics(self):
+        """订阅该服务器的全部主题"""
+        with self._lock:
+            topics = list(self.topics)
+        if not topics:
+            logger.warning(f"MQTT服务器 {self.name} 没有需要订阅的主题")
+            return
+        subscriptions = [self.subscription_topic(topic) for topic in topics]
+
+        # 持久会话保留了上次的订阅，退订已不在配置中的主题
+        stale = [topic for topic in self._load_session_topics() if topic not in subscriptions]
+        if stale:
+            self.client.unsubscribe(stale)
+            logger.info(f"已退订不再配置的主题: {', '.join(stale)} (服务器: {self.name})")
+
+        if not subscriptions:
+            self._save_session_topics([])
+            logger.warning(f"MQTT服务器 {self.name} 没有需要订阅的主题")
+            return
+        result, _ = self.client.subscribe([(topic, self.qos) for topic in subscriptions])
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            logger.error(f"订阅主题失败: {self.name}，返回码: {result}")
+            return
+        self._save_session_topics(subscriptions)
+        for topic in subscriptions:
+            logger.info(f"已订阅主题: {topic} (QoS {self.qos}, 服务器: {self.name})")
+
+    def update_topics(self, topics: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        更新订阅主题，只对增减的主题发送 SUBSCRIBE / UNSUBSCRIBE（不重连）
+
+        未连接时只更新主题列表，下次连接成功后按新列表订阅。
+
+        Returns:
+            (新增的主题, 移除的主题)
+        """
+        with self._lock:
+            current = self.topics
+            self.topics = list(topics)
+        added = [topic for topic in topics if topic not in current]
+        removed = [topic for topic in current if topic not in topics]
+        if not self.is_connected or not (added or removed):
+            return added, removed
+
+        if removed:
+            self.client.unsubscribe([self.subscription_topic(topic) for topic in removed])
+            logger.info(f"已退订主题: {', '.join(removed)} (服务器: {self.name})")
+        if added:
+            result, _ = self.client.subscribe([(self.subscription_topic(topic), self.qos) for topic in added])
+            if result != mqtt.MQTT_ERR_SUCCESS:
+                logger.error(f"订阅主题失败: {self.name}，返回码: {result}")
+            else:
+                logger.info(f"已订阅主题: {', '.join(added)} (QoS {self.qos}, 服务器: {self.name})")
+        self._save_session_topics([self.subscription_topic(topic) for topic in topics])
+        return added, removed
+
+    def same_connection(self, server: str, port: int, username: Optional[str], password: Optional[str]) -> bool:
+        """连接参数是否相同（不同时需要重建客户端）"""
+        return (self.server, self.port, self._credentials) == (server, port, (username, password))
+
+    def subscription_topic(self, topic: str) -> str:
+        """实际订阅的主题过滤器：配置了共享订阅分组时加上 $share/<分组>/ 前缀"""
+        if self.shared_group and not topic.startswith("$share/"):
+            return f"$share/{self.shared_group}/{topic}"
+        return topic
+
+    def _load_session_topics(self) -> List[str]:
+        """读取持久会话中已订阅的主题"""
+        if self._session_file is None or not self._session_file.exists():
+            return []
+        try:
+            return list(json.loads(self._session_file.read_text(encoding="utf-8")))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取MQTT会话订阅记录失败: {self._session_file}: {e}")
+            return []
+
+    def _save_session_topics(self, subscriptions: List[str]):
+        """记录持久会话中已订阅的主题"""
+        if self._session_file is None:
+            return
+        try:
+            self._session_file.parent.mkdir(parents=True, exist_ok=True)
+            self._session_file.write_text(json.dumps(subscriptions, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"保存MQTT会话订阅记录失败: {self._session_file}: {e}")
+
+    @property
+    def drain_rate(self) -> float:
+        """本次（或最近一次）排空的速度（条/秒）"""
+        if self.draining:
+            seconds = time.monotonic() - self._drain_started
+        else:
+            seconds = self.drain_seconds
+        return self.drain_messages / seconds if seconds > 0 else 0.0
+
+    def _begin_drain(self):
+        """进入积压消息排空状态"""
+        with self._lock:
+            if self.draining:
+                return
+            self.draining = True
+            self.drain_count += 1
+            self.drain_messages = 0
+            self._drain_started = self._last_message_at = time.monotonic()
+        logger.info(f"MQTT服务器 {self.name} 恢复持久会话，开始排空积压消息")
+        if self._drain_callback:
+            self._drain_callback(self, True)
+        threading.Thread(target=self._watch_drain, name=f"mqtt-drain-{self.mqtt_config_id}", daemon=True).start()
+
+    def _watch_drain(self):
+        """服务器连续 drain_idle_seconds 秒没有推送消息（或断开、超时）时结束排空"""
+        while self.draining:
+            time.sleep(min(self.drain_idle_seconds, 0.5))
+            now = time.monotonic()
+            if (
+                not self.is_connected
+                or now - self._last_message_at >= self.drain_idle_seconds
+                or now - self._drain_started >= self.drain_max_seconds
+            ):
+                self._end_drain()
+
+    def _end_drain(self):
+        """结束积压消息排空状态"""
+        with self._lock:
+            if not self.draining:
+                return
+            self.draining = False
+            self.drain_seconds = max(self._last_message_at - self._drain_started, 0.0)
+        logger.info(
+            f"MQTT服务器 {self.name} 积压消息排空完成: {self.drain_messages} 条，"
+            f"耗时 {self.drain_seconds:.1f}s（{self.drain_rate:.0f} 条/秒）"
+        )
+        if self._drain_callback:
+            self._drain_callback(self, False)
+
+    def status(self) -> Dict[str, Any]:
+        """连接状态（供API展示）"""
+        return {
+            "mqtt_config_id": self.mqtt_config_id,
+            "name": self.name,
+            "server": self.server,
+            "port": self.port,
+            "is_connected": self.is_connected,
+            "shared_group": self.shared_group,
+            "client_id": self.client_id,
+            "clean_session": self.clean_session,
+            "qos": self.qos,
+            "draining": self.draining,
+            "drain_count": self.drain_count,
+            "drain_messages": self.drain_messages,
+            "drain_rate": round(self.drain_rate, 1),
+            "topics": list(self.topics),
+            "connect_count": self.connect_count,
+            "disconnect_count": self.disconnect_count,
+            "last_connected_at": self.last_connected_at,
+            "last_disconnected_at": self.last_disconnected_at,
+            "last_error": self.last_error,
+        }
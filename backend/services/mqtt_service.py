@@ -1,37 +1,126 @@
 """MQTT服务 - 处理MQTT连接和数据接收"""
 import paho.mqtt.client as mqtt
 import json
-import re
+import socket
+import threading
+import time
 import requests
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, NamedTuple, Union
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from core.database import SessionLocal
+from core.config import settings
+from core.database import SessionLocal, WriterSessionLocal
 from core.logging_config import get_logger
 from models.device import DeviceModel
-from models.sensor_data_new import SensorDataModel
 from models.sensor_config import SensorConfigModel
 from models.mqtt_config import MQTTConfigModel
+from models.topic_config import TopicConfigModel
+from models.alert_rule import AlertEventModel
 from services import topic_config_service
 from services import sensor_config_service
+from services import payload_parser
+from services import payload_codecs
+from services import storage_policy
+from services import alert_rules
+from services import metrics
+from services.payload_parser import CompiledPayloadParser
+from services.payload_codecs import PayloadCodec
+from services.sensor_data_buffer import SensorDataWriteBuffer
+from services.ingest_pipeline import IngestPipeline, IngestMessage
+from services.mqtt_broker import BrokerConnection
+from services.traffic_capture import TrafficRecorder
+from services.publish_tracker import PublishTracker, PublishCommand
+from services.relay_commands import RelayCommandTable
+from services import cache_sync
 
 logger = get_logger(__name__)
 
 
+class IngestRoute(NamedTuple):
+    """主题对应的设备和解析方式（缓存在主题路由缓存中）"""
+    device_id: int
+    topic_config_id: Optional[int]
+    parser: Optional[CompiledPayloadParser]  # 预编译的JSON解析配置
+    codec: Optional[PayloadCodec]  # 主题配置声明的消息编解码器，为空时自动识别
+
+
 class MQTTService:
     """MQTT服务类"""
     
     def __init__(self):
-        self.client: Optional[mqtt.Client] = None
-        self.is_connected = False
+        # 每个MQTT服务器一个客户端连接：mqtt_config_id -> BrokerConnection
+        self.brokers: Dict[int, BrokerConnection] = {}
+        self._started = False
         self.db: Optional[Session] = None
+        # 批量写缓冲：读数在消息事务提交后交给缓冲，由后台线程批量写入
+        self.write_buffer = SensorDataWriteBuffer(
+            batch_size=settings.ingest_batch_size,
+            flush_interval_ms=settings.ingest_flush_interval_ms,
+            max_pending_rows=settings.ingest_max_pending_rows
+        )
+        # 数据接收流水线：网络线程只负责入队，解析和入库由工作线程完成
+        self.pipeline = IngestPipeline(
+            handler=self.handle_ingest_message,
+            workers=settings.ingest_workers,
+            queue_size=settings.ingest_queue_size,
+            overflow_policy=settings.ingest_overflow_policy,
+            spill_dir=settings.ingest_spill_dir
+        )
+        # MQTT流量录制（可选）：原始消息写入录制文件，供 replay_capture.py 离线回放
+        self.recorder: Optional[TrafficRecorder] = None
+        if settings.mqtt_capture_enabled:
+            self.recorder = TrafficRecorder(
+                directory=settings.mqtt_capture_dir,
+                max_bytes=settings.mqtt_capture_max_bytes,
+                backup_count=settings.mqtt_capture_backup_count
+            )
+        # 每个工作线程独立的数据库会话和待写入读数
+        self._local = threading.local()
+        self._ingest_sessions: List[Session] = []
+        self._ingest_sessions_lock = threading.Lock()
+        # 发布命令表：发布接口立即返回命令ID，发布结果由 on_publish 回调异步记录
+        self.publish_tracker = PublishTracker(timeout=settings.mqtt_publish_timeout_seconds)
+        self.relay_commands = RelayCommandTable(
+            timeout=settings.relay_confirm_timeout_seconds,
+            grace=settings.relay_confirm_grace_seconds
+        )
+        # 增量调整订阅时串行执行
+        self._reconcile_lock = threading.Lock()
+        # 主题路由缓存：topic -> 设备ID、主题配置ID、预编译的解析对象和编解码器
+        self._route_cache: Dict[str, IngestRoute] = {}
+        self._route_generation = 0
+        # 其他进程修改配置后递增的共享缓存代数（定期检查）
+        self._shared_generation: Optional[int] = None
+        self._shared_generation_checked = 0.0
+
+    @property
+    def client(self) -> Optional[mqtt.Client]:
+        """第一个MQTT服务器的客户端（兼容单服务器用法）"""
+        broker = next(iter(self.brokers.values()), None)
+        return broker.client if broker else None
+
+    @property
+    def is_connected(self) -> bool:
+        """是否至少有一个MQTT服务器已连接"""
+        return any(broker.is_connected for broker in self.brokers.values())
 
     def init_mqtt_client(self) -> bool:
-        """初始化MQTT客户端"""
+        """初始化MQTT客户端（每个MQTT服务器一个客户端）"""
         try:
             self.db = SessionLocal()
             
+            # 预热传感器配置ID缓存，数据接收时无需逐字段查询配置
+            cached = sensor_config_service.warm_sensor_config_cache(self.db)
+            logger.info(f"已缓存 {cached} 个传感器配置")
+            policies = storage_policy.load_storage_policies(self.db)
+            if policies:
+                logger.info(f"已加载 {policies} 个传感器存储策略")
+            rules = alert_rules.load_alert_rules(self.db)
+            if rules:
+                logger.info(f"已加载 {rules} 条告警规则")
+            
             # 获取所有激活的主题配置
             active_configs = topic_config_service.get_active_topic_configs(self.db)
             
@@ -39,356 +128,525 @@ class MQTTService:
                 logger.warning("没有激活的主题配置")
                 return False
 
-            # 检查是否所有激活的配置都使用相同的MQTT服务器
-            mqtt_config_ids = set(config.mqtt_config_id for config in active_configs if config.mqtt_config_id)
+            # 按MQTT服务器分组订阅主题
+            topics_by_broker = self._topics_by_broker(active_configs)
             
-            if len(mqtt_config_ids) > 1:
-                logger.warning("多个激活的配置使用不同的MQTT服务器，使用第一个配置的服务器")
+            brokers: Dict[int, BrokerConnection] = {}
+            for mqtt_config_id, topics in topics_by_broker.items():
+                mqtt_config = self.db.query(MQTTConfigModel).filter(
+                    MQTTConfigModel.id == mqtt_config_id
+                ).first()
+                
+                if not mqtt_config:
+                    logger.error(f"未找到ID为 {mqtt_config_id} 的MQTT配置")
+                    continue
+                
+                brokers[mqtt_config_id] = self._create_broker(mqtt_config, topics)
             
-            # 获取第一个配置的MQTT配置
-            first_config = active_configs[0]
-            if not first_config.mqtt_config_id:
-                logger.error("主题配置没有关联的MQTT配置")
+            if not brokers:
+                logger.error("没有可用的MQTT配置")
                 return False
             
-            mqtt_config = self.db.query(MQTTConfigModel).filter(
-                MQTTConfigModel.id == first_config.mqtt_config_id
-            ).first()
-            
-            if not mqtt_config:
-                logger.error(f"未找到ID为 {first_config.mqtt_config_id} 的MQTT配置")
-                return False
-
-            # 创建MQTT客户端
-            self.client = mqtt.Client()
-            self.client.on_connect = self.on_connect
-            self.client.on_disconnect = self.on_disconnect
-            self.client.on_message = self.on_message
-
-            # 设置用户名密码（如果有）
-            if mqtt_config.username and mqtt_config.password:
-                self.client.username_pw_set(mqtt_config.username, mqtt_config.password)
-
-            # 连接MQTT服务器
-            self.client.connect(mqtt_config.server, mqtt_config.port, 60)
-            logger.info(f"MQTT客户端初始化成功，连接到 {mqtt_config.server}:{mqtt_config.port}")
+            self.brokers = brokers
+            logger.info(f"MQTT客户端初始化成功，共 {len(brokers)} 个MQTT服务器")
             return True
         except Exception as e:
             logger.error(f"初始化MQTT客户端失败: {e}", exc_info=True)
             return False
 
-    def on_connect(self, client, userdata, flags, rc):
-        """连接成功回调"""
-        if rc == 0:
-            logger.info("MQTT连接成功，开始订阅主题...")
-            self.is_connected = True
-            # 订阅主题（这是正常的，用于接收传感器数据）
-            self.subscribe_to_topics()
-            logger.info("主题订阅完成")
-        else:
-            logger.error(f"MQTT连接失败，返回码: {rc}")
+    def _topics_by_broker(self, active_configs: List[TopicConfigModel]) -> Dict[int, List[str]]:
+        """按MQTT服务器分组激活的主题配置中的订阅主题：mqtt_config_id -> 主题列表"""
+        topics_by_broker: Dict[int, List[str]] = {}
+        for config in active_configs:
+            if not config.mqtt_config_id:
+                logger.error(f"主题配置 {config.name} 没有关联的MQTT配置，跳过")
+                continue
+            topics = topics_by_broker.setdefault(config.mqtt_config_id, [])
+            for topic in self.parse_topics(config.subscribe_topics):
+                if topic not in topics:
+                    topics.append(topic)
+        return topics_by_broker
+
+    def reconcile(self) -> bool:
+        """
+        按当前激活的主题配置增量调整订阅（主题配置修改后调用）
+        
+        已连接的服务器只对增减的主题发送 SUBSCRIBE / UNSUBSCRIBE；连接参数变化的服务器单独重建客户端，
+        新增或不再使用的服务器单独连接或断开。数据接收流水线和写缓冲不停止，消息接收不中断。
+        """
+        with self._reconcile_lock:
+            if not self._started:
+                # 尚未启动（如启动时没有激活的主题配置），按完整流程启动
+                return self.start()
+            try:
+                with SessionLocal() as db:
+                    active_configs = topic_config_service.get_active_topic_configs(db)
+                    topics_by_broker = self._topics_by_broker(active_configs)
+                    mqtt_configs = {
+                        config.id: config
+                        for config in db.query(MQTTConfigModel).filter(
+                            MQTTConfigModel.id.in_(list(topics_by_broker))
+                        ).all()
+                    }
+                    # 预编译新的解析配置和编解码器，再使路由缓存失效：
+                    # 处理中的消息继续使用旧路由，之后的消息使用新路由
+                    for config in active_configs:
+                        payload_parser.get_parser(config.id, config.json_parse_config)
+                        payload_codecs.get_codec(config.id, config.payload_codec, config.codec_options)
+                self.invalidate_route_cache()
+                
+                brokers = dict(self.brokers)
+                for mqtt_config_id in list(brokers):
+                    if mqtt_config_id not in mqtt_configs:
+                        logger.info(f"MQTT服务器 {brokers[mqtt_config_id].name} 已没有激活的主题配置，断开连接")
+                        brokers.pop(mqtt_config_id).stop()
+                
+                for mqtt_config_id, topics in topics_by_broker.items():
+                    mqtt_config = mqtt_configs.get(mqtt_config_id)
+                    if mqtt_config is None:
+                        logger.error(f"未找到ID为 {mqtt_config_id} 的MQTT配置")
+                        continue
+                    broker = brokers.get(mqtt_config_id)
+                    if broker is not None and not broker.same_connection(
+                        mqtt_config.server, mqtt_config.port, mqtt_config.username, mqtt_config.password
+                    ):
+                        logger.info(f"MQTT服务器 {broker.name} 的连接参数已变化，重建客户端")
+                        broker.stop()
+                        broker = None
+                    if broker is None:
+                        broker = self._create_broker(mqtt_config, topics)
+                        brokers[mqtt_config_id] = broker
+                        broker.start()
+                    else:
+                        broker.update_topics(topics)
+                
+                self.brokers = brokers
+                logger.info(f"MQTT订阅已按主题配置更新，共 {len(brokers)} 个MQTT服务器")
+                return True
+            except Exception as e:
+                logger.error(f"更新MQTT订阅失败: {e}", exc_info=True)
+                return False
 
-    def on_disconnect(self, client, userdata, rc):
-        """断开连接回调"""
-        logger.warning("MQTT连接断开")
-        self.is_connected = False
+    def _create_broker(self, mqtt_config: MQTTConfigModel, topics: List[str]) -> BrokerConnection:
+        """为MQTT配置创建客户端连接，所有连接的消息进入同一个数据接收流水线"""
+        return BrokerConnection(
+            mqtt_config_id=mqtt_config.id,
+            name=mqtt_config.name,
+            server=mqtt_config.server,
+            port=mqtt_config.port,
+            username=mqtt_config.username,
+            password=mqtt_config.password,
+            topics=topics,
+            on_message=self.on_message,
+            keepalive=settings.mqtt_keepalive,
+            shared_group=settings.mqtt_shared_group,
+            client_id=self._client_id(mqtt_config.id),
+            clean_session=settings.mqtt_clean_session,
+            qos=settings.mqtt_subscribe_qos,
+            session_dir=settings.mqtt_session_dir,
+            on_drain=self._on_broker_drain,
+            on_publish=self._on_broker_publish,
+            drain_idle_seconds=settings.mqtt_drain_idle_ms / 1000.0,
+            drain_max_seconds=settings.mqtt_drain_max_seconds
+        )
+
+    def _client_id(self, mqtt_config_id: int) -> str:
+        """固定的客户端ID（持久会话按客户端ID保存），每个MQTT服务器一个；本机多个进程时由连接加序号区分"""
+        prefix = settings.mqtt_client_id or f"mqtt-iot-{socket.gethostname()}"
+        return f"{prefix}-{mqtt_config_id}"
+
+    def _on_broker_publish(self, broker: BrokerConnection, mid: int):
+        """发布完成回调（网络线程）"""
+        self.publish_tracker.published(broker.mqtt_config_id, mid)
+
+    def _on_broker_drain(self, broker: BrokerConnection, draining: bool):
+        """排空积压消息期间增大写缓冲批大小，减少提交次数"""
+        if draining or any(b.draining for b in self.brokers.values()):
+            batch_size = settings.mqtt_drain_batch_size
+        else:
+            batch_size = settings.ingest_batch_size
+        self.write_buffer.set_batch_size(batch_size)
 
     def subscribe_to_topics(self):
-        """订阅主题"""
-        if not self.client or not self.db:
+        """重新订阅所有MQTT服务器的主题"""
+        if not self.brokers:
             logger.warning("MQTT客户端未初始化")
             return
 
-        try:
-            active_configs = topic_config_service.get_active_topic_configs(self.db)
-            
-            for topic_config in active_configs:
-                topics = self.parse_topics(topic_config.subscribe_topics)
-                for topic in topics:
-                    self.client.subscribe(topic)
-                    logger.info(f"已订阅主题: {topic} (来自配置: {topic_config.name})")
-        except Exception as e:
-            logger.error(f"订阅主题失败: {e}", exc_info=True)
+        for broker in self.brokers.values():
+            if broker.is_connected:
+                broker.subscribe_to_topics()
 
-    def parse_topics(self, topics_str: str) -> List[str]:
-        """解析主题字符串为列表"""
-        if not topics_str:
-            return []
+    def get_broker_for_topic(self, topic: str) -> Optional[BrokerConnection]:
+        """
+        选择发布主题所属的MQTT服务器
         
-        try:
-            # 尝试解析为JSON数组
-            parsed = json.loads(topics_str)
-            if isinstance(parsed, list):
-                return parsed
-        except (json.JSONDecodeError, TypeError):
-            # 如果不是JSON格式，则按换行符或逗号分割
-            if '\n' in topics_str:
-                return [t.strip() for t in topics_str.split('\n') if t.strip()]
-            else:
-                return [t.strip() for t in topics_str.split(',') if t.strip()]
+        优先使用 publish_topic 为该主题的主题配置所属服务器，其次是订阅了该主题的配置，
+        都没有时使用第一个服务器。
+        """
+        if not self.brokers:
+            return None
         
-        return []
+        with SessionLocal() as db:
+            routing_table = topic_config_service.get_routing_table(db)
+        
+        route = routing_table.match_publish_topic(topic)
+        if route and route.mqtt_config_id in self.brokers:
+            return self.brokers[route.mqtt_config_id]
+        for route in routing_table.match(topic):
+            if route.mqtt_config_id in self.brokers:
+                return self.brokers[route.mqtt_config_id]
+        return next(iter(self.brokers.values()))
+
+    def get_broker_status(self) -> List[Dict[str, Any]]:
+        """各MQTT服务器的连接状态"""
+        return [broker.status() for broker in self.brokers.values()]
 
-    def on_message(self, client, userdata, msg):
-        """消息接收回调"""
-        logger.debug(f"收到消息: {msg.topic} - {msg.payload.decode()}")
-        try:
-            payload = msg.payload.decode()
-            self.process_sensor_data(payload, msg.topic)
-        except Exception as e:
-            logger.error(f"处理消息时出错: {e}", exc_info=True)
+    def parse_topics(self, topics_str: str) -> List[str]:
+        """解析主题字符串为列表"""
+        return topic_config_service.parse_subscribe_topics(topics_str)
 
-    def process_sensor_data(self, payload: str, topic: str):
-        """处理传感器数据"""
-        logger.debug(f"处理传感器数据，Topic: {topic}, Payload: {payload}")
+    def on_message(self, client, userdata, msg):
+        """消息接收回调（在网络线程中执行，只负责入队）"""
+        logger.debug(f"收到消息: {msg.topic} ({len(msg.payload)} 字节)")
+        received_at = time.time()
+        if self.recorder:
+            self.recorder.record(received_at, msg.topic, msg.payload)
+        self.pipeline.submit(msg.topic, msg.payload, received_at)
+
+    def handle_ingest_message(self, message: IngestMessage):
+        """处理一条已入队的消息（在工作线程中执行，payload 保持原始字节，由编解码器或自动识别解码）"""
+        self.process_sensor_data(message.payload, message.topic, datetime.utcfromtimestamp(message.received_at))
+
+    @property
+    def ingest_db(self) -> Session:
+        """
+        当前线程的数据接收会话（每个工作线程一个独立会话）
+
+        使用专用写引擎，设备、传感器配置和告警事件的写入与读数批量写入在进程内排队，
+        不互相争抢 SQLite 写锁；每条消息处理完都会结束事务，把唯一的写连接还给连接池。
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = WriterSessionLocal()
+            self._local.db = db
+            with self._ingest_sessions_lock:
+                self._ingest_sessions.append(db)
+        return db
+
+    @property
+    def _pending_rows(self) -> List[Dict[str, Any]]:
+        """当前线程正在处理的消息中待写入的读数"""
+        rows = getattr(self._local, "pending_rows", None)
+        if rows is None:
+            rows = self._local.pending_rows = []
+        return rows
+
+    @_pending_rows.setter
+    def _pending_rows(self, rows: List[Dict[str, Any]]):
+        self._local.pending_rows = rows
+
+    def process_sensor_data(self, payload: Union[str, bytes], topic: str, received_at: Optional[datetime] = None):
+        """
+        处理传感器数据
         
-        if not self.db:
-            self.db = SessionLocal()
+        Args:
+            payload: 消息内容（文本或原始字节）
+            topic: 消息主题
+            received_at: 消息接收时间（UTC），为空时使用当前时间
+        """
+        logger.debug(f"处理传感器数据，Topic: {topic}, Payload: {payload}")
         
+        db = self.ingest_db
+        self._pending_rows = []
         try:
-            # 从topic中提取设备信息
-            parts = topic.split('/')
-            if len(parts) < 2:
-                logger.warning(f"主题格式不正确，跳过处理: {topic}")
-                return
-            
-            # 尝试多种设备名匹配策略
-            device_prefix = parts[0]
-            device_id = parts[1]
-            potential_device_names = [
-                f"{device_prefix}_{device_id}",
-                device_id,
-                device_prefix,
-                f"{device_prefix}/{device_id}"
-            ]
+            self._sync_shared_caches(db)
+            # 优先使用路由缓存，稳定状态下无需任何查询
+            route = self._route_cache.get(topic)
+            if route is None:
+                generation = self._route_generation
+                route = self._resolve_route(topic)
+                if route is None:
+                    metrics.MESSAGES_RECEIVED.labels("none").inc()
+                    return
+                # 解析期间缓存被失效过则不写入，避免缓存旧路由
+                if generation == self._route_generation:
+                    self._route_cache[topic] = route
             
-            device = None
-            device_name = None
-            for potential_name in potential_device_names:
-                device = self.db.query(DeviceModel).filter(DeviceModel.name == potential_name).first()
-                if device:
-                    device_name = potential_name
-                    logger.debug(f"找到设备: {device_name}")
-                    break
-            
-            # 如果没找到，创建新设备
-            if not device:
-                device_name = f"{device_prefix}_{device_id}"
-                logger.info(f"未找到现有设备，将创建新设备: {device_name}")
-                device = DeviceModel(
-                    name=device_name,
-                    device_type="自动创建设备",
-                    status="在线",
-                    location="未知位置",
-                    remark=None,  # 备注字段，可在编辑时填写
-                    show_on_dashboard=True,  # 默认在首页展示
-                    created_at=datetime.utcnow()  # 设置设备创建时间
-                )
-                
-                # 尝试为新设备自动匹配主题配置
-                from services import topic_config_service
-                matched_config = topic_config_service.find_topic_config_by_device_name(self.db, device_name)
-                if matched_config:
-                    device.topic_config_id = matched_config.id
-                    logger.info(f"自动为新设备匹配到主题配置: {matched_config.name}")
-                
-                self.db.add(device)
-                self.db.commit()
-                self.db.refresh(device)
-            
-            # 获取解析配置
-            json_parse_config = None
-            if device.topic_config_id:
-                from models.topic_config import TopicConfigModel
-                config = self.db.query(TopicConfigModel).filter(TopicConfigModel.id == device.topic_config_id).first()
-                if config and config.json_parse_config:
-                    json_parse_config = config.json_parse_config
-            
-            # 如果设备没有关联配置，尝试根据当前主题直接查找配置
-            if not json_parse_config:
-                from models.topic_config import TopicConfigModel
-                active_configs = self.db.query(TopicConfigModel).filter(TopicConfigModel.is_active == True).all()
-                for config in active_configs:
-                    topics = self.parse_topics(config.subscribe_topics)
-                    if topic in topics and config.json_parse_config:
-                        json_parse_config = config.json_parse_config
-                        # 如果设备还没有关联配置，顺便关联一下
-                        if not device.topic_config_id:
-                            device.topic_config_id = config.id
-                            self.db.commit()
-                        break
+            device_id = route.device_id
+            metrics.MESSAGES_RECEIVED.labels(str(route.topic_config_id) if route.topic_config_id else "none").inc()
 
             # 解析并保存传感器数据
-            self.parse_and_save_sensor_data(device.id, payload, json_parse_config)
-            self.db.commit()
-            logger.debug(f"传感器数据已保存: 设备={device_name}")
+            self.parse_and_save_sensor_data(device_id, payload, route.parser, received_at, route.codec)
+            started = time.perf_counter()
+            db.commit()
+            metrics.COMMIT_SECONDS.observe(time.perf_counter() - started)
+            # 设备和传感器配置已提交，读数交给写缓冲批量写入
+            self.write_buffer.add(self._pending_rows)
+            logger.debug(f"传感器数据已加入写缓冲: 设备ID={device_id}, Topic={topic}")
         except Exception as e:
             logger.error(f"保存传感器数据时出错: {e}", exc_info=True)
-            if self.db:
-                self.db.rollback()
+            metrics.INGEST_ERRORS.inc()
+            db.rollback()
+            # 回滚后本次新建的传感器配置不存在，清空配置ID缓存
+            sensor_config_service.invalidate_sensor_config_cache()
+            # 本条消息的读数未写入，不能作为存储策略比较的上次写入值，告警事件也未记录
+            for row in self._pending_rows:
+                storage_policy.forget(row["sensor_config_id"])
+                alert_rules.reset_state(row["sensor_config_id"])
+        finally:
+            self._pending_rows = []
+            if db.in_transaction():
+                # 未提交就返回（如主题格式不正确）时也结束事务，释放写连接
+                db.rollback()
+
+    def _resolve_route(self, topic: str) -> Optional[IngestRoute]:
+        """
+        根据主题查找（或自动创建）设备及其解析配置
+        
+        Returns:
+            主题路由，主题格式不正确时返回 None
+        """
+        db = self.ingest_db
+        
+        # 从topic中提取设备信息
+        parts = topic.split('/')
+        if len(parts) < 2:
+            logger.warning(f"主题格式不正确，跳过处理: {topic}")
+            return None
+        
+        # 尝试多种设备名匹配策略
+        device_prefix = parts[0]
+        device_id = parts[1]
+        potential_device_names = [
+            f"{device_prefix}_{device_id}",
+            device_id,
+            device_prefix,
+            f"{device_prefix}/{device_id}"
+        ]
+        
+        device = None
+        device_name = None
+        for potential_name in potential_device_names:
+            device = db.query(DeviceModel).filter(DeviceModel.name == potential_name).first()
+            if device:
+                device_name = potential_name
+                logger.debug(f"找到设备: {device_name}")
+                break
+        
+        # 如果没找到，创建新设备
+        if not device:
+            device_name = f"{device_prefix}_{device_id}"
+            logger.info(f"未找到现有设备，将创建新设备: {device_name}")
+            device = DeviceModel(
+                name=device_name,
+                device_type="自动创建设备",
+                status="在线",
+                location="未知位置",
+                remark=None,  # 备注字段，可在编辑时填写
+                show_on_dashboard=True,  # 默认在首页展示
+                created_at=datetime.utcnow()  # 设置设备创建时间
+            )
+            
+            # 尝试为新设备自动匹配主题配置
+            matched_config = topic_config_service.find_topic_config_by_device_name(db, device_name)
+            if matched_config:
+                device.topic_config_id = matched_config.id
+                logger.info(f"自动为新设备匹配到主题配置: {matched_config.name}")
+            
+            db.add(device)
+            try:
+                db.commit()
+            except IntegrityError:
+                # 多个接收进程（共享订阅）可能同时创建同一设备，以已提交的设备为准
+                db.rollback()
+                device = db.query(DeviceModel).filter(DeviceModel.name == device_name).first()
+                if not device:
+                    raise
+            db.refresh(device)
+        
+        # 获取解析配置和消息编解码器
+        json_parse_config = None
+        payload_codec = None
+        codec_options = None
+        topic_config_id = device.topic_config_id
+        if device.topic_config_id:
+            config = db.query(TopicConfigModel).filter(TopicConfigModel.id == device.topic_config_id).first()
+            if config and (config.json_parse_config or config.payload_codec):
+                json_parse_config = config.json_parse_config
+                payload_codec = config.payload_codec
+                codec_options = config.codec_options
+        
+        # 如果设备没有关联配置，尝试根据当前主题（支持通配符订阅）直接查找配置
+        if not json_parse_config and not payload_codec:
+            routing_table = topic_config_service.get_routing_table(db)
+            for config in routing_table.match(topic):
+                if config.json_parse_config or config.payload_codec:
+                    json_parse_config = config.json_parse_config
+                    payload_codec = config.payload_codec
+                    codec_options = config.codec_options
+                    topic_config_id = config.config_id
+                    # 如果设备还没有关联配置，顺便关联一下
+                    if not device.topic_config_id:
+                        device.topic_config_id = config.config_id
+                        db.commit()
+                    break
+        
+        return IngestRoute(
+            device.id,
+            topic_config_id,
+            payload_parser.get_parser(topic_config_id, json_parse_config),
+            payload_codecs.get_codec(topic_config_id, payload_codec, codec_options)
+        )
 
-    def parse_and_save_sensor_data(self, device_id: int, payload: str, json_parse_config: str = None):
-        """解析并保存传感器数据"""
+    def _sync_shared_caches(self, db: Session):
+        """
+        其他进程修改了设备、主题或传感器配置时（共享缓存代数变化），清除本进程的路由和传感器配置ID缓存
+
+        每隔 ingest_cache_sync_interval_ms 毫秒查询一次缓存代数。
+        """
+        now = time.monotonic()
+        if now - self._shared_generation_checked < settings.ingest_cache_sync_interval_ms / 1000.0:
+            return
+        self._shared_generation_checked = now
+        generation = cache_sync.get_generation(db)
+        if self._shared_generation is not None and generation != self._shared_generation:
+            logger.info("配置已被其他进程修改，清除主题路由和传感器配置ID缓存")
+            topic_config_service.invalidate_routing_table()
+            sensor_config_service.invalidate_sensor_config_cache()
+            self.invalidate_route_cache()
+        self._shared_generation = generation
+
+    def invalidate_route_cache(self):
+        """清空主题路由缓存（设备或主题配置变更后调用）"""
+        self._route_generation += 1
+        self._route_cache = {}
+
+    def parse_and_save_sensor_data(
+        self,
+        device_id: int,
+        payload: Union[str, bytes],
+        parser: Optional[CompiledPayloadParser] = None,
+        timestamp: Optional[datetime] = None,
+        codec: Optional[PayloadCodec] = None
+    ):
+        """
+        解析并保存传感器数据
+        
+        主题配置声明了编解码器时由编解码器解码；否则依次识别继电器命令、JSON 和文本格式。
+        """
         # 首先检查是否是继电器控制消息（relayon/relayoff）
-        payload_stripped = payload.strip()
-        payload_lower = payload_stripped.lower()
+        if isinstance(payload, bytes):
+            # 继电器命令很短，只对短消息做文本判断，二进制消息不必整体解码
+            payload_lower = payload.strip().lower() if len(payload) <= 16 else b''
+            payload_lower = payload_lower.decode('ascii', errors='ignore')
+        else:
+            payload_lower = payload.strip().lower()
         
+        # 命令主题上的 relayon/relayoff 可能是服务器回显的本系统命令，不能用来确认命令是否生效
         if payload_lower == 'relayon':
-            self.save_sensor_data(device_id, 'Relay Status', 1, '', '继电器')
+            self.save_sensor_data(device_id, 'Relay Status', 1, '', '继电器', timestamp, confirm_relay=False)
             logger.info(f"收到继电器开启命令，设备ID: {device_id}")
             return
         elif payload_lower == 'relayoff':
-            self.save_sensor_data(device_id, 'Relay Status', 0, '', '继电器')
+            self.save_sensor_data(device_id, 'Relay Status', 0, '', '继电器', timestamp, confirm_relay=False)
             logger.info(f"收到继电器关闭命令，设备ID: {device_id}")
             return
 
-        # 尝试作为 JSON 解析
-        try:
-            data = json.loads(payload_stripped)
-            if isinstance(data, dict):
-                logger.debug(f"成功解析 JSON 数据: {data}")
-                
-                # 如果有自定义解析配置
-                if json_parse_config:
-                    try:
-                        parse_map = json.loads(json_parse_config)
-                        for key, config in parse_map.items():
-                            if key in data:
-                                # 确保 config 是字典类型，如果不是，创建一个默认配置
-                                if not isinstance(config, dict):
-                                    logger.warning(f"JSON 配置格式错误: {key} 的配置不是字典类型，使用默认配置")
-                                    config = {'type': key, 'unit': ''}
-                                
-                                # 核心改进：优先保持原始 key 作为 type，config 中的 type 作为 display_name 或 备用 type
-                                # 如果 config 中有 type，且不等于 key，我们把它视为 display_name
-                                raw_value = data[key]
-                                
-                                # 解析配置中的信息
-                                conf_type = config.get('type', key)
-                                unit = config.get('unit', '')
-                                display_name = config.get('display_name') or config.get('name')
-                                
-                                # 如果配置里的 type 和原始 key 不一样，且没有显式的 display_name，
-                                # 则把配置里的 type 当作 display_name
-                                if not display_name and conf_type != key:
-                                    display_name = conf_type
-                                
-                                # 处理值的类型转换
-                                processed_value = raw_value
-                                key_lower = key.lower()
-                                
-                                # 如果是字符串类型的继电器/开关状态，转换为数字
-                                if isinstance(raw_value, str):
-                                    value_lower = raw_value.lower().strip()
-                                    if key_lower in ['relay_status', 'relay', 'switch', 'switch_status', 'realy_in_status', 'relay_in_status'] or \
-                                       'relay' in key_lower or 'switch' in key_lower or 'realy' in key_lower:
-                                        # 转换常见的开关状态字符串为数字
-                                        if value_lower in ['on', 'open', 'true', '1', 'active', 'enabled']:
-                                            processed_value = 1
-                                        elif value_lower in ['off', 'close', 'false', '0', 'inactive', 'disabled']:
-                                            processed_value = 0
-                                        else:
-                                            # 尝试直接转换为数字
-                                            try:
-                                                processed_value = float(raw_value)
-                                            except ValueError:
-                                                logger.warning(f"无法转换继电器状态值: {raw_value}，跳过该字段")
-                                                continue
-                                elif not isinstance(raw_value, (int, float)):
-                                    # 如果不是数字也不是字符串，尝试转换为浮点数
-                                    try:
-                                        processed_value = float(raw_value)
-                                    except (ValueError, TypeError):
-                                        logger.warning(f"无法转换值类型: {raw_value} ({type(raw_value)}), 跳过字段 {key}")
-                                        continue
-                                
-                                # 始终以原始 key 作为数据库的 type，除非配置中明确要求覆盖（这里我们选择保留原始 key 为 type 以便区分）
-                                self.save_sensor_data(device_id, key, processed_value, unit, display_name)
-                        return # 使用 JSON 配置解析成功，直接返回
-                    except Exception as e:
-                        logger.error(f"使用自定义 JSON 配置解析失败: {e}")
-                        # 记录详细的调试信息
-                        logger.error(f"JSON 配置内容: {json_parse_config}")
-                        logger.error(f"接收到的数据: {data}")
-                
-                # 默认 JSON 解析逻辑（如果没有配置或解析失败）
-                for key, value in data.items():
-                    sensor_type = key
-                    unit = ''
-                    display_name = None
-                    processed_value = value
-                    
-                    key_lower = key.lower()
-                    
-                    # 处理字符串类型的继电器/开关状态
-                    if isinstance(value, str):
-                        value_lower = value.lower().strip()
-                        if key_lower in ['relay_status', 'relay', 'switch', 'switch_status', 'realy_in_status', 'relay_in_status'] or \
-                           'relay' in key_lower or 'switch' in key_lower or 'realy' in key_lower:
-                            if value_lower in ['on', 'open', 'true', '1', 'active', 'enabled']:
-                                processed_value = 1
-                            elif value_lower in ['off', 'close', 'false', '0', 'inactive', 'disabled']:
-                                processed_value = 0
-                            else:
-                                logger.warning(f"无法识别继电器状态值: {value}，跳过字段 {key}")
-                                continue
-                            
-                            # 支持两种拼写：realy_in_status（错误拼写）和 relay_in_status（正确拼写）
-                            if key_lower in ['realy_in_status', 'relay_in_status']:
-                                display_name = "继电器输入"
-                            else:
-                                display_name = "继电器"
-                        else:
-                            # 非继电器类型的字符串，跳过
-                            continue
-                    elif isinstance(value, (int, float)):
-                        if 'temp' in key_lower:
-                            unit = '°C'
-                            # 尝试生成一个友好的显示名称，例如 air_temperature_1 -> 温度 1
-                            num_match = re.search(r'\d+', key)
-                            num = num_match.group() if num_match else ""
-                            display_name = f"温度{num}" if num else "温度"
-                        elif 'hum' in key_lower:
-                            unit = '%'
-                            num_match = re.search(r'\d+', key)
-                            num = num_match.group() if num_match else ""
-                            display_name = f"湿度{num}" if num else "湿度"
-                        elif 'relay' in key_lower or 'realy' in key_lower:
-                            # 支持两种拼写：realy_in_status（错误拼写）和 relay_in_status（正确拼写）
-                            if key_lower in ['realy_in_status', 'relay_in_status']:
-                                display_name = "继电器输入"
-                            else:
-                                display_name = "继电器"
-                    else:
-                        # 其他类型，跳过
-                        continue
-                    
-                    self.save_sensor_data(device_id, sensor_type, processed_value, unit, display_name)
+        if codec is not None:
+            # 按主题配置声明的编解码器解码，不再尝试 JSON 和正则
+            path = codec.name
+            try:
+                decoded = codec.decode(payload.encode() if isinstance(payload, str) else payload)
+            except Exception as e:
+                metrics.PARSE_FAILURES.labels(path).inc()
+                logger.warning(f"消息解码失败（{path}）: {e}")
                 return
-        except json.JSONDecodeError:
-            pass # 不是 JSON 格式，继续使用正则解析
-
-        # 匹配常见的传感器数据格式（正则解析）
-        patterns = [
-            (r'Temperature1:\s*([\d.]+)\s*C', 'Temperature1', '°C', '温度1'),
-            (r'Humidity1:\s*([\d.]+)\s*%', 'Humidity1', '%', '湿度1'),
-            (r'Temperature2:\s*([\d.]+)\s*C', 'Temperature2', '°C', '温度2'),
-            (r'Humidity2:\s*([\d.]+)\s*%', 'Humidity2', '%', '湿度2'),
-            (r'Relay Status:\s*(\d)', 'Relay Status', '', '继电器'),
-            (r'PB8 Level:\s*(\d)', 'PB8 Level', '', 'PB8电平'),
-        ]
-        
-        for pattern, sensor_type, unit, display_name in patterns:
-            match = re.search(pattern, payload)
-            if match:
+            if codec.structured:
+                timed_readings = self._parse_structured(decoded, parser, timestamp) or []
+            else:
+                received_at = timestamp or datetime.utcnow()
+                timed_readings = [
+                    (payload_parser.check_timestamp(reading_time, received_at), reading)
+                    for reading_time, reading in decoded
+                ]
+        else:
+            if isinstance(payload, bytes):
                 try:
-                    value = float(match.group(1)) if unit != '' else int(match.group(1))
-                    self.save_sensor_data(device_id, sensor_type, value, unit, display_name)
-                except ValueError as e:
-                    logger.warning(f"转换数值失败: {match.group(1)}, 错误: {e}")
-
-    def save_sensor_data(self, device_id: int, sensor_type: str, value: float, unit: str, display_name: str = None):
-        """保存传感器数据到数据库（使用新架构：配置和数据分离）"""
+                    payload = payload.decode()
+                except UnicodeDecodeError:
+                    metrics.PARSE_FAILURES.labels("regex").inc()
+                    logger.warning(f"消息不是有效的UTF-8文本，跳过（设备ID: {device_id}）")
+                    return
+            
+            # 尝试作为 JSON 解析
+            try:
+                data = json.loads(payload.strip())
+            except json.JSONDecodeError:
+                data = None  # 不是 JSON 格式，继续使用正则解析
+            
+            path = "json_config" if parser else "default_json"
+            timed_readings = self._parse_structured(data, parser, timestamp)
+            if timed_readings is None:
+                # 匹配常见的传感器数据格式（正则解析）
+                path = "regex"
+                timed_readings = [(timestamp, reading) for reading in payload_parser.parse_text(payload)]
+        
+        if not timed_readings:
+            # 没有解析出任何读数
+            metrics.PARSE_FAILURES.labels(path).inc()
+            logger.debug(f"未能从消息中解析出传感器数据（{path}）: {payload}")
+            return
+        
+        # 同一条消息的全部读数在消息事务提交后一起交给写缓冲，以一次批量INSERT写入
+        for reading_time, (sensor_type, value, unit, display_name) in timed_readings:
+            self.save_sensor_data(device_id, sensor_type, value, unit, display_name, reading_time)
+
+    def _parse_structured(
+        self,
+        data: Any,
+        parser: Optional[CompiledPayloadParser],
+        timestamp: Optional[datetime]
+    ) -> Optional[List[Tuple[Optional[datetime], payload_parser.Reading]]]:
+        """
+        解析 JSON 等结构化消息，返回带时间的读数；data 不是对象或列表时返回 None
+        
+        有预编译的解析配置时按配置解析，否则使用默认 JSON 解析逻辑
+        """
+        json_parser = parser or payload_parser.default_json_parser
+        
+        # 批量格式：一条消息包含多组带时间戳的读数（设备离线缓存后补发）
+        batch = None
+        if isinstance(data, (dict, list)):
+            batch = payload_parser.split_batch(data, timestamp or datetime.utcnow())
+        
+        if batch is not None:
+            logger.debug(f"成功解析批量数据: {len(batch)} 组读数")
+            return [
+                (reading_time, reading)
+                for reading_time, fields in batch
+                for reading in json_parser.parse(fields)
+            ]
+        if isinstance(data, dict):
+            logger.debug(f"成功解析 JSON 数据: {data}")
+            return [(timestamp, reading) for reading in json_parser.parse(data)]
+        return None
+
+    def save_sensor_data(
+        self,
+        device_id: int,
+        sensor_type: str,
+        value: float,
+        unit: str,
+        display_name: str = None,
+        timestamp: Optional[datetime] = None,
+        confirm_relay: bool = True
+    ):
+        """
+        保存传感器数据（使用新架构：配置和数据分离，数据经写缓冲批量写入）
+
+        confirm_relay 为 False 时读数不用于确认继电器命令（如收到的 relayon/relayoff 命令本身）
+        """
         # 确定默认的最小值和最大值
         min_value = 0.0
         max_value = 100.0
@@ -402,22 +660,9 @@ class MQTTService:
             min_value = 0.0
             max_value = 100.0
         
-        # 确定告警状态
-        alert_status = 'normal'
-        try:
-            val_float = float(value)
-            if 'temp' in type_lower:
-                if val_float > 30: alert_status = 'alert'
-                elif val_float > 28: alert_status = 'warning'
-            elif 'hum' in type_lower:
-                if val_float > 70: alert_status = 'alert'
-                elif val_float > 65: alert_status = 'warning'
-        except:
-            pass
-        
         # 获取或创建传感器配置（配置只创建一次）
-        sensor_config = sensor_config_service.get_or_create_sensor_config(
-            db=self.db,
+        sensor_config_id = sensor_config_service.get_or_create_sensor_config_id(
+            db=self.ingest_db,
             device_id=device_id,
             sensor_type=sensor_type,
             unit=unit,
@@ -426,60 +671,163 @@ class MQTTService:
             max_value=max_value
         )
         
-        # 创建传感器数据记录（只包含时序数据）
-        sensor_data = SensorDataModel(
-            sensor_config_id=sensor_config.id,
-            value=value,
-            timestamp=datetime.utcnow(),
-            alert_status=alert_status
-        )
-        self.db.add(sensor_data)
+        # 按告警规则判断告警状态，状态变化记录为告警事件（与本条消息一起提交）
+        timestamp = timestamp or datetime.utcnow()
+        alert_status, previous_status = alert_rules.evaluate(sensor_config_id, sensor_type, value, timestamp)
+        if previous_status is not None:
+            logger.info(f"传感器告警状态变化: 配置ID={sensor_config_id}, {previous_status} -> {alert_status}, 值={value}")
+            self.ingest_db.add(AlertEventModel(
+                sensor_config_id=sensor_config_id,
+                previous_status=previous_status,
+                status=alert_status,
+                value=value,
+                timestamp=timestamp
+            ))
+        
+        # 用继电器状态读数确认待确认的继电器命令（需在存储策略过滤之前，未变化的读数也能确认命令）
+        if confirm_relay:
+            self.relay_commands.observe(device_id, sensor_type, value, timestamp)
+        
+        # 按传感器的存储策略（变化时写入、死区、最小间隔等）过滤重复读数，告警状态变化的读数总是写入
+        if not storage_policy.should_store(sensor_config_id, value, timestamp) and previous_status is None:
+            metrics.ROWS_SKIPPED.inc()
+            return
+        
+        # 暂存传感器数据记录（只包含时序数据），消息事务提交后统一交给写缓冲
+        self._pending_rows.append({
+            "sensor_config_id": sensor_config_id,
+            "value": value,
+            "timestamp": timestamp,
+            "alert_status": alert_status
+        })
 
     def start(self) -> bool:
         """启动MQTT服务"""
-        if not self.client:
+        if not self.brokers:
             if not self.init_mqtt_client():
                 return False
         
+        if self._started:
+            return True
+        
         logger.info("启动MQTT服务...")
-        self.client.loop_start()
+        self.write_buffer.start()
+        self.pipeline.start()
+        for broker in self.brokers.values():
+            broker.start()
+        self._started = True
         return True
 
+    def publish_async(self, topic: str, message: str = "", qos: int = 0) -> PublishCommand:
+        """
+        发布消息到指定主题，不等待连接或确认，立即返回发布命令
+        
+        发布结果由 on_publish 回调异步记录，可通过 publish_tracker.get(command_id) 查询。
+        MQTT服务器未连接时 QoS 1/2 消息由客户端保存，重连后发送；QoS 0 消息直接失败。
+        """
+        command = self.publish_tracker.create(topic, message, qos)
+        
+        if not self._started and not self.start():
+            self.publish_tracker.fail(command, "MQTT服务未启动")
+            return command
+        
+        broker = self.get_broker_for_topic(topic)
+        if broker is None:
+            self.publish_tracker.fail(command, "没有可用的MQTT服务器")
+            return command
+        command.broker = broker.name
+        if not broker.is_connected and qos == 0:
+            self.publish_tracker.fail(command, f"MQTT服务器 {broker.name} 未连接")
+            return command
+        
+        try:
+            result = broker.client.publish(topic, message, qos)
+        except Exception as e:
+            self.publish_tracker.fail(command, str(e))
+            return command
+        
+        if result.rc == mqtt.MQTT_ERR_SUCCESS or (result.rc == mqtt.MQTT_ERR_NO_CONN and qos > 0):
+            self.publish_tracker.sent(command, broker.mqtt_config_id, result.mid)
+            logger.info(f"已提交发布: 主题 {topic} (服务器: {broker.name}, 命令ID: {command.command_id}): {message}")
+        else:
+            self.publish_tracker.fail(command, mqtt.error_string(result.rc))
+        return command
+
+    def publish_bulk(
+        self,
+        messages: List[Tuple[str, str]],
+        qos: int = 1,
+        max_in_flight: int = 20,
+        timeout: Optional[float] = None
+    ) -> List[PublishCommand]:
+        """
+        批量发布消息：同时在途（已提交、未确认）的消息不超过 max_in_flight 条，
+        最多等待 timeout 秒（默认为发布超时时间）让全部消息完成
+        
+        Args:
+            messages: (主题, 消息) 列表
+        
+        Returns:
+            与 messages 一一对应的发布命令；超时未完成的命令状态仍为 pending，
+            等待在途消息确认超时后剩余的消息不再发布（状态为 failed）
+        """
+        tracker = self.publish_tracker
+        deadline = time.monotonic() + (tracker.timeout if timeout is None else timeout)
+        max_in_flight = max(max_in_flight, 1)
+        commands: List[PublishCommand] = []
+        in_flight: List[PublishCommand] = []
+        
+        for topic, message in messages:
+            if len(in_flight) >= max_in_flight:
+                if not tracker.wait_for(lambda: any(command.done for command in in_flight), deadline):
+                    # 在途消息迟迟未确认（服务器慢或断开），剩余消息不再发布
+                    command = tracker.create(topic, message, qos)
+                    tracker.fail(command, "等待在途消息确认超时，未发布")
+                    commands.append(command)
+                    continue
+                in_flight = [command for command in in_flight if not command.done]
+            command = self.publish_async(topic, message, qos)
+            commands.append(command)
+            if not command.done:
+                in_flight.append(command)
+        
+        tracker.wait_for(lambda: all(command.done for command in in_flight), deadline)
+        return commands
+
     def publish_message(self, topic: str, message: str = "", qos: int = 0) -> bool:
-        """发布消息到指定主题"""
+        """发布消息到指定主题（同步等待连接和发送完成，最长约6秒；API请求请使用 publish_async）"""
         import time
         
-        if not self.client:
+        if not self._started:
             logger.warning("MQTT客户端未初始化，尝试初始化...")
-            if not self.init_mqtt_client():
-                logger.error("无法初始化MQTT客户端")
-                return False
             if not self.start():
                 logger.error("无法启动MQTT服务")
                 return False
         
+        broker = self.get_broker_for_topic(topic)
+        if broker is None:
+            logger.error("没有可用的MQTT服务器")
+            return False
+        
         # 等待连接完成（最多等待5秒）
-        if not self.is_connected:
-            logger.warning("MQTT未连接，尝试重新连接...")
-            if not self.start():
-                logger.error("无法连接到MQTT服务器")
-                return False
+        if not broker.is_connected:
+            logger.warning(f"MQTT服务器 {broker.name} 未连接，等待重新连接...")
             
             # 等待连接完成
             max_wait = 50  # 最多等待5秒（50 * 0.1秒）
             wait_count = 0
-            while not self.is_connected and wait_count < max_wait:
+            while not broker.is_connected and wait_count < max_wait:
                 time.sleep(0.1)
                 wait_count += 1
             
-            if not self.is_connected:
+            if not broker.is_connected:
                 logger.error("等待MQTT连接超时")
                 return False
         
         try:
             # 发布消息（注意：这是 PUBLISH 操作，不是 SUBSCRIBE）
-            logger.info(f"准备发布消息到主题 {topic}: {message}")
-            result = self.client.publish(topic, message, qos)
+            logger.info(f"准备发布消息到主题 {topic} (服务器: {broker.name}): {message}")
+            result = broker.client.publish(topic, message, qos)
             
             # 等待发布完成（最多等待1秒）
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
@@ -559,11 +907,22 @@ class MQTTService:
 
     def stop(self):
         """停止MQTT服务"""
-        if self.client:
+        if self.brokers:
             logger.info("停止MQTT服务...")
-            self.client.loop_stop()
-            self.client.disconnect()
-            self.is_connected = False
+            for broker in self.brokers.values():
+                broker.stop()
+        self._started = False
+        
+        # 处理完已入队的消息，再写入缓冲中剩余的数据
+        self.pipeline.stop()
+        self.write_buffer.stop()
+        if self.recorder:
+            self.recorder.close()
+        
+        with self._ingest_sessions_lock:
+            for session in self._ingest_sessions:
+                session.close()
+            self._ingest_sessions = []
         
         if self.db:
             self.db.close()
@@ -595,7 +954,64 @@ def stop_mqtt_service():
         _mqtt_service = None
 
 
+def invalidate_route_cache():
+    """使MQTT服务的主题路由缓存失效"""
+    if _mqtt_service:
+        _mqtt_service.invalidate_route_cache()
+
+
 def restart_mqtt_service() -> bool:
     """重启MQTT服务"""
     stop_mqtt_service()
-    return start_mqtt_service()
\ No newline at end of file
+    return start_mqtt_service()
+
+
+def schedule_reconcile():
+    """在后台线程中按主题配置增量调整MQTT订阅，调用方（API请求）不等待MQTT服务器"""
+    service = get_mqtt_service()
+    threading.Thread(target=service.reconcile, name="mqtt-reconcile", daemon=True).start()
+
+
+def collect_metrics() -> List[metrics.MetricFamily]:
+    """采集MQTT服务的运行状态指标（队列深度、连接次数等）"""
+    service = _mqtt_service
+    if service is None:
+        return []
+    
+    pipeline = service.pipeline
+    families = [
+        metrics.MetricFamily("mqtt_ingest_queue_depth", "gauge", "数据接收流水线积压的消息数（队列 + 溢出文件）",
+                             [("mqtt_ingest_queue_depth", (), pipeline.depth)]),
+        metrics.MetricFamily("mqtt_ingest_submitted_total", "counter", "进入数据接收流水线的消息数",
+                             [("mqtt_ingest_submitted_total", (), pipeline.submitted)]),
+        metrics.MetricFamily("mqtt_ingest_dropped_total", "counter", "队列满或溢出文件出错时丢弃的消息数",
+                             [("mqtt_ingest_dropped_total", (), pipeline.dropped)]),
+        metrics.MetricFamily("mqtt_ingest_spilled_total", "counter", "写入溢出文件的消息数",
+                             [("mqtt_ingest_spilled_total", (), pipeline.spilled)]),
+        metrics.MetricFamily("sensor_data_buffer_pending", "gauge", "写缓冲中等待写入的读数条数",
+                             [("sensor_data_buffer_pending", (), service.write_buffer.pending)]),
+    ]
+    
+    connected = metrics.MetricFamily("mqtt_broker_connected", "gauge", "MQTT服务器是否已连接（1 已连接，0 未连接）")
+    connects = metrics.MetricFamily("mqtt_broker_connects_total", "counter", "MQTT服务器连接成功次数（含重连）")
+    disconnects = metrics.MetricFamily("mqtt_broker_disconnects_total", "counter", "MQTT服务器断开连接次数")
+    for broker in list(service.brokers.values()):
+        connected.add(1 if broker.is_connected else 0, broker=broker.name)
+        connects.add(broker.connect_count, broker=broker.name)
+        disconnects.add(broker.disconnect_count, broker=broker.name)
+    families.extend([connected, connects, disconnects])
+    
+    draining = metrics.MetricFamily("mqtt_broker_draining", "gauge", "是否正在排空持久会话中的积压消息（1 是，0 否）")
+    backlog = metrics.MetricFamily("mqtt_drain_backlog_messages", "gauge", "本次（或最近一次）排空收到的积压消息数")
+    rate = metrics.MetricFamily("mqtt_drain_rate", "gauge", "本次（或最近一次）排空速度（条/秒）")
+    drains = metrics.MetricFamily("mqtt_drains_total", "counter", "恢复持久会话后排空积压消息的次数")
+    for broker in list(service.brokers.values()):
+        draining.add(1 if broker.draining else 0, broker=broker.name)
+        backlog.add(broker.drain_messages, broker=broker.name)
+        rate.add(broker.drain_rate, broker=broker.name)
+        drains.add(broker.drain_count, broker=broker.name)
+    families.extend([draining, backlog, rate, drains])
+    return families
+
+
+metrics.registry.register_collector(collect_metrics)
@@ -0,0 +1,247 @@
+"""消息编解码器 - 按主题配置声明的格式解码MQTT消息（JSON / 文本 / MessagePack / CBOR / 定长结构体）"""
+import json
+import math
+import struct
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.logging_config import get_logger
+from services import payload_parser
+from services.payload_parser import Reading
+
+logger = get_logger(__name__)
+
+# 带时间的读数：(读数时间，为空时使用消息接收时间, 读数)
+TimedReading = Tuple[Optional[datetime], Reading]
+
+# struct 格式中允许的字段类型：整数、浮点数和填充字节（x 不产生字段）
+# s / p（字节串）、?（布尔）、c（单字节）、P（指针）不是数值读数，不允许使用
+STRUCT_NUMERIC_FORMATS = set("bBhHiIlLqQnNefd")
+STRUCT_PAD_FORMAT = "x"
+
+
+class PayloadCodec:
+    """
+    消息编解码器基类
+
+    structured 为 True 的编解码器把消息解码为 dict / list，再交给解析配置（或默认JSON解析逻辑）
+    和批量格式处理；为 False 的编解码器直接输出读数列表。
+    """
+    name = ""
+    structured = True
+
+    def decode(self, payload: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(PayloadCodec):
+    name = "json"
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class TextCodec(PayloadCodec):
+    """文本格式（如 Temperature1: 25.5 C），按 payload_parser.TEXT_PATTERNS 正则解析"""
+    name = "text"
+    structured = False
+
+    def decode(self, payload: bytes) -> List[TimedReading]:
+        text = payload.decode("utf-8", errors="replace")
+        return [(None, reading) for reading in payload_parser.parse_text(text)]
+
+
+class MessagePackCodec(PayloadCodec):
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ValueError("使用 msgpack 编解码器需要安装 msgpack（pip install msgpack）")
+        self._unpackb = msgpack.unpackb
+
+    def decode(self, payload: bytes) -> Any:
+        return self._unpackb(payload, raw=False)
+
+
+class CborCodec(PayloadCodec):
+    name = "cbor"
+
+    def __init__(self):
+        try:
+            import cbor2
+        except ImportError:
+            raise ValueError("使用 cbor 编解码器需要安装 cbor2（pip install cbor2）")
+        self._loads = cbor2.loads
+
+    def decode(self, payload: bytes) -> Any:
+        return self._loads(payload)
+
+
+class StructCodec(PayloadCodec):
+    """
+    定长小端结构体
+
+    codec_options 示例::
+
+        {
+            "format": "<IhhB",
+            "fields": [
+                {"timestamp": true},
+                {"type": "Temperature1", "scale": 0.1, "unit": "°C", "display_name": "温度1"},
+                {"type": "Humidity1", "scale": 0.1, "unit": "%"},
+                "Relay Status"
+            ]
+        }
+
+    fields 与 format 中的字段一一对应，字符串等价于 {"type": 字符串}，null 表示跳过该字段；
+    标记 timestamp 的字段为 Unix 秒时间戳。消息长度为结构体长度的整数倍时按多条记录解析。
+    format 只能包含数值字段（整数、浮点数）和填充字节 x；NaN / 无穷大的读数被跳过。
+    """
+    name = "struct"
+    structured = False
+
+    def __init__(self, options: Dict[str, Any]):
+        fmt = options.get("format")
+        if not isinstance(fmt, str):
+            raise ValueError("struct 编解码器需要 format（如 \"<hhB\"）")
+        if fmt[:1] not in "<>!=@":
+            fmt = "<" + fmt  # 默认小端、无对齐
+        for char in fmt[1:]:
+            if char.isdigit() or char.isspace() or char == STRUCT_PAD_FORMAT or char in STRUCT_NUMERIC_FORMATS:
+                continue
+            raise ValueError(f"struct format 只能包含数值字段，不支持 '{char}'")
+        try:
+            self._struct = struct.Struct(fmt)
+        except struct.error as e:
+            raise ValueError(f"struct format 无效: {e}")
+
+        fields = options.get("fields")
+        field_count = len(self._struct.unpack(bytes(self._struct.size)))
+        if not isinstance(fields, list) or len(fields) != field_count:
+            raise ValueError(f"struct fields 数量必须与 format 中的字段数一致（{field_count}）")
+
+        self._timestamp_index: Optional[int] = None
+        # (字段位置, 传感器类型, 缩放, 偏移, 单位, 显示名称)
+        self._plans: List[Tuple[int, str, float, float, str, Optional[str]]] = []
+        for index, field in enumerate(fields):
+            if field is None:
+                continue
+            if isinstance(field, str):
+                field = {"type": field}
+            if not isinstance(field, dict):
+                raise ValueError(f"struct 第 {index + 1} 个字段配置无效")
+            if field.get("timestamp"):
+                self._timestamp_index = index
+                continue
+            sensor_type = field.get("type")
+            if not sensor_type:
+                raise ValueError(f"struct 第 {index + 1} 个字段缺少 type")
+            self._plans.append((
+                index,
+                sensor_type,
+                float(field.get("scale", 1)),
+                float(field.get("offset", 0)),
+                field.get("unit", ""),
+                field.get("display_name")
+            ))
+
+    def decode(self, payload: bytes) -> List[TimedReading]:
+        size = self._struct.size
+        if not payload or len(payload) % size:
+            raise ValueError(f"消息长度 {len(payload)} 不是结构体长度 {size} 的整数倍")
+        readings = []
+        for values in self._struct.iter_unpack(payload):
+            reading_time = None
+            if self._timestamp_index is not None:
+                reading_time = payload_parser.parse_timestamp(values[self._timestamp_index])
+            for index, sensor_type, scale, offset, unit, display_name in self._plans:
+                value = values[index]
+                if scale != 1 or offset:
+                    value = value * scale + offset
+                if isinstance(value, float) and not math.isfinite(value):
+                    # NaN 不能写入数据库（value 不允许为空），跳过该读数
+                    logger.warning(f"struct 字段 {sensor_type} 的值无效: {value}，跳过")
+                    continue
+                readings.append((reading_time, (sensor_type, value, unit, display_name)))
+        return readings
+
+
+# 编解码器注册表：名称 -> 工厂函数（参数为 codec_options 解析后的字典）
+_codec_factories: Dict[str, Callable[[Dict[str, Any]], PayloadCodec]] = {}
+
+
+def register_codec(name: str, factory: Callable[[Dict[str, Any]], PayloadCodec]):
+    """注册编解码器"""
+    _codec_factories[name] = factory
+
+
+def available_codecs() -> List[str]:
+    return sorted(_codec_factories)
+
+
+register_codec(JsonCodec.name, lambda options: JsonCodec())
+register_codec(TextCodec.name, lambda options: TextCodec())
+register_codec(MessagePackCodec.name, lambda options: MessagePackCodec())
+register_codec(CborCodec.name, lambda options: CborCodec())
+register_codec(StructCodec.name, StructCodec)
+
+
+def create_codec(name: str, codec_options: Optional[str] = None) -> PayloadCodec:
+    """
+    创建编解码器
+
+    Raises:
+        ValueError: 编解码器未注册、选项无效或缺少依赖
+    """
+    factory = _codec_factories.get(name)
+    if factory is None:
+        raise ValueError(f"未知的消息编解码器: {name}（可用: {', '.join(available_codecs())}）")
+    options: Dict[str, Any] = {}
+    if codec_options:
+        try:
+            options = json.loads(codec_options)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"codec_options 不是合法的JSON: {e}")
+        if not isinstance(options, dict):
+            raise ValueError("codec_options 必须是JSON对象")
+    return factory(options)
+
+
+# 已创建的编解码器缓存：config_id -> ((名称, 选项), 编解码器)
+_codec_cache: Dict[Optional[int], Tuple[Tuple[str, Optional[str]], Optional[PayloadCodec]]] = {}
+_codec_cache_lock = threading.Lock()
+
+
+def get_codec(config_id: Optional[int], name: Optional[str], codec_options: Optional[str]) -> Optional[PayloadCodec]:
+    """
+    获取主题配置声明的编解码器
+
+    Returns:
+        编解码器；未声明或声明无效时返回 None（自动识别继电器命令 / JSON / 文本）
+    """
+    if not name:
+        return None
+
+    version = (name, codec_options)
+    cached = _codec_cache.get(config_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    try:
+        codec = create_codec(name, codec_options)
+    except ValueError as e:
+        logger.error(f"创建主题配置 {config_id} 的消息编解码器失败，将自动识别消息格式: {e}")
+        codec = None
+
+    with _codec_cache_lock:
+        _codec_cache[config_id] = (version, codec)
+    return codec
+
+
+def clear_codec_cache():
+    """清空编解码器缓存"""
+    with _codec_cache_lock:
+        _codec_cache.clear()
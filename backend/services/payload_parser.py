@@ -0,0 +1,387 @@
+"""传感器数据解析器 - 将JSON解析配置预编译为可复用的解析对象"""
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from core.config import settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 继电器/开关类字段名（完整匹配）
+RELAY_KEYS = {'relay_status', 'relay', 'switch', 'switch_status', 'realy_in_status', 'relay_in_status'}
+# 继电器输入字段名（支持错误拼写 realy_in_status 和正确拼写 relay_in_status）
+RELAY_IN_KEYS = {'realy_in_status', 'relay_in_status'}
+# 开关状态字符串
+ON_VALUES = {'on', 'open', 'true', '1', 'active', 'enabled'}
+OFF_VALUES = {'off', 'close', 'false', '0', 'inactive', 'disabled'}
+
+# 默认解析逻辑中按字段名缓存的解析计划数量上限
+MAX_DEFAULT_PLANS = 4096
+
+# 批量格式：{"base_ts": ..., "readings": [{"offset": 0, ...}, ...]} 或 [{"ts": ..., ...}, ...]
+BATCH_READINGS_KEY = 'readings'
+BASE_TIMESTAMP_KEYS = ('base_ts', 'base_timestamp')
+TIMESTAMP_KEYS = ('ts', 'timestamp')
+OFFSET_KEYS = ('offset', 'dt')
+# 单条消息最多包含的读数组数
+MAX_BATCH_READINGS = 10000
+# 大于该值的数字时间戳按毫秒处理
+MILLISECOND_THRESHOLD = 1e11
+
+# 解析结果：(传感器类型, 值, 单位, 显示名称)
+Reading = Tuple[str, Any, str, Optional[str]]
+
+# 转换函数返回该值表示跳过字段
+SKIP = object()
+
+
+def is_relay_key(key_lower: str) -> bool:
+    """判断字段名是否为继电器/开关类字段"""
+    return key_lower in RELAY_KEYS or 'relay' in key_lower or 'switch' in key_lower or 'realy' in key_lower
+
+
+def _convert_relay(key: str, raw_value: Any) -> Any:
+    """自定义配置中继电器字段的值转换：开关字符串转为 1/0，其他尝试转为数字"""
+    if isinstance(raw_value, str):
+        value_lower = raw_value.lower().strip()
+        if value_lower in ON_VALUES:
+            return 1
+        if value_lower in OFF_VALUES:
+            return 0
+        try:
+            return float(raw_value)
+        except ValueError:
+            logger.warning(f"无法转换继电器状态值: {raw_value}，跳过该字段")
+            return SKIP
+    return _convert_plain(key, raw_value)
+
+
+def _convert_plain(key: str, raw_value: Any) -> Any:
+    """自定义配置中普通字段的值转换：数字保持原值，其他类型尝试转为浮点数"""
+    if isinstance(raw_value, (int, float)):
+        return raw_value
+    # 无法转换的值直接跳过，不能进入批量写入（会导致整批写入失败）
+    try:
+        return float(raw_value)
+    except (ValueError, TypeError):
+        logger.warning(f"无法转换值类型: {raw_value} ({type(raw_value)}), 跳过字段 {key}")
+        return SKIP
+
+
+class FieldPlan(NamedTuple):
+    """单个字段的解析计划"""
+    key: str
+    sensor_type: str
+    converter: Callable[[str, Any], Any]
+    unit: str
+    display_name: Optional[str]
+
+
+class CompiledPayloadParser:
+    """
+    预编译的JSON解析配置
+
+    json_parse_config 只在加载时解析一次，每个字段的单位、显示名称和值转换规则
+    预先计算为 FieldPlan，解析消息时只需遍历字段计划。
+    """
+
+    def __init__(self, config_id: Optional[int], plans: List[FieldPlan]):
+        self.config_id = config_id
+        self.plans = plans
+
+    def parse(self, data: Dict[str, Any]) -> List[Reading]:
+        """按解析计划解析一条JSON消息"""
+        readings = []
+        for plan in self.plans:
+            if plan.key not in data:
+                continue
+            value = plan.converter(plan.key, data[plan.key])
+            if value is SKIP:
+                continue
+            # 始终以原始 key 作为数据库的 type（plan.sensor_type），便于区分
+            readings.append((plan.sensor_type, value, plan.unit, plan.display_name))
+        return readings
+
+
+def compile_parse_config(json_parse_config: str, config_id: Optional[int] = None) -> CompiledPayloadParser:
+    """
+    将JSON解析配置编译为解析对象
+
+    Raises:
+        ValueError: 配置不是合法的JSON对象
+    """
+    try:
+        parse_map = json.loads(json_parse_config)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ValueError(f"JSON 解析配置格式错误: {e}")
+    if not isinstance(parse_map, dict):
+        raise ValueError("JSON 解析配置必须是对象")
+
+    plans = []
+    for key, config in parse_map.items():
+        # 确保 config 是字典类型，如果不是，使用默认配置
+        if not isinstance(config, dict):
+            logger.warning(f"JSON 配置格式错误: {key} 的配置不是字典类型，使用默认配置")
+            config = {'type': key, 'unit': ''}
+
+        conf_type = config.get('type', key)
+        unit = config.get('unit', '')
+        display_name = config.get('display_name') or config.get('name')
+
+        # 如果配置里的 type 和原始 key 不一样，且没有显式的 display_name，
+        # 则把配置里的 type 当作 display_name
+        if not display_name and conf_type != key:
+            display_name = conf_type
+
+        converter = _convert_relay if is_relay_key(key.lower()) else _convert_plain
+        plans.append(FieldPlan(key, key, converter, unit, display_name))
+
+    return CompiledPayloadParser(config_id, plans)
+
+
+class _DefaultFieldPlan(NamedTuple):
+    """默认JSON解析逻辑中单个字段名的解析计划"""
+    is_relay: bool
+    numeric_unit: str
+    numeric_display_name: Optional[str]
+    relay_display_name: str
+
+
+class DefaultJsonParser:
+    """
+    默认JSON解析逻辑（没有解析配置时使用）
+
+    按字段名推断单位和显示名称，推断结果按字段名缓存。
+    """
+
+    def __init__(self):
+        self._plans: Dict[str, _DefaultFieldPlan] = {}
+
+    def parse(self, data: Dict[str, Any]) -> List[Reading]:
+        """解析一条JSON消息"""
+        readings = []
+        for key, value in data.items():
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = self._build_plan(key)
+
+            if isinstance(value, str):
+                # 非继电器类型的字符串，跳过
+                if not plan.is_relay:
+                    continue
+                value_lower = value.lower().strip()
+                if value_lower in ON_VALUES:
+                    processed_value = 1
+                elif value_lower in OFF_VALUES:
+                    processed_value = 0
+                else:
+                    logger.warning(f"无法识别继电器状态值: {value}，跳过字段 {key}")
+                    continue
+                readings.append((key, processed_value, '', plan.relay_display_name))
+            elif isinstance(value, (int, float)):
+                readings.append((key, value, plan.numeric_unit, plan.numeric_display_name))
+            # 其他类型，跳过
+        return readings
+
+    def _build_plan(self, key: str) -> _DefaultFieldPlan:
+        """根据字段名推断解析计划"""
+        key_lower = key.lower()
+        relay_display_name = "继电器输入" if key_lower in RELAY_IN_KEYS else "继电器"
+
+        numeric_unit = ''
+        numeric_display_name = None
+        if 'temp' in key_lower:
+            # 生成友好的显示名称，例如 air_temperature_1 -> 温度1
+            num_match = re.search(r'\d+', key)
+            numeric_unit = '°C'
+            numeric_display_name = f"温度{num_match.group()}" if num_match else "温度"
+        elif 'hum' in key_lower:
+            num_match = re.search(r'\d+', key)
+            numeric_unit = '%'
+            numeric_display_name = f"湿度{num_match.group()}" if num_match else "湿度"
+        elif 'relay' in key_lower or 'realy' in key_lower:
+            numeric_display_name = relay_display_name
+
+        plan = _DefaultFieldPlan(is_relay_key(key_lower), numeric_unit, numeric_display_name, relay_display_name)
+        if len(self._plans) < MAX_DEFAULT_PLANS:
+            self._plans[key] = plan
+        return plan
+
+
+# 文本格式传感器数据的正则解析规则：(正则, 传感器类型, 单位, 显示名称)
+TEXT_PATTERNS = [
+    (re.compile(r'Temperature1:\s*([\d.]+)\s*C'), 'Temperature1', '°C', '温度1'),
+    (re.compile(r'Humidity1:\s*([\d.]+)\s*%'), 'Humidity1', '%', '湿度1'),
+    (re.compile(r'Temperature2:\s*([\d.]+)\s*C'), 'Temperature2', '°C', '温度2'),
+    (re.compile(r'Humidity2:\s*([\d.]+)\s*%'), 'Humidity2', '%', '湿度2'),
+    (re.compile(r'Relay Status:\s*(\d)'), 'Relay Status', '', '继电器'),
+    (re.compile(r'PB8 Level:\s*(\d)'), 'PB8 Level', '', 'PB8电平'),
+]
+
+
+def parse_text(payload: str) -> List[Reading]:
+    """使用正则解析文本格式的传感器数据"""
+    readings = []
+    for pattern, sensor_type, unit, display_name in TEXT_PATTERNS:
+        match = pattern.search(payload)
+        if match:
+            try:
+                value = float(match.group(1)) if unit != '' else int(match.group(1))
+                readings.append((sensor_type, value, unit, display_name))
+            except ValueError as e:
+                logger.warning(f"转换数值失败: {match.group(1)}, 错误: {e}")
+    return readings
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    解析设备时间戳，返回UTC时间（不带时区，与数据库存储一致）
+
+    支持 Unix 秒/毫秒时间戳和 ISO 8601 字符串，无法解析时返回 None
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000.0 if value > MILLISECOND_THRESHOLD else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    return None
+
+
+def is_plausible_timestamp(reading_time: datetime, received_at: datetime) -> bool:
+    """设备时间是否在接收时间前后允许的范围内（INGEST_MAX_TIMESTAMP_AGE_DAYS / INGEST_MAX_TIMESTAMP_SKEW_SECONDS）"""
+    if reading_time > received_at + timedelta(seconds=settings.ingest_max_timestamp_skew_seconds):
+        return False
+    max_age = settings.ingest_max_timestamp_age_days
+    return not max_age or reading_time >= received_at - timedelta(days=max_age)
+
+
+def check_timestamp(reading_time: Optional[datetime], received_at: datetime) -> datetime:
+    """设备时间为空或超出允许范围（时钟未校准、上报运行时长等）时使用接收时间"""
+    if reading_time is None or not is_plausible_timestamp(reading_time, received_at):
+        return received_at
+    return reading_time
+
+
+def _first_key(data: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        if key in data:
+            return key
+    return None
+
+
+def split_batch(data: Any, default_time: datetime) -> Optional[List[Tuple[datetime, Dict[str, Any]]]]:
+    """
+    拆分批量格式的消息
+
+    批量格式为读数列表，或带 readings 列表的对象（可用 base_ts 指定基准时间）。
+    每组读数可带设备时间戳（ts / timestamp），或相对基准时间的偏移秒数（offset / dt），
+    都没有时使用基准时间（默认为消息接收时间）。超出接收时间前后允许范围的时间使用接收时间。
+
+    Returns:
+        [(读数时间, 读数字段)]；不是批量格式时返回 None
+    """
+    base_time = default_time
+    if isinstance(data, list):
+        items = data
+    elif isinstance(data, dict) and isinstance(data.get(BATCH_READINGS_KEY), list):
+        items = data[BATCH_READINGS_KEY]
+        base_key = _first_key(data, BASE_TIMESTAMP_KEYS)
+        if base_key:
+            base_time = parse_timestamp(data[base_key])
+            if base_time is None:
+                logger.warning(f"无法解析批量消息的基准时间: {data[base_key]}，使用接收时间")
+                base_time = default_time
+            elif not is_plausible_timestamp(base_time, default_time):
+                logger.warning(f"批量消息的基准时间 {base_time} 超出允许范围，使用接收时间")
+                base_time = default_time
+    else:
+        return None
+
+    if len(items) > MAX_BATCH_READINGS:
+        logger.warning(f"批量消息包含 {len(items)} 组读数，只处理前 {MAX_BATCH_READINGS} 组")
+        items = items[:MAX_BATCH_READINGS]
+
+    batch = []
+    rejected = 0
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        reading_time = base_time
+        fields = item
+        ts_key = _first_key(item, TIMESTAMP_KEYS)
+        offset_key = _first_key(item, OFFSET_KEYS)
+        if ts_key:
+            parsed = parse_timestamp(item[ts_key])
+            if parsed is None:
+                logger.warning(f"无法解析读数时间戳: {item[ts_key]}，使用基准时间")
+            else:
+                reading_time = parsed
+        elif offset_key:
+            try:
+                reading_time = base_time + timedelta(seconds=float(item[offset_key]))
+            except (TypeError, ValueError, OverflowError):
+                logger.warning(f"无法解析读数时间偏移: {item[offset_key]}，使用基准时间")
+        if ts_key or offset_key:
+            fields = {key: value for key, value in item.items() if key != ts_key and key != offset_key}
+            if not is_plausible_timestamp(reading_time, default_time):
+                rejected += 1
+                reading_time = default_time
+        batch.append((reading_time, fields))
+    if rejected:
+        logger.warning(f"批量消息中 {rejected} 组读数的时间超出允许范围，使用接收时间")
+    return batch
+
+
+# 默认解析器（全局共享）
+default_json_parser = DefaultJsonParser()
+
+# 已编译的解析配置缓存：config_id -> (配置内容, 解析对象)
+# 配置内容即版本，内容变化时重新编译
+_parser_cache: Dict[Optional[int], Tuple[str, Optional[CompiledPayloadParser]]] = {}
+_parser_cache_lock = threading.Lock()
+
+
+def get_parser(config_id: Optional[int], json_parse_config: Optional[str]) -> Optional[CompiledPayloadParser]:
+    """
+    获取主题配置对应的已编译解析对象
+
+    Returns:
+        解析对象；没有解析配置或配置无效时返回 None（使用默认解析逻辑）
+    """
+    if not json_parse_config:
+        return None
+
+    cached = _parser_cache.get(config_id)
+    if cached is not None and cached[0] == json_parse_config:
+        return cached[1]
+
+    try:
+        parser = compile_parse_config(json_parse_config, config_id)
+    except ValueError as e:
+        logger.error(f"编译主题配置 {config_id} 的 JSON 解析配置失败，将使用默认解析逻辑: {e}")
+        logger.error(f"JSON 配置内容: {json_parse_config}")
+        parser = None
+
+    with _parser_cache_lock:
+        _parser_cache[config_id] = (json_parse_config, parser)
+    return parser
+
+
+def clear_parser_cache():
+    """清空已编译的解析配置缓存"""
+    with _parser_cache_lock:
+        _parser_cache.clear()
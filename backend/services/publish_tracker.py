@@ -0,0 +1,138 @@
+"""MQTT发布命令跟踪 - 发布后立即返回命令ID，异步记录发布结果（QoS 1 为收到 PUBACK）"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.logging_config import get_logger
+from services import metrics
+
+logger = get_logger(__name__)
+
+# 发布命令状态
+STATUS_PENDING = "pending"  # 已交给客户端，等待发送完成（QoS 0）或 PUBACK（QoS 1）
+STATUS_PUBLISHED = "published"  # QoS 0 已写入连接；QoS 1 已收到服务器确认
+STATUS_FAILED = "failed"  # 发布失败（未连接、客户端队列已满等）
+STATUS_TIMEOUT = "timeout"  # 超时仍未完成
+
+
+class PublishCommand:
+    """一次发布命令"""
+
+    def __init__(self, topic: str, payload: str, qos: int):
+        self.command_id = uuid.uuid4().hex
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.status = STATUS_PENDING
+        self.broker: Optional[str] = None
+        self.broker_id: Optional[int] = None
+        self.mid: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.completed_at: Optional[datetime] = None
+        self._created = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.status != STATUS_PENDING
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "command_id": self.command_id,
+            "topic": self.topic,
+            "payload": self.payload,
+            "qos": self.qos,
+            "status": self.status,
+            "broker": self.broker,
+            "error": self.error,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+
+class PublishTracker:
+    """
+    发布命令表
+
+    发布后按 (MQTT配置ID, 消息ID) 等待 paho 的 on_publish 回调。on_publish 在网络线程中
+    可能先于发布方登记消息ID到达，此时先记入 _early_acks，登记时再完成命令。
+    只保留最近 max_commands 条命令，超过 timeout 秒仍未完成的命令在查询时标记为超时。
+    """
+
+    def __init__(self, timeout: float = 10.0, max_commands: int = 1000):
+        self.timeout = timeout
+        self.max_commands = max(max_commands, 1)
+        self._commands: "OrderedDict[str, PublishCommand]" = OrderedDict()
+        self._by_mid: Dict[Tuple[int, int], PublishCommand] = {}
+        self._early_acks: Dict[Tuple[int, int], float] = {}
+        self._lock = threading.Lock()
+        self._completed = threading.Condition(self._lock)
+
+    def create(self, topic: str, payload: str, qos: int) -> PublishCommand:
+        """新建发布命令"""
+        command = PublishCommand(topic, payload, qos)
+        with self._lock:
+            self._commands[command.command_id] = command
+            while len(self._commands) > self.max_commands:
+                _, old = self._commands.popitem(last=False)
+                if old.mid is not None:
+                    self._by_mid.pop((old.broker_id, old.mid), None)
+        return command
+
+    def sent(self, command: PublishCommand, broker_id: int, mid: int):
+        """登记已交给客户端的消息ID，等待 on_publish"""
+        key = (broker_id, mid)
+        with self._lock:
+            command.broker_id = broker_id
+            command.mid = mid
+            if self._early_acks.pop(key, None) is not None:
+                self._finish(command, STATUS_PUBLISHED)
+            else:
+                self._by_mid[key] = command
+
+    def published(self, broker_id: int, mid: int):
+        """on_publish 回调（网络线程）：QoS 0 已发送，QoS 1 已收到 PUBACK"""
+        key = (broker_id, mid)
+        with self._lock:
+            command = self._by_mid.pop(key, None)
+            if command is not None:
+                self._finish(command, STATUS_PUBLISHED)
+                return
+            self._early_acks[key] = time.monotonic()
+            if len(self._early_acks) > self.max_commands:
+                # 清理没有对应命令的确认（如同步发布接口发出的消息）
+                cutoff = time.monotonic() - self.timeout
+                self._early_acks = {k: t for k, t in self._early_acks.items() if t >= cutoff}
+
+    def fail(self, command: PublishCommand, error: str):
+        """发布失败"""
+        with self._lock:
+            command.error = error
+            self._finish(command, STATUS_FAILED)
+        logger.error(f"发布消息到主题 {command.topic} 失败: {error}")
+
+    def get(self, command_id: str) -> Optional[PublishCommand]:
+        """查询发布命令（超时未完成的命令在此时标记为超时）"""
+        with self._lock:
+            command = self._commands.get(command_id)
+            if command is not None and not command.done and time.monotonic() - command._created > self.timeout:
+                if command.mid is not None:
+                    self._by_mid.pop((command.broker_id, command.mid), None)
+                command.error = f"{self.timeout:g} 秒内未完成发布"
+                self._finish(command, STATUS_TIMEOUT)
+            return command
+
+    def wait_for(self, predicate: Callable[[], bool], deadline: float) -> bool:
+        """等待命令完成直到 predicate 成立或到达 deadline（time.monotonic 时间），返回 predicate 结果"""
+        with self._completed:
+            return self._completed.wait_for(predicate, timeout=max(deadline - time.monotonic(), 0))
+
+    def _finish(self, command: PublishCommand, status: str):
+        """完成命令（调用方持有锁）"""
+        command.status = status
+        command.completed_at = datetime.utcnow()
+        metrics.PUBLISH_COMMANDS.labels(status).inc()
+        self._completed.notify_all()
@@ -0,0 +1,172 @@
+"""继电器命令确认 - 将发出的继电器命令与之后上报的继电器状态读数对应，判断命令是否生效"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.logging_config import get_logger
+from services import metrics
+
+logger = get_logger(__name__)
+
+# 命令状态
+STATUS_PENDING = "pending"  # 等待设备上报状态
+STATUS_CONFIRMED = "confirmed"  # 上报的状态与命令一致
+STATUS_CONTRADICTED = "contradicted"  # 命令发出 grace 秒后上报的状态仍与命令不一致
+STATUS_TIMEOUT = "timeout"  # 超时没有收到状态上报
+STATUS_SUPERSEDED = "superseded"  # 确认前同一继电器又发出了新命令
+
+# 命令未指定传感器类型时，用于确认的继电器状态读数类型
+RELAY_STATUS_TYPES = ("relay_status", "Relay Status")
+_DEFAULT_KEY = ""
+
+
+class RelayCommand:
+    """一条等待确认的继电器命令"""
+
+    def __init__(
+        self,
+        command_id: str,
+        device_id: int,
+        expected_value: int,
+        sensor_type: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ):
+        self.command_id = command_id
+        self.device_id = device_id
+        self.sensor_type = sensor_type
+        self.expected_value = expected_value
+        self.status = STATUS_PENDING
+        self.observed_value: Optional[float] = None
+        self.created_at = created_at or datetime.utcnow()
+        self.resolved_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "command_id": self.command_id,
+            "device_id": self.device_id,
+            "sensor_type": self.sensor_type,
+            "expected_value": self.expected_value,
+            "status": self.status,
+            "observed_value": self.observed_value,
+            "created_at": self.created_at,
+            "resolved_at": self.resolved_at,
+        }
+
+
+class RelayCommandTable:
+    """
+    待确认的继电器命令表（内存）
+
+    数据接收时按设备ID查找待确认命令（没有命令时只是一次字典查询），命令发出后上报的状态
+    与期望一致则确认；命令发出 grace 秒后（设备处理命令需要时间）上报的状态仍不一致则判定为
+    未生效；timeout 秒内没有上报则在查询时判定为超时。只保留最近 max_commands 条命令的结果。
+    """
+
+    def __init__(self, timeout: float = 15.0, grace: float = 2.0, max_commands: int = 1000):
+        self.timeout = timedelta(seconds=timeout)
+        self.grace = timedelta(seconds=grace)
+        self.max_commands = max(max_commands, 1)
+        # 设备ID -> {传感器类型（未指定为空字符串）: 待确认命令}
+        self._pending: Dict[int, Dict[str, RelayCommand]] = {}
+        self._commands: "OrderedDict[str, RelayCommand]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        command_id: str,
+        device_id: int,
+        expected_value: int,
+        sensor_type: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ) -> RelayCommand:
+        """登记已发出的继电器命令（created_at 为发布时间，之后上报的状态才用于确认）"""
+        command = RelayCommand(command_id, device_id, 1 if expected_value else 0, sensor_type, created_at)
+        key = sensor_type or _DEFAULT_KEY
+        with self._lock:
+            previous = self._pending.get(device_id, {}).get(key)
+            if previous is not None:
+                self._resolve(previous, STATUS_SUPERSEDED, None)
+            self._pending.setdefault(device_id, {})[key] = command
+            self._commands[command_id] = command
+            while len(self._commands) > self.max_commands:
+                _, old = self._commands.popitem(last=False)
+                if old.status == STATUS_PENDING:
+                    self._resolve(old, STATUS_TIMEOUT, None)
+        return command
+
+    def observe(self, device_id: int, sensor_type: str, value: Any, timestamp: datetime):
+        """数据接收时调用：用继电器状态读数确认待确认的命令"""
+        pending = self._pending.get(device_id)
+        if not pending:
+            return
+        command = pending.get(sensor_type)
+        if command is None and sensor_type in RELAY_STATUS_TYPES:
+            command = pending.get(_DEFAULT_KEY)
+        if command is None or timestamp < command.created_at:
+            # 命令发出前的读数（如补发的离线数据）不能说明命令结果
+            return
+
+        try:
+            observed = float(value)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            if command.status != STATUS_PENDING:
+                return
+            if (1 if observed else 0) == command.expected_value:
+                self._resolve(command, STATUS_CONFIRMED, observed)
+            elif timestamp >= command.created_at + self.grace:
+                self._resolve(command, STATUS_CONTRADICTED, observed)
+
+    def get(self, command_id: str) -> Optional[RelayCommand]:
+        """按命令ID查询"""
+        with self._lock:
+            self._expire()
+            return self._commands.get(command_id)
+
+    def query(
+        self,
+        device_ids: Optional[Iterable[int]] = None,
+        command_ids: Optional[Iterable[str]] = None
+    ) -> List[RelayCommand]:
+        """查询最近的命令（按设备ID或命令ID过滤），按发出时间倒序"""
+        with self._lock:
+            self._expire()
+            if command_ids is not None:
+                commands = [self._commands[c] for c in command_ids if c in self._commands]
+            else:
+                commands = list(self._commands.values())
+            if device_ids is not None:
+                device_ids = set(device_ids)
+                commands = [command for command in commands if command.device_id in device_ids]
+        commands.sort(key=lambda command: command.created_at, reverse=True)
+        return commands
+
+    def _expire(self):
+        """将超时的待确认命令标记为超时（调用方持有锁）"""
+        deadline = datetime.utcnow() - self.timeout
+        expired = [
+            command
+            for pending in self._pending.values()
+            for command in pending.values()
+            if command.created_at < deadline
+        ]
+        for command in expired:
+            self._resolve(command, STATUS_TIMEOUT, None)
+
+    def _resolve(self, command: RelayCommand, status: str, observed: Optional[float]):
+        """完成命令并移出待确认表（调用方持有锁）"""
+        command.status = status
+        command.observed_value = observed
+        command.resolved_at = datetime.utcnow()
+        pending = self._pending.get(command.device_id)
+        if pending is not None:
+            key = command.sensor_type or _DEFAULT_KEY
+            if pending.get(key) is command:
+                del pending[key]
+            if not pending:
+                del self._pending[command.device_id]
+        metrics.RELAY_COMMANDS.labels(status).inc()
+        if status != STATUS_CONFIRMED:
+            logger.info(f"继电器命令 {command.command_id} (设备ID: {command.device_id}) 结果: {status}")
@@ -0,0 +1,422 @@
+"""数据保留 - 按保留策略在后台线程中分批删除过期的原始读数和汇总，并定期 ANALYZE 和增量 VACUUM"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import WriterSessionLocal
+from core.logging_config import get_logger
+from models.retention_policy import RetentionPolicyModel
+from models.sensor_config import SensorConfigModel
+from services import file_lock, metrics, sensor_partitions, sensor_rollups
+
+logger = get_logger(__name__)
+
+# 保留天数字段 -> 数据类别（raw 为原始读数，其余为汇总粒度）
+RETENTION_FIELDS = (
+    ("raw_days", "raw"),
+    ("rollup_1m_days", sensor_rollups.RESOLUTION_MINUTE),
+    ("rollup_1h_days", sensor_rollups.RESOLUTION_HOUR),
+    ("rollup_1d_days", sensor_rollups.RESOLUTION_DAY),
+)
+KIND_RAW = "raw"
+# 启动后第一次执行保留任务的延迟（秒），避开启动时的积压消息
+FIRST_RUN_DELAY = 60.0
+
+
+def default_days() -> Dict[str, int]:
+    """全局默认保留天数（0 表示永久保留）"""
+    return {
+        "raw_days": settings.retention_raw_days,
+        "rollup_1m_days": settings.retention_rollup_1m_days,
+        "rollup_1h_days": settings.retention_rollup_1h_days,
+        "rollup_1d_days": settings.retention_rollup_1d_days,
+    }
+
+
+def resolve_days(
+    policies: List[RetentionPolicyModel],
+    device_id: int,
+    sensor_type: str,
+    defaults: Optional[Dict[str, int]] = None
+) -> Dict[str, int]:
+    """传感器的保留天数：设备+类型 > 设备 > 类型 > 全局设置，字段为空时沿用下一级"""
+    by_scope = {(policy.device_id, policy.sensor_type): policy for policy in policies}
+    chain = [
+        by_scope.get((device_id, sensor_type)),
+        by_scope.get((device_id, None)),
+        by_scope.get((None, sensor_type)),
+    ]
+    result = dict(defaults or default_days())
+    for field, _ in RETENTION_FIELDS:
+        for policy in chain:
+            if policy is not None and getattr(policy, field) is not None:
+                result[field] = getattr(policy, field)
+                break
+    return result
+
+
+def get_retention_policies(db: Session) -> List[RetentionPolicyModel]:
+    """获取所有保留策略"""
+    return db.query(RetentionPolicyModel).order_by(RetentionPolicyModel.id).all()
+
+
+def upsert_retention_policy(
+    db: Session,
+    device_id: Optional[int],
+    sensor_type: Optional[str],
+    **fields
+) -> RetentionPolicyModel:
+    """创建或更新设备 / 传感器类型的保留策略（下次保留任务生效）"""
+    policy = db.query(RetentionPolicyModel).filter(
+        RetentionPolicyModel.device_id.is_(None) if device_id is None else RetentionPolicyModel.device_id == device_id,
+        RetentionPolicyModel.sensor_type.is_(None) if sensor_type is None else RetentionPolicyModel.sensor_type == sensor_type
+    ).first()
+    if policy is None:
+        policy = RetentionPolicyModel(device_id=device_id, sensor_type=sensor_type)
+        db.add(policy)
+    for key, value in fields.items():
+        setattr(policy, key, value)
+    policy.updated_at = datetime.utcnow()
+
+    db.commit()
+    db.refresh(policy)
+    return policy
+
+
+def delete_retention_policy(db: Session, policy_id: int) -> bool:
+    """删除保留策略"""
+    policy = db.query(RetentionPolicyModel).filter(RetentionPolicyModel.id == policy_id).first()
+    if policy is None:
+        return False
+    db.delete(policy)
+    db.commit()
+    return True
+
+
+class RetentionScheduler:
+    """
+    数据保留任务（后台线程）
+
+    每隔 interval_minutes 分钟按保留策略删除过期数据：整月分区中的读数全部过期时直接删除分区表，
+    其余按 batch_size 行一批删除，每批单独提交并间隔 batch_pause_ms 毫秒，写锁只被短暂占用，
+    不阻塞数据接收。删除后按需 ANALYZE，数据库为 auto_vacuum=INCREMENTAL 时分步增量 VACUUM 缩小文件。
+    设置 lock_file 时，同一主机的多个进程中只有持有该锁文件的进程执行，其余进程等待接替。
+    """
+
+    def __init__(
+        self,
+        interval_minutes: int = 60,
+        batch_size: int = 1000,
+        batch_pause_ms: int = 50,
+        vacuum_pages: int = 1000,
+        analyze_interval_hours: int = 24,
+        session_factory=WriterSessionLocal,
+        lock_file: Optional[str] = None
+    ):
+        self.interval = max(interval_minutes, 1) * 60.0
+        self.batch_size = max(batch_size, 1)
+        self.batch_pause = max(batch_pause_ms, 0) / 1000.0
+        self.vacuum_pages = max(vacuum_pages, 1)
+        self.analyze_interval = timedelta(hours=max(analyze_interval_hours, 0))
+        self.session_factory = session_factory
+        self.lock_file = lock_file
+        self._leader_lock = None
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_analyze: Optional[datetime] = None
+        self._vacuum_hint_logged = False
+
+        # 统计信息
+        self.running = False
+        self.run_count = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.next_run_at: Optional[datetime] = None
+        self.total_rows_pruned = {kind: 0 for _, kind in RETENTION_FIELDS}
+        self.total_bytes_reclaimed = 0
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="retention-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"数据保留任务已启动: 每 {int(self.interval // 60)} 分钟执行一次，每批 {self.batch_size} 行")
+
+    def stop(self):
+        """停止后台线程（正在执行的任务在当前批次后结束）"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        file_lock.release(self._leader_lock)
+        self._leader_lock = None
+
+    def is_running(self) -> bool:
+        """后台线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_leader(self) -> bool:
+        """本进程是否负责执行保留任务（未持有锁时尝试获取，持有锁的进程退出后由其他进程接替）"""
+        if not self.lock_file or self._leader_lock is not None:
+            return True
+        try:
+            self._leader_lock = file_lock.try_lock(self.lock_file)
+        except OSError as e:
+            logger.warning(f"无法创建数据保留任务锁文件 {self.lock_file}，本进程执行保留任务: {e}")
+            return True
+        if self._leader_lock is not None:
+            logger.info(f"本进程负责执行数据保留任务（锁文件 {self.lock_file}）")
+        return self._leader_lock is not None
+
+    def trigger(self):
+        """立即执行一次（后台线程中执行）"""
+        self._wakeup.set()
+
+    def status(self) -> Dict[str, Any]:
+        """运行状态和最近一次执行结果"""
+        return {
+            "active": self.is_running(),
+            "leader": not self.lock_file or self._leader_lock is not None,
+            "running": self.running,
+            "interval_minutes": int(self.interval // 60),
+            "batch_size": self.batch_size,
+            "defaults": default_days(),
+            "run_count": self.run_count,
+            "next_run_at": self.next_run_at,
+            "last_run": self.last_run,
+            "total_rows_pruned": dict(self.total_rows_pruned),
+            "total_bytes_reclaimed": self.total_bytes_reclaimed,
+        }
+
+    def _run(self):
+        """后台循环"""
+        delay = min(FIRST_RUN_DELAY, self.interval)
+        while not self._stopping.is_set():
+            self.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            if not self.is_leader():
+                # 其他进程正在负责保留任务，下次再检查是否需要接替
+                delay = self.interval
+                continue
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"数据保留任务出错: {e}", exc_info=True)
+            delay = self.interval
+        self.next_run_at = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """执行一次保留任务，返回执行结果"""
+        with self._run_lock:
+            self.running = True
+            started = time.perf_counter()
+            report: Dict[str, Any] = {
+                "started_at": datetime.utcnow(),
+                "duration_seconds": 0.0,
+                "rows_pruned": {kind: 0 for _, kind in RETENTION_FIELDS},
+                "partitions_dropped": [],
+                "bytes_reclaimed": 0,
+                "free_bytes": 0,
+                "analyzed": False,
+                "error": None,
+            }
+            db = self.session_factory()
+            try:
+                # 在会话持有连接之前重新加载分区（可能被其他进程或迁移脚本修改）
+                sensor_partitions.load_partitions(db)
+                size_before, _ = self._database_size(db)
+                groups, config_ids = self._cutoff_groups(db, report["started_at"])
+
+                dropped, dropped_rows = self._drop_expired_partitions(db, groups[KIND_RAW], config_ids)
+                report["partitions_dropped"] = dropped
+                report["rows_pruned"][KIND_RAW] += dropped_rows
+                for kind, by_cutoff in groups.items():
+                    for cutoff, ids in by_cutoff.items():
+                        report["rows_pruned"][kind] += self._prune(db, kind, ids, cutoff)
+
+                report["analyzed"] = self._analyze_if_due(db)
+                self._incremental_vacuum(db)
+                size_after, free_bytes = self._database_size(db)
+                report["bytes_reclaimed"] = max(size_before - size_after, 0)
+                report["free_bytes"] = free_bytes
+            except Exception as e:
+                db.rollback()
+                report["error"] = str(e)
+                logger.error(f"数据保留任务失败: {e}", exc_info=True)
+            finally:
+                db.close()
+                report["duration_seconds"] = round(time.perf_counter() - started, 3)
+                self._record(report)
+                self.running = False
+            return report
+
+    def _cutoff_groups(self, db: Session, now: datetime) -> Tuple[Dict[str, Dict[datetime, List[int]]], set]:
+        """按保留天数计算每类数据的过期时间，同一过期时间的传感器配置一起删除"""
+        policies = get_retention_policies(db)
+        defaults = default_days()
+        configs = db.query(SensorConfigModel.id, SensorConfigModel.device_id, SensorConfigModel.type).all()
+
+        groups: Dict[str, Dict[datetime, List[int]]] = {kind: {} for _, kind in RETENTION_FIELDS}
+        cutoffs: Dict[int, datetime] = {}
+        for config_id, device_id, sensor_type in configs:
+            days = resolve_days(policies, device_id, sensor_type, defaults)
+            for field, kind in RETENTION_FIELDS:
+                if days[field] and days[field] > 0:
+                    cutoff = cutoffs.get(days[field])
+                    if cutoff is None:
+                        cutoff = cutoffs[days[field]] = now - timedelta(days=days[field])
+                    groups[kind].setdefault(cutoff, []).append(config_id)
+        return groups, {config_id for config_id, _, _ in configs}
+
+    def _drop_expired_partitions(
+        self,
+        db: Session,
+        raw_groups: Dict[datetime, List[int]],
+        config_ids: set
+    ) -> Tuple[List[str], int]:
+        """分区中每个传感器的读数都已过期（或传感器已删除）时直接删除整个分区表"""
+        if not raw_groups:
+            return [], 0
+        config_cutoffs = {config_id: cutoff for cutoff, ids in raw_groups.items() for config_id in ids}
+        latest_cutoff = max(raw_groups)
+
+        dropped, dropped_rows = [], 0
+        for key, table in sensor_partitions.partitions(None, latest_cutoff):
+            if self._stopping.is_set():
+                break
+            end = sensor_partitions.partition_bounds(key)[1]
+            if end > latest_cutoff:
+                break
+            present = sensor_partitions.partition_config_ids(db, key)
+            if all(
+                config_id not in config_ids or
+                (config_id in config_cutoffs and config_cutoffs[config_id] >= end)
+                for config_id in present
+            ):
+                rows = db.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+                db.rollback()  # 结束读事务，删除分区表使用单独的连接
+                if sensor_partitions.drop_partition(db, key):
+                    dropped.append(table.name)
+                    dropped_rows += rows
+                    metrics.RETENTION_ROWS_PRUNED.labels(KIND_RAW).inc(rows)
+        return dropped, dropped_rows
+
+    def _prune(self, db: Session, kind: str, config_ids: List[int], cutoff: datetime) -> int:
+        """分批删除过期数据，每批单独提交"""
+        total = 0
+        while not self._stopping.is_set():
+            if kind == KIND_RAW:
+                deleted = sensor_partitions.prune_batch(db, config_ids, cutoff, self.batch_size)
+            else:
+                deleted = sensor_rollups.prune_batch(db, kind, config_ids, cutoff, self.batch_size)
+            db.commit()
+            if not deleted:
+                break
+            total += deleted
+            metrics.RETENTION_ROWS_PRUNED.labels(kind).inc(deleted)
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+        return total
+
+    def _analyze_if_due(self, db: Session) -> bool:
+        """距上次 ANALYZE 超过 analyze_interval 时更新查询规划器统计信息（限制每个索引的采样行数）"""
+        now = datetime.utcnow()
+        if self._last_analyze is not None and now - self._last_analyze < self.analyze_interval:
+            return False
+        db.execute(text("PRAGMA analysis_limit=1000"))
+        db.execute(text("ANALYZE"))
+        db.commit()
+        self._last_analyze = now
+        return True
+
+    def _incremental_vacuum(self, db: Session):
+        """数据库为 auto_vacuum=INCREMENTAL 时，每次释放 vacuum_pages 页空闲页并缩小文件"""
+        if db.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            if not self._vacuum_hint_logged:
+                logger.info("数据库未启用增量 VACUUM，删除后的空间留在数据库内复用"
+                            "（停止应用后执行 migrate_enable_incremental_vacuum.py 启用）")
+                self._vacuum_hint_logged = True
+            return
+        while not self._stopping.is_set() and db.execute(text("PRAGMA freelist_count")).scalar():
+            # 每执行一步释放一页，需要取完结果才会释放全部 vacuum_pages 页
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            db.commit()
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+
+    @staticmethod
+    def _database_size(db: Session) -> Tuple[int, int]:
+        """数据库文件大小和空闲页大小（字节）"""
+        page_size = db.execute(text("PRAGMA page_size")).scalar()
+        page_count = db.execute(text("PRAGMA page_count")).scalar()
+        freelist = db.execute(text("PRAGMA freelist_count")).scalar()
+        return page_count * page_size, freelist * page_size
+
+    def _record(self, report: Dict[str, Any]):
+        """记录执行结果"""
+        self.run_count += 1
+        self.last_run = report
+        for kind, rows in report["rows_pruned"].items():
+            self.total_rows_pruned[kind] += rows
+        self.total_bytes_reclaimed += report["bytes_reclaimed"]
+        metrics.RETENTION_SECONDS.observe(report["duration_seconds"])
+        pruned = sum(report["rows_pruned"].values())
+        if pruned or report["partitions_dropped"] or report["error"]:
+            logger.info(
+                f"数据保留任务完成: 删除 {pruned} 行 {report['rows_pruned']}，"
+                f"删除分区 {report['partitions_dropped']}，释放 {report['bytes_reclaimed']} 字节，"
+                f"耗时 {report['duration_seconds']}s"
+            )
+
+
+# 全局保留任务实例
+_retention_scheduler: Optional[RetentionScheduler] = None
+
+
+def get_retention_scheduler() -> RetentionScheduler:
+    """获取保留任务实例（单例模式）"""
+    global _retention_scheduler
+    if _retention_scheduler is None:
+        _retention_scheduler = RetentionScheduler(
+            interval_minutes=settings.retention_interval_minutes,
+            batch_size=settings.retention_batch_size,
+            batch_pause_ms=settings.retention_batch_pause_ms,
+            vacuum_pages=settings.retention_vacuum_pages,
+            analyze_interval_hours=settings.retention_analyze_interval_hours,
+            lock_file=settings.retention_lock_file or None
+        )
+    return _retention_scheduler
+
+
+def start_retention_scheduler() -> bool:
+    """启动保留任务（RETENTION_ENABLED=false 时不启动）"""
+    if not settings.retention_enabled:
+        return False
+    get_retention_scheduler().start()
+    return True
+
+
+def stop_retention_scheduler():
+    """停止保留任务"""
+    global _retention_scheduler
+    if _retention_scheduler:
+        _retention_scheduler.stop()
+        _retention_scheduler = None
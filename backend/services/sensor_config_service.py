@@ -1,11 +1,24 @@
 """传感器配置服务层"""
-from typing import List, Optional
+import threading
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
 
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 
 from models.sensor_config import SensorConfigModel
+from services import storage_policy
+from services import alert_rules
+from services import sensor_partitions
+from services import sensor_rollups
+from services import sensor_latest
+from services import cache_sync
+
+# 进程级传感器配置ID缓存：(device_id, type) -> sensor_configs.id
+# 供MQTT数据接收热路径使用，避免每个字段都查询一次配置表
+_config_id_cache: Dict[Tuple[int, str], int] = {}
+_config_id_cache_generation = 0
+_config_id_cache_lock = threading.Lock()
 
 
 def get_sensor_config(db: Session, config_id: int) -> Optional[SensorConfigModel]:
@@ -47,11 +60,14 @@ def get_or_create_sensor_config(
     如果配置已存在，返回现有配置（不更新）
     如果配置不存在，创建新配置
     """
+    generation = _config_id_cache_generation
+
     # 尝试获取现有配置
     config = get_sensor_config_by_device_and_type(db, device_id, sensor_type)
     
     if config:
         # 配置已存在，直接返回（保持用户的自定义配置）
+        _cache_config_id(device_id, sensor_type, config.id, generation)
         return config
     
     # 配置不存在，创建新配置
@@ -68,10 +84,90 @@ def get_or_create_sensor_config(
     
     db.add(new_config)
     db.flush()  # 刷新以获取ID，但不提交事务
+    _cache_config_id(device_id, sensor_type, new_config.id, generation)
     
     return new_config
 
 
+def get_or_create_sensor_config_id(
+    db: Session,
+    device_id: int,
+    sensor_type: str,
+    unit: str = "",
+    display_name: Optional[str] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None
+) -> int:
+    """
+    获取或创建传感器配置，只返回配置ID
+    
+    优先从进程级缓存读取，缓存命中时不查询数据库
+    """
+    config_id = _config_id_cache.get((device_id, sensor_type))
+    if config_id is not None:
+        return config_id
+    
+    config = get_or_create_sensor_config(
+        db=db,
+        device_id=device_id,
+        sensor_type=sensor_type,
+        unit=unit,
+        display_name=display_name,
+        min_value=min_value,
+        max_value=max_value
+    )
+    return config.id
+
+
+def warm_sensor_config_cache(db: Session) -> int:
+    """预热传感器配置ID缓存，返回缓存的配置数量"""
+    global _config_id_cache
+    
+    with _config_id_cache_lock:
+        rows = db.query(
+            SensorConfigModel.device_id,
+            SensorConfigModel.type,
+            SensorConfigModel.id
+        ).order_by(SensorConfigModel.id).all()
+        
+        cache: Dict[Tuple[int, str], int] = {}
+        for device_id, sensor_type, config_id in rows:
+            # 存在重复配置时与 get_sensor_config_by_device_and_type 保持一致，取ID最小的一条
+            cache.setdefault((device_id, sensor_type), config_id)
+        _config_id_cache = cache
+    
+    return len(_config_id_cache)
+
+
+def invalidate_sensor_config_cache(device_id: Optional[int] = None, sensor_type: Optional[str] = None):
+    """
+    使传感器配置ID缓存失效
+    
+    Args:
+        device_id: 只清除该设备的缓存，为空则清空全部
+        sensor_type: 与 device_id 一起指定时只清除单个配置
+    """
+    global _config_id_cache, _config_id_cache_generation
+    
+    with _config_id_cache_lock:
+        _config_id_cache_generation += 1
+        if device_id is None:
+            _config_id_cache = {}
+        elif sensor_type is not None:
+            _config_id_cache.pop((device_id, sensor_type), None)
+        else:
+            _config_id_cache = {
+                key: value for key, value in _config_id_cache.items() if key[0] != device_id
+            }
+
+
+def _cache_config_id(device_id: int, sensor_type: str, config_id: int, generation: int):
+    """写入配置ID缓存（查询期间缓存被失效过则放弃写入）"""
+    with _config_id_cache_lock:
+        if generation == _config_id_cache_generation:
+            _config_id_cache[(device_id, sensor_type)] = config_id
+
+
 def update_sensor_config_display_name(
     db: Session,
     device_id: int,
@@ -88,8 +184,37 @@ def update_sensor_config_display_name(
     config.display_name = display_name if display_name and display_name.strip() else None
     config.updated_at = datetime.utcnow()
     
+    db.commit()
+    invalidate_sensor_config_cache(device_id, sensor_type)
+    db.refresh(config)
+    
+    return config
+
+
+def update_sensor_config_storage_policy(
+    db: Session,
+    device_id: int,
+    sensor_type: str,
+    policy: str,
+    deadband: Optional[float] = None,
+    min_interval_seconds: Optional[int] = None,
+    heartbeat_seconds: Optional[int] = None
+) -> Optional[SensorConfigModel]:
+    """更新传感器配置的存储策略（立即对数据接收生效）"""
+    config = get_sensor_config_by_device_and_type(db, device_id, sensor_type)
+    
+    if not config:
+        return None
+    
+    config.storage_policy = policy
+    config.deadband = deadband
+    config.min_interval_seconds = min_interval_seconds
+    config.heartbeat_seconds = heartbeat_seconds
+    config.updated_at = datetime.utcnow()
+    
     db.commit()
     db.refresh(config)
+    storage_policy.set_storage_policy(config.id, storage_policy.policy_from_config(config))
     
     return config
 
@@ -101,7 +226,18 @@ def delete_sensor_config(db: Session, config_id: int) -> bool:
     if not config:
         return False
     
+    device_id, sensor_type = config.device_id, config.type
+    sensor_partitions.delete_config_rows(db, [config_id])
+    sensor_rollups.delete_config_rollups(db, [config_id])
+    sensor_latest.delete_config_latest(db, [config_id])
     db.delete(config)
     db.commit()
+    invalidate_sensor_config_cache(device_id, sensor_type)
+    # 其他进程缓存的配置ID已失效
+    cache_sync.notify_changed()
+    storage_policy.set_storage_policy(config_id, storage_policy.ALWAYS)
+    storage_policy.forget(config_id)
+    alert_rules.remove_alert_rule(config_id)
+    alert_rules.reset_state(config_id)
     
     return True
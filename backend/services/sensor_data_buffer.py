@@ -0,0 +1,218 @@
+"""传感器数据写缓冲 - 批量写入sensor_data按月分区表，并增量更新汇总和最新读数"""
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy.exc import OperationalError
+
+from core.database import WriterSessionLocal
+from core.logging_config import get_logger
+from services import alert_rules, metrics, sensor_latest, sensor_partitions, sensor_rollups, storage_policy
+
+logger = get_logger(__name__)
+
+# 数据库错误（锁定、磁盘已满等）连续写入失败超过该次数后丢弃该批数据，避免无限积压
+MAX_FLUSH_RETRIES = 3
+# 停止时写入剩余数据的最长时间（秒）
+STOP_FLUSH_TIMEOUT = 10.0
+
+
+class SensorDataWriteBuffer:
+    """
+    传感器数据写缓冲（write-behind）
+
+    解析后的读数先放入内存缓冲，累计到 batch_size 条或距上次写入超过
+    flush_interval_ms 毫秒时，由后台线程以一次批量 INSERT 写入数据库。
+    写入吞吐取决于批大小，而不是每条消息的提交延迟。
+
+    数据库错误（OperationalError）时整批稍后重试；其他错误（读数本身无法写入）时把该批
+    对半拆分重试，只丢弃确实写入失败的读数。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval_ms: int = 1000,
+        max_pending_rows: int = 20000,
+        session_factory=WriterSessionLocal
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(flush_interval_ms, 1) / 1000.0
+        self.max_pending_rows = max(self.batch_size, max_pending_rows)
+        self.session_factory = session_factory
+
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_attempts = 0
+
+        # 统计信息
+        self.rows_written = 0
+        self.flush_count = 0
+
+    @property
+    def pending(self) -> int:
+        """当前缓冲中等待写入的读数条数"""
+        return len(self._rows)
+
+    def start(self):
+        """启动后台刷盘线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor-data-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"传感器数据写缓冲已启动: batch_size={self.batch_size}, "
+            f"flush_interval={int(self.flush_interval * 1000)}ms"
+        )
+
+    def set_batch_size(self, batch_size: int):
+        """调整批大小（如排空积压消息期间使用更大的批）"""
+        batch_size = min(max(1, batch_size), self.max_pending_rows)
+        if batch_size != self.batch_size:
+            self.batch_size = batch_size
+            logger.info(f"传感器数据写缓冲批大小调整为 {batch_size}")
+
+    def add(self, rows: List[Dict[str, Any]]):
+        """
+        添加待写入的读数
+
+        Args:
+            rows: 每项为 sensor_data 表的一行（sensor_config_id、value、timestamp、alert_status）
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._rows.extend(rows)
+            pending = len(self._rows)
+
+        if pending >= self.max_pending_rows:
+            # 缓冲积压过多，由写入方同步刷盘形成背压
+            logger.warning(f"写缓冲积压 {pending} 条，同步写入数据库")
+            self.flush()
+        elif pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """将缓冲中的全部读数写入数据库，返回写入条数"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._write(rows)
+            except OperationalError as e:
+                # 与读数无关的数据库错误：整批放回缓冲稍后重试
+                self._failed_attempts += 1
+                if self._failed_attempts >= MAX_FLUSH_RETRIES:
+                    self._failed_attempts = 0
+                    self._drop(rows, f"连续 {MAX_FLUSH_RETRIES} 次写入失败: {e}")
+                else:
+                    logger.error(f"批量写入传感器数据失败，稍后重试: {e}")
+                    with self._lock:
+                        self._rows[:0] = rows
+                return 0
+            except Exception as e:
+                logger.error(f"批量写入传感器数据失败，拆分后重试 {len(rows)} 条: {e}")
+                retry: List[Dict[str, Any]] = []
+                written = self._write_split(rows, e, retry)
+                if retry:
+                    with self._lock:
+                        self._rows[:0] = retry
+            else:
+                written = len(rows)
+
+            metrics.FLUSH_SECONDS.observe(time.perf_counter() - started)
+            self._failed_attempts = 0
+            self.flush_count += 1
+            logger.debug(f"批量写入传感器数据 {written} 条")
+            return written
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """在一个事务中写入读数、汇总和最新读数，失败时回滚并抛出异常"""
+        db = self.session_factory()
+        try:
+            ids = sensor_partitions.insert_rows(db, rows)
+            sensor_rollups.apply_rows(db, rows)
+            sensor_latest.apply_rows(db, rows, ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        metrics.ROWS_WRITTEN.inc(len(rows))
+        self.rows_written += len(rows)
+
+    def _write_split(self, rows: List[Dict[str, Any]], error: Exception, retry: List[Dict[str, Any]]) -> int:
+        """
+        对半拆分写入失败的一批读数，只丢弃单独写入仍然失败的读数
+
+        拆分期间出现数据库错误的部分放入 retry，下次刷盘时重试。
+
+        Returns:
+            写入条数
+        """
+        if len(rows) == 1:
+            self._drop(rows, str(error))
+            return 0
+        middle = len(rows) // 2
+        written = 0
+        for part in (rows[:middle], rows[middle:]):
+            try:
+                self._write(part)
+                written += len(part)
+            except OperationalError:
+                retry.extend(part)
+            except Exception as e:
+                written += self._write_split(part, e, retry)
+        return written
+
+    def _drop(self, rows: List[Dict[str, Any]], reason: str):
+        """丢弃无法写入的读数，清除其存储策略的上次写入值和告警状态（下一条读数重新判断）"""
+        logger.error(f"丢弃 {len(rows)} 条无法写入的传感器数据: {reason}")
+        metrics.ROWS_DROPPED.inc(len(rows))
+        for config_id in {row.get("sensor_config_id") for row in rows}:
+            storage_policy.forget(config_id)
+            alert_rules.reset_state(config_id)
+
+    def stop(self, timeout: float = STOP_FLUSH_TIMEOUT):
+        """停止后台线程，并写入剩余数据（写入失败时重试到缓冲为空或超过 timeout 秒）"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=max(self.flush_interval * 2, 5.0))
+            self._thread = None
+
+        deadline = time.monotonic() + timeout
+        written = self.flush()
+        while self._rows and time.monotonic() < deadline:
+            time.sleep(min(self.flush_interval, 0.5))
+            written += self.flush()
+        if written:
+            logger.info(f"关闭前写入剩余传感器数据 {written} 条")
+
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            logger.error(f"关闭前未能写入 {len(rows)} 条传感器数据，已丢弃")
+            metrics.ROWS_DROPPED.inc(len(rows))
+
+    def _run(self):
+        """后台刷盘循环"""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"写缓冲刷盘线程出错: {e}", exc_info=True)
@@ -0,0 +1,85 @@
+"""传感器最新读数 - 写入读数时更新 sensor_latest 表，查询当前读数时不扫描历史分区"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.sensor_latest import SensorLatestModel
+
+
+def apply_rows(db: Session, rows: List[Dict[str, Any]], ids: List[int]) -> int:
+    """
+    用新写入的 sensor_data 行更新最新读数（与写入读数在同一事务中，调用方提交）
+
+    只有读数时间不早于已记录的最新读数时才更新，补发或回放的旧读数不会覆盖当前读数。
+
+    Returns:
+        涉及的传感器配置数
+    """
+    newest: Dict[int, Dict[str, Any]] = {}
+    for row, reading_id in zip(rows, ids):
+        current = newest.get(row["sensor_config_id"])
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            newest[row["sensor_config_id"]] = {
+                "sensor_config_id": row["sensor_config_id"],
+                "reading_id": reading_id,
+                "value": row["value"],
+                "timestamp": row["timestamp"],
+                "alert_status": row.get("alert_status"),
+            }
+    if not newest:
+        return 0
+    table = SensorLatestModel.__table__
+    stmt = sqlite_insert(table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sensor_config_id"],
+        set_={
+            "reading_id": excluded.reading_id,
+            "value": excluded.value,
+            "timestamp": excluded.timestamp,
+            "alert_status": excluded.alert_status,
+        },
+        where=excluded.timestamp >= table.c.timestamp
+    )
+    db.execute(stmt, list(newest.values()))
+    return len(newest)
+
+
+def fetch_latest(
+    db: Session,
+    config_ids: Optional[Iterable[int]] = None,
+    limit: Optional[int] = None
+) -> List[Any]:
+    """
+    查询最新读数（行有 id、sensor_config_id、value、timestamp、alert_status 属性，与分区读数一致）
+
+    按读数时间倒序；config_ids 为空表示所有传感器。
+    """
+    table = SensorLatestModel.__table__
+    query = select(
+        table.c.reading_id.label("id"),
+        table.c.sensor_config_id,
+        table.c.value,
+        table.c.timestamp,
+        table.c.alert_status
+    )
+    if config_ids is not None:
+        config_ids = list(config_ids)
+        if not config_ids:
+            return []
+        query = query.where(table.c.sensor_config_id.in_(config_ids))
+    query = query.order_by(table.c.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return db.execute(query).all()
+
+
+def delete_config_latest(db: Session, config_ids: Iterable[int]) -> int:
+    """删除传感器配置的最新读数（删除配置或设备时调用，调用方提交事务）"""
+    config_ids = list(config_ids)
+    if not config_ids:
+        return 0
+    table = SensorLatestModel.__table__
+    return db.execute(table.delete().where(table.c.sensor_config_id.in_(config_ids))).rowcount
@@ -0,0 +1,446 @@
+"""传感器数据按月分区 - sensor_data_YYYYMM 分区表的路由、写入、查询和整表删除"""
+import functools
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, func, inspect, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from core.logging_config import get_logger
+from models.sensor_data_new import SensorDataModel
+
+logger = get_logger(__name__)
+
+PARTITION_PREFIX = "sensor_data_"
+_PARTITION_NAME = re.compile(r"^sensor_data_(\d{4})(\d{2})$")
+_PARTITION_NAMES = text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'sensor_data_%'")
+_MISSING_PARTITION = re.compile(r"no such table: (?:main\.)?sensor_data_(\d{4})(\d{2})\b")
+# 对外的读数ID = 分区键(YYYYMM) * ID_STRIDE + 分区内ID；旧的未分区表 sensor_data 的ID小于 ID_STRIDE
+ID_STRIDE = 10 ** 10
+
+_metadata = MetaData()
+# 分区键 YYYYMM -> 分区表
+_tables: Dict[int, Table] = {}
+# 旧的未分区表 sensor_data 中是否还有数据（迁移前与分区一起查询）
+_legacy_rows = False
+_loaded = False
+_lock = threading.Lock()
+
+
+def partition_key(timestamp: datetime) -> int:
+    """读数时间所在的分区键 YYYYMM"""
+    return timestamp.year * 100 + timestamp.month
+
+
+def partition_name(key: int) -> str:
+    return f"{PARTITION_PREFIX}{key}"
+
+
+def partition_bounds(key: int) -> Tuple[datetime, datetime]:
+    """分区的时间范围 [开始, 结束)"""
+    year, month = divmod(key, 100)
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def _define_table(key: int) -> Table:
+    """分区表结构与 sensor_data 相同，按 (sensor_config_id, timestamp) 建索引"""
+    name = partition_name(key)
+    table = _metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, _metadata,
+            Column("id", Integer, primary_key=True),
+            Column("sensor_config_id", Integer, nullable=False),
+            Column("value", Float, nullable=False),
+            Column("timestamp", DateTime, nullable=False),
+            Column("alert_status", String, nullable=True),
+            Index(f"ix_{name}_config_timestamp", "sensor_config_id", "timestamp"),
+            Index(f"ix_{name}_timestamp", "timestamp"),
+        )
+    return table
+
+
+def load_partitions(db: Session) -> int:
+    """
+    从数据库加载已有的分区表（启动时或其他进程修改分区后调用）
+
+    Returns:
+        分区数量
+    """
+    global _tables, _legacy_rows, _loaded
+
+    # 使用单独的连接查询，会话不因此持有连接（专用写引擎只有一个连接，之后建表需要使用）
+    with db.get_bind().connect() as conn:
+        table_names = inspect(conn).get_table_names()
+        tables = {}
+        for name in table_names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                key = int(match.group(1)) * 100 + int(match.group(2))
+                tables[key] = _define_table(key)
+        legacy_rows = SensorDataModel.__tablename__ in table_names and \
+            conn.execute(select(SensorDataModel.id).limit(1)).first() is not None
+
+    with _lock:
+        _tables = tables
+        _legacy_rows = legacy_rows
+        _loaded = True
+    if legacy_rows:
+        logger.warning("sensor_data 表中仍有未分区的数据，请运行 migrate_partition_sensor_data.py 迁移")
+    return len(tables)
+
+
+def clear_partition_cache():
+    """清除分区缓存（切换数据库后调用），下次使用时重新加载"""
+    global _tables, _legacy_rows, _loaded
+    with _lock:
+        _tables = {}
+        _legacy_rows = False
+        _loaded = False
+
+
+def _ensure_loaded(db: Session):
+    if not _loaded:
+        load_partitions(db)
+
+
+def _refresh_partitions(db: Session):
+    """
+    与数据库中的分区表同步（其他进程新建或删除的分区），查询和删除读数前调用
+
+    分区缓存只在本进程中更新；sqlite_master 的查询代价很小，在调用方会话中执行，
+    与随后的查询看到同一份表结构。
+    """
+    global _tables
+    if not _loaded:
+        load_partitions(db)
+        return
+    keys = set()
+    for name in db.execute(_PARTITION_NAMES).scalars():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            keys.add(int(match.group(1)) * 100 + int(match.group(2)))
+    if keys == _tables.keys():
+        return
+    with _lock:
+        _tables = {key: _tables[key] if key in _tables else _define_table(key) for key in keys}
+
+
+def _discard_missing(error: OperationalError) -> bool:
+    """
+    错误为分区表不存在（已被其他进程的数据保留任务删除）时，从缓存中移除该分区
+
+    Returns:
+        是否移除了缓存中的分区
+    """
+    match = _MISSING_PARTITION.search(str(error.orig))
+    if match is None:
+        return False
+    key = int(match.group(1)) * 100 + int(match.group(2))
+    with _lock:
+        removed = _tables.pop(key, None) is not None
+    if removed:
+        logger.warning(f"传感器数据分区表 {partition_name(key)} 已不存在，从分区缓存中移除")
+    return removed
+
+
+def _skip_missing_partitions(func):
+    """查询或删除时缓存的分区表已被删除：移除该分区后重新执行（被删除的分区中没有需要的数据）"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if not _discard_missing(e):
+                    raise
+    return wrapper
+
+
+def partitions(start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Tuple[int, Table]]:
+    """与时间范围 [start, end] 重叠的分区，按时间正序"""
+    result = []
+    for key in sorted(_tables):
+        part_start, part_end = partition_bounds(key)
+        if (start is None or start < part_end) and (end is None or end >= part_start):
+            result.append((key, _tables[key]))
+    return result
+
+
+def get_partition(db: Session, key: int) -> Table:
+    """获取分区表，不存在时创建（DDL 单独提交，其他连接立即可见）"""
+    table = _tables.get(key)
+    if table is not None:
+        return table
+    with _lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _define_table(key)
+            with db.get_bind().begin() as conn:
+                table.create(conn, checkfirst=True)
+            _tables[key] = table
+            logger.info(f"创建传感器数据分区表 {table.name}")
+    return table
+
+
+def insert_rows(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    按读数时间把 sensor_data 行写入对应的月分区（调用方提交事务）
+
+    缺少的分区在写入任何数据之前创建：建表使用单独的连接，会话已持有写锁时会互相等待。
+
+    Returns:
+        与 rows 顺序一致的全局ID
+    """
+    _ensure_loaded(db)
+    groups: Dict[int, List[int]] = {}
+    for index, row in enumerate(rows):
+        groups.setdefault(partition_key(row["timestamp"]), []).append(index)
+    tables = {key: get_partition(db, key) for key in groups}
+    ids = [0] * len(rows)
+    try:
+        for key, indexes in groups.items():
+            table = tables[key]
+            result = db.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                [rows[index] for index in indexes]
+            )
+            for index, local_id in zip(indexes, result.scalars()):
+                ids[index] = key * ID_STRIDE + local_id
+    except OperationalError as e:
+        # 缓存的分区已被其他进程删除：移除后由调用方回滚重试（写缓冲下次刷盘时重新建表）
+        _discard_missing(e)
+        raise
+    return ids
+
+
+def insert_row(db: Session, row: Dict[str, Any]) -> int:
+    """写入单条读数，返回全局ID（调用方提交事务）"""
+    _ensure_loaded(db)
+    key = partition_key(row["timestamp"])
+    try:
+        result = db.execute(insert(get_partition(db, key)).values(**row))
+    except OperationalError as e:
+        _discard_missing(e)
+        raise
+    return key * ID_STRIDE + result.inserted_primary_key[0]
+
+
+def _columns(key: Optional[int], table: Table):
+    """查询列，分区内ID换算为全局ID"""
+    row_id = table.c.id if key is None else (table.c.id + key * ID_STRIDE).label("id")
+    return row_id, table.c.sensor_config_id, table.c.value, table.c.timestamp, table.c.alert_status
+
+
+def _select(
+    key: Optional[int],
+    table: Table,
+    config_ids: Optional[Iterable[int]],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    newest_first: bool
+):
+    query = select(*_columns(key, table))
+    if config_ids is not None:
+        query = query.where(table.c.sensor_config_id.in_(list(config_ids)))
+    if start is not None:
+        query = query.where(table.c.timestamp >= start)
+    if end is not None:
+        query = query.where(table.c.timestamp <= end)
+    return query.order_by(table.c.timestamp.desc() if newest_first else table.c.timestamp.asc())
+
+
+@_skip_missing_partitions
+def fetch_rows(
+    db: Session,
+    config_ids: Optional[Iterable[int]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = False
+) -> List[Any]:
+    """
+    查询读数（行有 id、sensor_config_id、value、timestamp、alert_status 属性）
+
+    只查询与时间范围重叠的分区；分区之间时间不重叠，按顺序逐个查询，取够 limit 条后不再查询更早
+    （或更晚）的分区。config_ids 为空表示所有传感器。
+    """
+    _refresh_partitions(db)
+    if config_ids is not None:
+        config_ids = list(config_ids)
+        if not config_ids:
+            return []
+    tables = partitions(start, end)
+    if newest_first:
+        tables.reverse()
+
+    rows: List[Any] = []
+    for key, table in tables:
+        if limit is not None and len(rows) >= limit:
+            break
+        query = _select(key, table, config_ids, start, end, newest_first)
+        if limit is not None:
+            query = query.limit(limit - len(rows))
+        rows.extend(db.execute(query).all())
+
+    if _legacy_rows:
+        # 旧表的时间范围与分区重叠，合并后重新排序
+        query = _select(None, SensorDataModel.__table__, config_ids, start, end, newest_first)
+        if limit is not None:
+            query = query.limit(limit)
+        rows.extend(db.execute(query).all())
+        rows.sort(key=lambda row: row.timestamp, reverse=newest_first)
+        if limit is not None:
+            rows = rows[:limit]
+    return rows
+
+
+@_skip_missing_partitions
+def latest_rows(
+    db: Session,
+    config_ids: Iterable[int],
+    before: Optional[datetime] = None
+) -> Dict[int, Any]:
+    """每个传感器配置最后一条读数（before 不为空时为该时间之前的最后一条），从最新的分区往前查找"""
+    _refresh_partitions(db)
+    remaining = set(config_ids)
+    found: Dict[int, Any] = {}
+    tables = [(key, table) for key, table in partitions(None, before)]
+    tables.reverse()
+    if _legacy_rows:
+        tables.append((None, SensorDataModel.__table__))
+
+    for key, table in tables:
+        if not remaining:
+            break
+        conditions = [table.c.sensor_config_id.in_(list(remaining))]
+        if before is not None:
+            conditions.append(table.c.timestamp < before)
+        latest = select(
+            table.c.sensor_config_id, func.max(table.c.timestamp).label("timestamp")
+        ).where(*conditions).group_by(table.c.sensor_config_id).subquery()
+        query = select(*_columns(key, table)).join(
+            latest,
+            (table.c.sensor_config_id == latest.c.sensor_config_id)
+            & (table.c.timestamp == latest.c.timestamp)
+        )
+        for row in db.execute(query).all():
+            previous = found.get(row.sensor_config_id)
+            if previous is None or row.timestamp > previous.timestamp:
+                found[row.sensor_config_id] = row
+        if key is not None:
+            remaining -= found.keys()
+    return found
+
+
+@_skip_missing_partitions
+def get_row(db: Session, row_id: int) -> Optional[Any]:
+    """按全局ID查询读数"""
+    _ensure_loaded(db)
+    key, local_id = divmod(row_id, ID_STRIDE)
+    if key == 0:
+        table = SensorDataModel.__table__
+        key = None
+    else:
+        table = _tables.get(key)
+        if table is None:
+            # 分区可能由其他进程创建
+            _refresh_partitions(db)
+            table = _tables.get(key)
+        if table is None:
+            return None
+    return db.execute(select(*_columns(key, table)).where(table.c.id == local_id)).first()
+
+
+@_skip_missing_partitions
+def count_rows(db: Session) -> int:
+    """所有分区（及旧表）中的读数条数"""
+    _refresh_partitions(db)
+    tables = [table for _, table in partitions()]
+    if _legacy_rows:
+        tables.append(SensorDataModel.__table__)
+    return sum(db.execute(select(func.count()).select_from(table)).scalar() for table in tables)
+
+
+@_skip_missing_partitions
+def delete_config_rows(db: Session, config_ids: Iterable[int]) -> int:
+    """删除传感器配置在所有分区中的读数（删除配置或设备时调用，调用方提交事务）"""
+    _refresh_partitions(db)
+    config_ids = list(config_ids)
+    if not config_ids:
+        return 0
+    deleted = 0
+    for _, table in partitions():
+        deleted += db.execute(table.delete().where(table.c.sensor_config_id.in_(config_ids))).rowcount
+    return deleted
+
+
+@_skip_missing_partitions
+def partition_config_ids(db: Session, key: int) -> List[int]:
+    """分区中有读数的传感器配置ID"""
+    _ensure_loaded(db)
+    table = _tables.get(key)
+    if table is None:
+        _refresh_partitions(db)
+        table = _tables.get(key)
+    if table is None:
+        return []
+    return list(db.execute(select(table.c.sensor_config_id).distinct()).scalars())
+
+
+@_skip_missing_partitions
+def prune_batch(db: Session, config_ids: Iterable[int], cutoff: datetime, batch_size: int) -> int:
+    """
+    删除传感器配置在 cutoff 之前的一批读数（最多 batch_size 条，调用方提交事务）
+
+    Returns:
+        删除的条数，0 表示已经没有过期读数
+    """
+    _refresh_partitions(db)
+    config_ids = list(config_ids)
+    tables = [table for _, table in partitions(None, cutoff)]
+    if _legacy_rows:
+        tables.append(SensorDataModel.__table__)
+    for table in tables:
+        ids = select(table.c.id).where(
+            table.c.sensor_config_id.in_(config_ids), table.c.timestamp < cutoff
+        ).limit(batch_size).scalar_subquery()
+        deleted = db.execute(table.delete().where(table.c.id.in_(ids))).rowcount
+        if deleted:
+            return deleted
+    return 0
+
+
+def drop_partition(db: Session, key: int) -> Optional[str]:
+    """删除整个月分区（DROP TABLE，不逐行删除），返回删除的表名"""
+    with _lock:
+        table = _tables.pop(key, None)
+        if table is None:
+            return None
+        with db.get_bind().begin() as conn:
+            table.drop(conn, checkfirst=True)
+    logger.info(f"删除传感器数据分区表 {table.name}")
+    return table.name
+
+
+def drop_partitions_before(db: Session, cutoff: datetime) -> List[str]:
+    """
+    删除结束时间不晚于 cutoff 的整月分区
+
+    Returns:
+        删除的分区表名
+    """
+    _ensure_loaded(db)
+    dropped = []
+    for key, _ in partitions():
+        if partition_bounds(key)[1] > cutoff:
+            break
+        name = drop_partition(db, key)
+        if name:
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,180 @@
+"""传感器数据汇总 - 写入读数时增量更新 1 分钟 / 1 小时 / 1 天汇总，长时间范围的历史曲线直接读取汇总"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from core.logging_config import get_logger
+from models.sensor_rollup import SensorRollupModel
+from services import sensor_partitions
+
+logger = get_logger(__name__)
+
+# 汇总粒度
+RESOLUTION_RAW = "raw"  # 不汇总，返回原始读数
+RESOLUTION_MINUTE = "1m"
+RESOLUTION_HOUR = "1h"
+RESOLUTION_DAY = "1d"
+ROLLUP_RESOLUTIONS = (RESOLUTION_MINUTE, RESOLUTION_HOUR, RESOLUTION_DAY)
+RESOLUTIONS = (RESOLUTION_RAW,) + ROLLUP_RESOLUTIONS
+
+# 自动选择粒度：时间范围不超过 RAW_MAX_SPAN 返回原始读数，不超过 HOURLY_MAX_SPAN 使用小时汇总，否则使用天汇总
+# （周视图 7 x 24 = 168 点，月视图约 720 点；天汇总按 UTC 划分，只用于更长的范围）
+RAW_MAX_SPAN = timedelta(days=2)
+HOURLY_MAX_SPAN = timedelta(days=90)
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    """读数所在时间段的开始时间"""
+    if resolution == RESOLUTION_MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == RESOLUTION_HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_resolution(start: Optional[datetime], end: Optional[datetime]) -> str:
+    """按查询的时间范围自动选择粒度（没有开始时间时返回原始读数）"""
+    if start is None:
+        return RESOLUTION_RAW
+    span = (end or datetime.utcnow()) - start
+    if span <= RAW_MAX_SPAN:
+        return RESOLUTION_RAW
+    if span <= HOURLY_MAX_SPAN:
+        return RESOLUTION_HOUR
+    return RESOLUTION_DAY
+
+
+def aggregate(readings: Iterable[Tuple[int, float, datetime]]) -> List[Dict[str, Any]]:
+    """把 (sensor_config_id, value, timestamp) 读数汇总为各粒度的汇总行"""
+    buckets: Dict[Tuple[str, int, datetime], Dict[str, Any]] = {}
+    for config_id, value, timestamp in readings:
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, config_id, bucket_start(timestamp, resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "resolution": resolution,
+                    "sensor_config_id": config_id,
+                    "bucket": key[2],
+                    "sample_count": 1,
+                    "value_sum": value,
+                    "value_min": value,
+                    "value_max": value,
+                    "last_value": value,
+                    "last_timestamp": timestamp,
+                }
+                continue
+            row["sample_count"] += 1
+            row["value_sum"] += value
+            if value < row["value_min"]:
+                row["value_min"] = value
+            if value > row["value_max"]:
+                row["value_max"] = value
+            if timestamp >= row["last_timestamp"]:
+                row["last_value"] = value
+                row["last_timestamp"] = timestamp
+    return list(buckets.values())
+
+
+def apply_rows(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    用新写入的 sensor_data 行增量更新汇总（与写入读数在同一事务中，调用方提交）
+
+    Returns:
+        更新的汇总行数
+    """
+    rollups = aggregate((row["sensor_config_id"], row["value"], row["timestamp"]) for row in rows)
+    if not rollups:
+        return 0
+    table = SensorRollupModel.__table__
+    stmt = sqlite_insert(table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["resolution", "sensor_config_id", "bucket"],
+        set_={
+            "sample_count": table.c.sample_count + excluded.sample_count,
+            "value_sum": table.c.value_sum + excluded.value_sum,
+            "value_min": func.min(table.c.value_min, excluded.value_min),
+            "value_max": func.max(table.c.value_max, excluded.value_max),
+            "last_value": case(
+                (excluded.last_timestamp >= table.c.last_timestamp, excluded.last_value),
+                else_=table.c.last_value
+            ),
+            "last_timestamp": func.max(table.c.last_timestamp, excluded.last_timestamp),
+        }
+    )
+    db.execute(stmt, rollups)
+    return len(rollups)
+
+
+def rebuild(db: Session, start: datetime, end: datetime) -> int:
+    """
+    以原始读数重建 [start, end) 内的汇总（start、end 需对齐到天，调用方提交事务）
+
+    先删除该范围的汇总（取得写锁）再读取原始读数，期间写缓冲提交的读数不会漏算或重复计入。
+
+    Returns:
+        写入的汇总行数
+    """
+    table = SensorRollupModel.__table__
+    db.execute(table.delete().where(table.c.bucket >= start, table.c.bucket < end))
+    rows = sensor_partitions.fetch_rows(db, start=start, end=end - timedelta(microseconds=1))
+    rollups = aggregate((row.sensor_config_id, row.value, row.timestamp) for row in rows)
+    if rollups:
+        db.execute(table.insert(), rollups)
+    return len(rollups)
+
+
+def fetch_rollups(
+    db: Session,
+    config_ids: Iterable[int],
+    resolution: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> List[SensorRollupModel]:
+    """查询汇总（按时间正序；提供 limit 时取最新的 limit 个时间段）"""
+    config_ids = list(config_ids)
+    if not config_ids:
+        return []
+    query = db.query(SensorRollupModel).filter(
+        SensorRollupModel.resolution == resolution,
+        SensorRollupModel.sensor_config_id.in_(config_ids)
+    )
+    if start is not None:
+        query = query.filter(SensorRollupModel.bucket >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.filter(SensorRollupModel.bucket <= end)
+    if limit:
+        rows = query.order_by(SensorRollupModel.bucket.desc()).limit(limit).all()
+        rows.reverse()
+        return rows
+    return query.order_by(SensorRollupModel.bucket.asc()).all()
+
+
+def delete_config_rollups(db: Session, config_ids: Iterable[int]) -> int:
+    """删除传感器配置的汇总（删除配置或设备时调用，调用方提交事务）"""
+    config_ids = list(config_ids)
+    if not config_ids:
+        return 0
+    table = SensorRollupModel.__table__
+    return db.execute(table.delete().where(table.c.sensor_config_id.in_(config_ids))).rowcount
+
+
+def prune_batch(db: Session, resolution: str, config_ids: Iterable[int], cutoff: datetime, batch_size: int) -> int:
+    """
+    删除传感器配置在 cutoff 之前的一批汇总（最多 batch_size 条，调用方提交事务）
+
+    Returns:
+        删除的条数，0 表示已经没有过期汇总
+    """
+    table = SensorRollupModel.__table__
+    ids = select(table.c.id).where(
+        table.c.resolution == resolution,
+        table.c.sensor_config_id.in_(list(config_ids)),
+        table.c.bucket < cutoff
+    ).limit(batch_size).scalar_subquery()
+    return db.execute(table.delete().where(table.c.id.in_(ids))).rowcount
@@ -1,18 +1,17 @@
-"""传感器数据服务层 - 使用新架构（配置和数据分离）"""
-from typing import List, Optional
+"""传感器数据服务层 - 使用新架构（配置和数据分离，数据按月分区存储）"""
+from typing import Any, List, Optional
 from datetime import datetime
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
 
-from models.sensor_data_new import SensorDataModel
 from models.sensor_config import SensorConfigModel
 from schemas.sensor import SensorDataCreate, SensorDataUpdate
+from services import sensor_latest, sensor_partitions, sensor_rollups
 
 
 def get_sensor_data(db: Session, sensor_id: int) -> Optional[dict]:
     """根据ID获取传感器数据（返回完整信息）"""
-    data = db.query(SensorDataModel).filter(SensorDataModel.id == sensor_id).first()
+    data = sensor_partitions.get_row(db, sensor_id)
     if not data:
         return None
     
@@ -27,15 +26,12 @@ def get_sensor_data(db: Session, sensor_id: int) -> Optional[dict]:
 
 def get_device_sensors(db: Session, device_id: int) -> List[dict]:
     """获取设备的所有传感器数据（返回完整信息）"""
-    # JOIN 查询获取配置和数据
-    results = db.query(SensorDataModel, SensorConfigModel).join(
-        SensorConfigModel,
-        SensorDataModel.sensor_config_id == SensorConfigModel.id
-    ).filter(
-        SensorConfigModel.device_id == device_id
-    ).all()
-    
-    return [_merge_config_and_data(config, data) for data, config in results]
+    configs = {
+        config.id: config
+        for config in db.query(SensorConfigModel).filter(SensorConfigModel.device_id == device_id).all()
+    }
+    rows = sensor_partitions.fetch_rows(db, configs)
+    return [_merge_config_and_data(configs[data.sensor_config_id], data) for data in rows]
 
 
 def get_latest_device_sensors(db: Session, device_id: int) -> List[dict]:
@@ -55,28 +51,32 @@ def get_latest_device_sensors(db: Session, device_id: int) -> List[dict]:
             if config.updated_at > config_map[config.type].updated_at:
                 config_map[config.type] = config
     
-    result = []
-    for config in config_map.values():
-        # 获取该配置的最新数据
-        latest_data = db.query(SensorDataModel).filter(
-            SensorDataModel.sensor_config_id == config.id
-        ).order_by(desc(SensorDataModel.timestamp)).first()
-        
-        if latest_data:
-            result.append(_merge_config_and_data(config, latest_data))
-    
-    return result
+    # 获取每个配置的最新数据（最新读数表每个配置一行）
+    latest = {
+        data.sensor_config_id: data
+        for data in sensor_latest.fetch_latest(db, [config.id for config in config_map.values()])
+    }
+    return [
+        _merge_config_and_data(config, latest[config.id])
+        for config in config_map.values()
+        if config.id in latest
+    ]
 
 
 def get_latest_sensors(db: Session, limit: int = 50) -> List[dict]:
-    """获取最新的传感器数据（返回完整信息）"""
-    # JOIN 查询获取最新数据及其配置
-    results = db.query(SensorDataModel, SensorConfigModel).join(
-        SensorConfigModel,
-        SensorDataModel.sensor_config_id == SensorConfigModel.id
-    ).order_by(desc(SensorDataModel.timestamp)).limit(limit).all()
-    
-    return [_merge_config_and_data(config, data) for data, config in results]
+    """获取最新的传感器数据（每个传感器最新一条，按读数时间倒序，返回完整信息）"""
+    # 从最新读数表取最近更新的传感器，再查询其配置
+    rows = sensor_latest.fetch_latest(db, limit=limit)
+    config_ids = {data.sensor_config_id for data in rows}
+    configs = {
+        config.id: config
+        for config in db.query(SensorConfigModel).filter(SensorConfigModel.id.in_(config_ids)).all()
+    } if config_ids else {}
+    return [
+        _merge_config_and_data(configs[data.sensor_config_id], data)
+        for data in rows
+        if data.sensor_config_id in configs
+    ]
 
 
 def get_device_sensors_by_time_range(
@@ -91,38 +91,104 @@ def get_device_sensors_by_time_range(
     根据时间范围获取设备的传感器数据（用于历史曲线，返回完整信息）
     
     - 可按设备ID、传感器类型、时间范围、数量限制查询
-    - 按时间倒序返回（最新在前）
+    - 按时间正序返回（供图表显示）
+    - 只查询与时间范围重叠的月分区
+    - 存储策略不是 always 的传感器只记录变化，提供 start_time 时会在开始时间补一个
+      延续点（开始时间之前最后一次写入的值），保证阶梯图从正确的值开始
     """
-    # 构建查询
-    query = db.query(SensorDataModel, SensorConfigModel).join(
-        SensorConfigModel,
-        SensorDataModel.sensor_config_id == SensorConfigModel.id
-    ).filter(
-        SensorConfigModel.device_id == device_id
-    )
-    
+    # 先查询设备的传感器配置，再按配置ID查询分区中的数据
+    query = db.query(SensorConfigModel).filter(SensorConfigModel.device_id == device_id)
     if sensor_type:
         query = query.filter(SensorConfigModel.type == sensor_type)
-    
-    if start_time:
-        query = query.filter(SensorDataModel.timestamp >= start_time)
-    
-    if end_time:
-        query = query.filter(SensorDataModel.timestamp <= end_time)
+    configs = {config.id: config for config in query.all()}
     
     if limit:
-        # 如果提供了限制，获取最新的N条记录（按时间倒序）
-        query = query.order_by(SensorDataModel.timestamp.desc()).limit(limit)
-        results = query.all()
+        # 如果提供了限制，从最新的分区开始获取最新的N条记录（按时间倒序）
+        rows = sensor_partitions.fetch_rows(db, configs, start_time, end_time, limit=limit, newest_first=True)
         # 然后在内存中按时间正序排列，以供图表正确显示
-        merged = [_merge_config_and_data(config, data) for data, config in results]
+        merged = [_merge_config_and_data(configs[data.sensor_config_id], data) for data in rows]
         merged.sort(key=lambda x: x['timestamp'])
-        return merged
+    else:
+        # 如果没有限制，直接按时间正序返回
+        rows = sensor_partitions.fetch_rows(db, configs, start_time, end_time)
+        merged = [_merge_config_and_data(configs[data.sensor_config_id], data) for data in rows]
+    
+    if start_time:
+        merged = _carry_forward_anchors(db, device_id, sensor_type, start_time) + merged
+    return merged
+
+
+def get_device_sensor_rollups(
+    db: Session,
+    device_id: int,
+    resolution: str,
+    sensor_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    按汇总粒度（1m / 1h / 1d）获取设备的历史数据，每个时间段一个点（用于长时间范围的历史曲线）
+    
+    value 为时间段内的平均值，另附最小值、最大值和读数条数；按时间正序返回，
+    与原始读数一样在开始时间补充只记录变化的传感器的延续点。
+    """
+    query = db.query(SensorConfigModel).filter(SensorConfigModel.device_id == device_id)
+    if sensor_type:
+        query = query.filter(SensorConfigModel.type == sensor_type)
+    configs = {config.id: config for config in query.all()}
     
-    # 如果没有限制，直接按时间正序返回
-    query = query.order_by(SensorDataModel.timestamp.asc())
-    results = query.all()
-    return [_merge_config_and_data(config, data) for data, config in results]
+    rollups = sensor_rollups.fetch_rollups(db, configs, resolution, start_time, end_time, limit)
+    merged = []
+    for rollup in rollups:
+        config = configs[rollup.sensor_config_id]
+        merged.append({
+            'id': f"{resolution}:{rollup.id}",  # 汇总ID与原始读数ID不在同一空间，带上粒度避免混淆
+            'device_id': config.device_id,
+            'type': config.type,
+            'display_name': config.display_name,
+            'unit': config.unit,
+            'min_value': config.min_value,
+            'max_value': config.max_value,
+            'value': rollup.value_sum / rollup.sample_count if rollup.sample_count else rollup.last_value,
+            'timestamp': rollup.bucket,
+            'alert_status': None,
+            'storage_policy': config.storage_policy,
+            'resolution': resolution,
+            'value_min': rollup.value_min,
+            'value_max': rollup.value_max,
+            'sample_count': rollup.sample_count
+        })
+    
+    if start_time:
+        merged = _carry_forward_anchors(db, device_id, sensor_type, start_time) + merged
+    return merged
+
+
+def _carry_forward_anchors(
+    db: Session,
+    device_id: int,
+    sensor_type: Optional[str],
+    start_time: datetime
+) -> List[dict]:
+    """只记录变化的传感器：取开始时间之前最后一次写入的值，作为开始时间的延续点"""
+    query = db.query(SensorConfigModel).filter(
+        SensorConfigModel.device_id == device_id,
+        SensorConfigModel.storage_policy.isnot(None),
+        SensorConfigModel.storage_policy != 'always'
+    )
+    if sensor_type:
+        query = query.filter(SensorConfigModel.type == sensor_type)
+    configs = {config.id: config for config in query.all()}
+    if not configs:
+        return []
+    
+    anchors = []
+    for config_id, data in sensor_partitions.latest_rows(db, configs, before=start_time).items():
+        anchor = _merge_config_and_data(configs[config_id], data)
+        anchor['timestamp'] = start_time
+        anchors.append(anchor)
+    return anchors
 
 
 def create_sensor_data(db: Session, sensor_data: SensorDataCreate) -> dict:
@@ -141,17 +207,21 @@ def create_sensor_data(db: Session, sensor_data: SensorDataCreate) -> dict:
         unit=sensor_data.unit
     )
     
-    # 创建数据记录
-    db_sensor = SensorDataModel(
-        sensor_config_id=config.id,
-        value=sensor_data.value,
-        timestamp=datetime.utcnow()
-    )
-    db.add(db_sensor)
+    # 先提交配置，写入分区时可能需要建表
     db.commit()
-    db.refresh(db_sensor)
     
-    return _merge_config_and_data(config, db_sensor)
+    # 创建数据记录（写入读数时间所在的月分区，并更新汇总和最新读数）
+    row = {
+        "sensor_config_id": config.id,
+        "value": sensor_data.value,
+        "timestamp": datetime.utcnow()
+    }
+    row_id = sensor_partitions.insert_row(db, row)
+    sensor_rollups.apply_rows(db, [row])
+    sensor_latest.apply_rows(db, [row], [row_id])
+    db.commit()
+    
+    return _merge_config_and_data(config, sensor_partitions.get_row(db, row_id))
 
 
 def update_sensor_display_name(db: Session, sensor_id: int, display_name: Optional[str]) -> Optional[dict]:
@@ -161,7 +231,7 @@ def update_sensor_display_name(db: Session, sensor_id: int, display_name: Option
     注意：这会更新配置，影响该设备该类型的所有数据显示
     """
     # 获取数据记录
-    data = db.query(SensorDataModel).filter(SensorDataModel.id == sensor_id).first()
+    data = sensor_partitions.get_row(db, sensor_id)
     if not data:
         return None
     
@@ -177,6 +247,9 @@ def update_sensor_display_name(db: Session, sensor_id: int, display_name: Option
     config.display_name = display_name if display_name and display_name.strip() else None
     config.updated_at = datetime.utcnow()
     db.commit()
+    
+    from services import sensor_config_service
+    sensor_config_service.invalidate_sensor_config_cache(config.device_id, config.type)
     db.refresh(config)
     
     return _merge_config_and_data(config, data)
@@ -199,9 +272,7 @@ def update_sensor_by_type_and_device(
         return None
     
     # 获取该配置的最新数据
-    latest_data = db.query(SensorDataModel).filter(
-        SensorDataModel.sensor_config_id == config.id
-    ).order_by(desc(SensorDataModel.timestamp)).first()
+    latest_data = next(iter(sensor_latest.fetch_latest(db, [config.id])), None)
     
     if latest_data:
         return _merge_config_and_data(config, latest_data)
@@ -221,8 +292,8 @@ def update_sensor_by_type_and_device(
     }
 
 
-def _merge_config_and_data(config: SensorConfigModel, data: SensorDataModel) -> dict:
-    """合并配置和数据信息，返回兼容前端的格式"""
+def _merge_config_and_data(config: SensorConfigModel, data: Any) -> dict:
+    """合并配置和数据信息（data 为分区中的一行读数），返回兼容前端的格式"""
     return {
         'id': data.id,
         'device_id': config.device_id,
@@ -233,5 +304,6 @@ def _merge_config_and_data(config: SensorConfigModel, data: SensorDataModel) ->
         'max_value': config.max_value,
         'value': data.value,
         'timestamp': data.timestamp,
-        'alert_status': data.alert_status
+        'alert_status': data.alert_status,
+        'storage_policy': config.storage_policy
     }
@@ -0,0 +1,143 @@
+"""传感器数据存储策略 - 按传感器配置决定每条读数是否写入sensor_data表"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.logging_config import get_logger
+from models.sensor_config import SensorConfigModel
+from services import sensor_partitions
+
+logger = get_logger(__name__)
+
+# 存储策略
+POLICY_ALWAYS = "always"  # 每条读数都写入
+POLICY_ON_CHANGE = "on_change"  # 值变化时写入
+POLICY_DEADBAND = "deadband"  # 与上次写入值的差的绝对值达到 deadband 时写入
+POLICY_DEADBAND_PCT = "deadband_pct"  # 与上次写入值的差达到上次值的 deadband% 时写入
+POLICY_INTERVAL = "interval"  # 不比较值，每隔 min_interval_seconds 写入一次
+STORAGE_POLICIES = (POLICY_ALWAYS, POLICY_ON_CHANGE, POLICY_DEADBAND, POLICY_DEADBAND_PCT, POLICY_INTERVAL)
+
+
+class StoragePolicy(NamedTuple):
+    """单个传感器配置的存储策略"""
+    mode: str = POLICY_ALWAYS
+    deadband: float = 0.0
+    min_interval: float = 0.0  # 两次写入的最小间隔（秒），0 表示不限制
+    heartbeat: float = 0.0  # 超过该时间（秒）没有写入时强制写入一条，0 表示不强制
+
+    def should_store(self, last_value: Any, last_time: datetime, value: Any, timestamp: datetime) -> bool:
+        """与上次写入的值和时间比较，判断当前读数是否需要写入"""
+        elapsed = (timestamp - last_time).total_seconds()
+        if self.heartbeat and elapsed >= self.heartbeat:
+            return True
+        if self.min_interval and elapsed < self.min_interval:
+            return False
+        if self.mode == POLICY_INTERVAL:
+            return True
+        if self.mode == POLICY_ON_CHANGE:
+            return value != last_value
+        try:
+            delta = abs(float(value) - float(last_value))
+        except (TypeError, ValueError):
+            return value != last_value
+        if self.mode == POLICY_DEADBAND:
+            return delta >= self.deadband
+        if self.mode == POLICY_DEADBAND_PCT:
+            base = abs(float(last_value))
+            return delta > 0 if base == 0 else delta >= base * self.deadband / 100.0
+        return True
+
+
+ALWAYS = StoragePolicy()
+
+# 进程级存储策略缓存：sensor_configs.id -> 存储策略（只保存非 always 的配置）
+_policies: Dict[int, StoragePolicy] = {}
+# 最近一次写入的读数：sensor_configs.id -> (值, 时间)
+_last_stored: Dict[int, Tuple[Any, datetime]] = {}
+_lock = threading.Lock()
+
+
+def policy_from_config(config: SensorConfigModel) -> StoragePolicy:
+    """由传感器配置的存储策略字段构造策略对象"""
+    mode = config.storage_policy or POLICY_ALWAYS
+    if mode not in STORAGE_POLICIES:
+        logger.warning(f"传感器配置 {config.id} 的存储策略 {mode} 无效，按 always 处理")
+        return ALWAYS
+    return StoragePolicy(
+        mode=mode,
+        deadband=config.deadband or 0.0,
+        min_interval=config.min_interval_seconds or 0,
+        heartbeat=config.heartbeat_seconds or 0
+    )
+
+
+def load_storage_policies(db: Session) -> int:
+    """
+    加载所有非 always 的存储策略，并以数据库中最新一条读数作为上次写入值
+
+    Returns:
+        加载的策略数量
+    """
+    global _policies, _last_stored
+
+    configs = db.query(SensorConfigModel).filter(
+        SensorConfigModel.storage_policy.isnot(None),
+        SensorConfigModel.storage_policy != POLICY_ALWAYS
+    ).all()
+    policies = {config.id: policy_from_config(config) for config in configs}
+    policies = {config_id: policy for config_id, policy in policies.items() if policy.mode != POLICY_ALWAYS}
+
+    last_stored: Dict[int, Tuple[Any, datetime]] = {}
+    if policies:
+        for config_id, row in sensor_partitions.latest_rows(db, policies).items():
+            last_stored[config_id] = (row.value, row.timestamp)
+
+    with _lock:
+        _policies = policies
+        _last_stored = last_stored
+    return len(policies)
+
+
+def set_storage_policy(config_id: int, policy: StoragePolicy):
+    """更新单个配置的存储策略（修改配置后调用）"""
+    with _lock:
+        if policy.mode == POLICY_ALWAYS:
+            _policies.pop(config_id, None)
+        else:
+            _policies[config_id] = policy
+
+
+def get_storage_policy(config_id: int) -> StoragePolicy:
+    return _policies.get(config_id, ALWAYS)
+
+
+def should_store(config_id: int, value: Any, timestamp: datetime) -> bool:
+    """
+    判断读数是否需要写入（数据接收热路径，不查询数据库）
+
+    需要写入时同时记录为该配置最近一次写入的读数。
+    """
+    policy = _policies.get(config_id)
+    if policy is None:
+        return True
+    with _lock:
+        last = _last_stored.get(config_id)
+        if last is not None:
+            if timestamp < last[1]:
+                # 早于上次写入的读数（设备补发的离线数据）直接写入，不影响后续比较
+                return True
+            if not policy.should_store(last[0], last[1], value, timestamp):
+                return False
+        _last_stored[config_id] = (value, timestamp)
+    return True
+
+
+def forget(config_id: Optional[int] = None):
+    """清除最近写入的读数记录（写入失败或配置删除后调用），下一条读数将直接写入"""
+    with _lock:
+        if config_id is None:
+            _last_stored.clear()
+        else:
+            _last_stored.pop(config_id, None)
@@ -1,8 +1,12 @@
 """主题配置服务层"""
-from typing import List, Optional
+import json
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional
 from sqlalchemy.orm import Session
 from models.topic_config import TopicConfigModel
 from schemas.topic_config import TopicConfigCreate, TopicConfigUpdate
+from services.topic_trie import TopicTrie
 
 
 def get_topic_config(db: Session, config_id: int) -> Optional[TopicConfigModel]:
@@ -25,6 +29,7 @@ def create_topic_config(db: Session, config: TopicConfigCreate) -> TopicConfigMo
     db_config = TopicConfigModel(**config.model_dump())
     db.add(db_config)
     db.commit()
+    _invalidate_mqtt_routes()
     db.refresh(db_config)
     return db_config
 
@@ -40,6 +45,7 @@ def update_topic_config(db: Session, config_id: int, config_update: TopicConfigU
         setattr(db_config, key, value)
     
     db.commit()
+    _invalidate_mqtt_routes()
     db.refresh(db_config)
     return db_config
 
@@ -52,6 +58,7 @@ def delete_topic_config(db: Session, config_id: int) -> bool:
     
     db.delete(db_config)
     db.commit()
+    _invalidate_mqtt_routes()
     return True
 
 
@@ -63,6 +70,7 @@ def activate_topic_config(db: Session, config_id: int) -> bool:
     
     db_config.is_active = True
     db.commit()
+    _invalidate_mqtt_routes()
     return True
 
 
@@ -74,15 +82,117 @@ def deactivate_topic_config(db: Session, config_id: int) -> bool:
     
     db_config.is_active = False
     db.commit()
+    _invalidate_mqtt_routes()
     return True
 
 
+def parse_subscribe_topics(topics_str: Optional[str]) -> List[str]:
+    """解析 subscribe_topics 字符串为主题列表（JSON数组，或按换行符/逗号分隔）"""
+    if not topics_str:
+        return []
+    
+    try:
+        # 尝试解析为JSON数组
+        parsed = json.loads(topics_str)
+        if isinstance(parsed, list):
+            return [str(t).strip() for t in parsed if t]
+    except (json.JSONDecodeError, TypeError):
+        # 如果不是JSON格式，则按换行符或逗号分割
+        if '\n' in topics_str:
+            return [t.strip() for t in topics_str.split('\n') if t.strip()]
+        else:
+            return [t.strip() for t in topics_str.split(',') if t.strip()]
+    
+    return []
+
+
+def normalize_topic(name: str) -> str:
+    """将设备名或主题统一为斜杠分隔格式（如 stm32_3、stm32-3 -> stm32/3）"""
+    return re.sub(r"[_-]", "/", name.strip())
+
+
+class TopicRoute(NamedTuple):
+    """激活主题配置的路由信息（不持有ORM对象，可跨会话缓存）"""
+    config_id: int
+    name: str
+    mqtt_config_id: Optional[int]
+    json_parse_config: Optional[str]
+    publish_topic: Optional[str]
+    payload_codec: Optional[str] = None
+    codec_options: Optional[str] = None
+
+
+class TopicRoutingTable:
+    """激活主题配置的路由表：按主题（支持 + 和 # 通配符）查找主题配置"""
+    
+    def __init__(self, configs: List[TopicConfigModel]):
+        # 按原始订阅主题匹配，用于消息路由
+        self.topic_trie = TopicTrie()
+        # 按斜杠格式归一化后的主题匹配，用于根据设备名匹配配置
+        self.normalized_trie = TopicTrie()
+        # 发布主题 -> 主题配置，用于选择发布消息的MQTT服务器
+        self.publish_routes: Dict[str, TopicRoute] = {}
+        
+        for config in configs:
+            route = TopicRoute(
+                config_id=config.id,
+                name=config.name,
+                mqtt_config_id=config.mqtt_config_id,
+                json_parse_config=config.json_parse_config,
+                publish_topic=config.publish_topic,
+                payload_codec=config.payload_codec,
+                codec_options=config.codec_options
+            )
+            for topic in parse_subscribe_topics(config.subscribe_topics):
+                self.topic_trie.insert(topic, route)
+                self.normalized_trie.insert(normalize_topic(topic), route)
+            if config.publish_topic:
+                self.publish_routes.setdefault(config.publish_topic, route)
+    
+    def match(self, topic: str) -> List[TopicRoute]:
+        """查找订阅了该主题的所有主题配置（按配置顺序）"""
+        return self.topic_trie.match(topic)
+    
+    def match_publish_topic(self, topic: str) -> Optional[TopicRoute]:
+        """查找 publish_topic 为该主题的主题配置"""
+        return self.publish_routes.get(topic)
+    
+    def match_device_name(self, device_name: str) -> Optional[TopicRoute]:
+        """根据设备名查找第一个匹配的主题配置"""
+        return self.normalized_trie.match_first(normalize_topic(device_name))
+
+
+# 激活主题配置路由表缓存，主题配置变更后失效
+_routing_table: Optional[TopicRoutingTable] = None
+_routing_table_lock = threading.Lock()
+
+
+def get_routing_table(db: Session) -> TopicRoutingTable:
+    """获取激活主题配置的路由表（带缓存）"""
+    global _routing_table
+    
+    table = _routing_table
+    if table is None:
+        with _routing_table_lock:
+            if _routing_table is None:
+                _routing_table = TopicRoutingTable(get_active_topic_configs(db))
+            table = _routing_table
+    return table
+
+
+def invalidate_routing_table():
+    """使路由表缓存失效"""
+    global _routing_table
+    with _routing_table_lock:
+        _routing_table = None
+
+
 def find_topic_config_by_device_name(db: Session, device_name: str) -> Optional[TopicConfigModel]:
     """根据设备名称自动匹配 TopicConfig
     
     匹配策略：
-    1. 将设备名转换为可能的主题格式（如 stm32_3 -> stm32/3）
-    2. 查找所有激活的 TopicConfig，检查其 subscribe_topics 是否包含该主题
+    1. 将设备名转换为斜杠分隔的主题格式（如 stm32_3 -> stm32/3）
+    2. 在激活 TopicConfig 的订阅主题中查找匹配（订阅主题同样归一化，支持 + 和 # 通配符）
     3. 如果找到匹配的 TopicConfig，返回它
     
     Args:
@@ -95,62 +205,21 @@ def find_topic_config_by_device_name(db: Session, device_name: str) -> Optional[
     if not device_name:
         return None
     
-    import json
-    import re
-    
-    # 生成可能的主题格式
-    possible_topics = []
     name = device_name.strip()
+    # 设备名不含分隔符时无法对应到主题
+    if not any(sep in name for sep in ("/", "_", "-")):
+        return None
     
-    # 如果设备名本身就是主题格式（如 "stm32/3"），直接使用
-    if "/" in name:
-        possible_topics.append(name)
-        # 也尝试下划线版本
-        possible_topics.append(name.replace("/", "_"))
-    
-    # 如果设备名包含下划线或横线，转换为斜杠格式
-    if "_" in name or "-" in name:
-        # 如 stm32_3 -> stm32/3
-        topic_with_slash = re.sub(r"[_-]", "/", name)
-        possible_topics.append(topic_with_slash)
-        # 也保留原始格式
-        possible_topics.append(name)
-    
-    # 去重
-    possible_topics = list(set(possible_topics))
-    
-    # 获取所有激活的 TopicConfig
-    active_configs = get_active_topic_configs(db)
-    
-    # 解析每个 TopicConfig 的 subscribe_topics，查找匹配
-    for config in active_configs:
-        if not config.subscribe_topics:
-            continue
-        
-        # 解析 subscribe_topics
-        topics_list = []
-        try:
-            # 尝试解析为 JSON 数组
-            parsed = json.loads(config.subscribe_topics)
-            if isinstance(parsed, list):
-                topics_list = [str(t).strip() for t in parsed if t]
-        except (json.JSONDecodeError, TypeError):
-            # 如果不是 JSON 格式，按换行符或逗号分割
-            if '\n' in config.subscribe_topics:
-                topics_list = [t.strip() for t in config.subscribe_topics.split('\n') if t.strip()]
-            else:
-                topics_list = [t.strip() for t in config.subscribe_topics.split(',') if t.strip()]
-        
-        # 检查是否有匹配的主题
-        for topic in topics_list:
-            # 精确匹配
-            if topic in possible_topics:
-                return config
-            # 部分匹配（如 subscribe_topics 是 "stm32/3"，设备名是 "stm32_3"）
-            topic_normalized = topic.replace("/", "_").replace("-", "_")
-            for possible_topic in possible_topics:
-                possible_normalized = possible_topic.replace("/", "_").replace("-", "_")
-                if topic_normalized == possible_normalized:
-                    return config
-    
-    return None
\ No newline at end of file
+    route = get_routing_table(db).match_device_name(name)
+    if not route:
+        return None
+    return get_topic_config(db, route.config_id)
+
+
+def _invalidate_mqtt_routes():
+    """主题配置变更后使路由表和MQTT主题路由缓存失效（其他进程通过缓存代数得知）"""
+    invalidate_routing_table()
+    from services.mqtt_service import invalidate_route_cache
+    invalidate_route_cache()
+    from services import cache_sync
+    cache_sync.notify_changed()
@@ -0,0 +1,82 @@
+"""MQTT主题前缀树 - 支持 + 和 # 通配符的主题匹配"""
+from typing import Any, Dict, List, Tuple
+
+
+class _TrieNode:
+    """前缀树节点，对应主题过滤器的一个层级"""
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.values: List[Tuple[int, Any]] = []
+
+
+class TopicTrie:
+    """
+    MQTT主题过滤器前缀树
+
+    插入主题过滤器（可包含 + 单层通配符和 # 多层通配符），
+    按主题层级逐级匹配，匹配耗时只与主题层数有关，与过滤器数量无关。
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, topic_filter: str, value: Any):
+        """插入主题过滤器及其关联值"""
+        node = self._root
+        for level in topic_filter.split('/'):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _TrieNode()
+            node = child
+        node.values.append((self._size, value))
+        self._size += 1
+
+    def match(self, topic: str) -> List[Any]:
+        """
+        查找与主题匹配的所有过滤器的关联值
+
+        Returns:
+            关联值列表，按插入顺序排列
+        """
+        levels = topic.split('/')
+        # 以 $ 开头的系统主题不匹配首层通配符（MQTT规范）
+        wildcard_first_level = not topic.startswith('$')
+        matched: List[Tuple[int, Any]] = []
+
+        stack = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            allow_wildcard = depth > 0 or wildcard_first_level
+
+            # # 匹配当前层级及其所有子层级（包括父层级本身，如 a/# 匹配 a）
+            if allow_wildcard:
+                multi = node.children.get('#')
+                if multi is not None:
+                    matched.extend(multi.values)
+
+            if depth == len(levels):
+                matched.extend(node.values)
+                continue
+
+            exact = node.children.get(levels[depth])
+            if exact is not None:
+                stack.append((exact, depth + 1))
+            if allow_wildcard:
+                single = node.children.get('+')
+                if single is not None:
+                    stack.append((single, depth + 1))
+
+        if len(matched) > 1:
+            matched.sort(key=lambda item: item[0])
+        return [value for _, value in matched]
+
+    def match_first(self, topic: str) -> Any:
+        """返回第一个（最早插入的）匹配值，没有匹配时返回 None"""
+        matched = self.match(topic)
+        return matched[0] if matched else None
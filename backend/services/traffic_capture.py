@@ -0,0 +1,127 @@
+"""MQTT流量录制 - 将收到的原始消息追加写入紧凑的二进制录制文件，供离线回放"""
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+from core.logging_config import get_logger
+from services.ingest_pipeline import IngestMessage
+
+logger = get_logger(__name__)
+
+# 文件头（8字节），用于识别录制文件格式和版本
+CAPTURE_MAGIC = b"MQCAP\x00\x01\n"
+CAPTURE_SUFFIX = ".mqcap"
+# 记录头：接收时间（float64，Unix时间戳）、主题长度（uint16）、payload长度（uint32），小端
+RECORD_HEADER = struct.Struct("<dHI")
+
+
+class TrafficRecorder:
+    """
+    MQTT流量录制器
+
+    每条消息记录为 记录头 + 主题(UTF-8) + payload原始字节，追加写入录制文件。
+    文件超过 max_bytes 后新建文件（文件名带创建时间），只保留最近 backup_count 个文件。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, backup_count: int = 10):
+        self.directory = Path(directory)
+        self.max_bytes = max(max_bytes, 1024)
+        self.backup_count = max(backup_count, 1)
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+        self.records = 0
+
+    def record(self, received_at: float, topic: str, payload: bytes):
+        """录制一条消息（在 paho 网络线程中调用）"""
+        topic_bytes = topic.encode("utf-8")
+        data = RECORD_HEADER.pack(received_at, len(topic_bytes), len(payload)) + topic_bytes + payload
+        with self._lock:
+            try:
+                if self._file is None or self._size + len(data) > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._size += len(data)
+                self.records += 1
+            except OSError as e:
+                logger.error(f"写入MQTT录制文件失败: {e}")
+
+    def close(self):
+        """关闭当前录制文件"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+                logger.info(f"MQTT流量录制已停止，共录制 {self.records} 条消息")
+
+    def _rotate(self):
+        """新建录制文件并清理过旧的文件（调用方持有锁）"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # 文件名按时间和序号排序即为录制顺序
+        name = time.strftime("capture-%Y%m%d-%H%M%S", time.localtime())
+        index = 0
+        path = self.directory / f"{name}-{index:03d}{CAPTURE_SUFFIX}"
+        while path.exists():
+            index += 1
+            path = self.directory / f"{name}-{index:03d}{CAPTURE_SUFFIX}"
+        self._file = open(path, "ab")
+        self._file.write(CAPTURE_MAGIC)
+        self._size = len(CAPTURE_MAGIC)
+        logger.info(f"MQTT流量录制文件: {path}")
+
+        for old in capture_files(self.directory)[:-self.backup_count]:
+            try:
+                os.remove(old)
+            except OSError as e:
+                logger.warning(f"删除旧的MQTT录制文件失败: {old}: {e}")
+
+
+def capture_files(path: Union[str, Path]) -> List[Path]:
+    """列出录制文件：path 为目录时按文件名（即时间）排序返回其中的全部录制文件"""
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.suffix == CAPTURE_SUFFIX)
+    return [path]
+
+
+def is_capture_file(path: Union[str, Path]) -> bool:
+    """是否为录制文件（按文件头判断）"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+    except OSError:
+        return False
+
+
+def read_capture(path: Union[str, Path]) -> Iterator[IngestMessage]:
+    """
+    按录制顺序读取消息
+
+    Args:
+        path: 录制文件，或包含录制文件的目录
+
+    Raises:
+        ValueError: 文件不是录制文件
+    """
+    for file_path in capture_files(path):
+        with open(file_path, "rb") as f:
+            if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                raise ValueError(f"不是MQTT录制文件: {file_path}")
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                received_at, topic_len, payload_len = RECORD_HEADER.unpack(header)
+                topic = f.read(topic_len)
+                payload = f.read(payload_len)
+                if len(topic) < topic_len or len(payload) < payload_len:
+                    # 进程异常退出时最后一条记录可能不完整
+                    logger.warning(f"录制文件末尾记录不完整，已忽略: {file_path}")
+                    break
+                yield IngestMessage(topic.decode("utf-8"), payload, received_at)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试多进程缓存同步
+
+其他进程（API worker）删除传感器配置后只清除了自己的缓存，并递增数据库中的缓存代数；
+本进程的数据接收检查到缓存代数变化后清除主题路由和传感器配置ID缓存，不再向已删除的配置写入读数。
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from core.config import settings
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from services import alert_rules, cache_sync, sensor_config_service, sensor_partitions, storage_policy, topic_config_service
+from services.mqtt_service import MQTTService
+
+TOPIC = "sync/dev1/data"
+
+
+def test_generation_change_clears_ingest_caches():
+    tmp_dir = tempfile.mkdtemp()
+    engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'sync.db')}")
+    Base.metadata.create_all(bind=engine)
+    bind_engine(engine)
+    topic_config_service.invalidate_routing_table()
+    sensor_config_service.invalidate_sensor_config_cache()
+    interval = settings.ingest_cache_sync_interval_ms
+    settings.ingest_cache_sync_interval_ms = 0
+
+    service = MQTTService()
+    try:
+        service.process_sensor_data('{"temperature": 21.5}', TOPIC)
+        service.write_buffer.flush()
+        assert TOPIC in service._route_cache
+
+        db = SessionLocal()
+        try:
+            old_config_id = db.execute(text("SELECT id FROM sensor_configs")).scalar()
+            # 模拟其他进程删除配置：直接修改数据库并递增缓存代数，不清除本进程的缓存
+            db.execute(text("DELETE FROM sensor_configs WHERE id = :id"), {"id": old_config_id})
+            db.commit()
+            assert cache_sync.get_generation(db) == 0
+        finally:
+            db.close()
+        cache_sync.notify_changed()
+
+        service.process_sensor_data('{"temperature": 22.5}', TOPIC)
+        service.write_buffer.flush()
+
+        db = SessionLocal()
+        try:
+            assert cache_sync.get_generation(db) == 1
+            new_config_id = db.execute(text("SELECT id FROM sensor_configs")).scalar()
+            assert new_config_id is not None, "应重新创建传感器配置"
+            rows = sensor_partitions.fetch_rows(db, [new_config_id])
+            assert 22.5 in [row.value for row in rows]
+        finally:
+            db.close()
+    finally:
+        settings.ingest_cache_sync_interval_ms = interval
+        service.write_buffer.stop()
+        bind_engine()
+        topic_config_service.invalidate_routing_table()
+        sensor_config_service.invalidate_sensor_config_cache()
+        sensor_partitions.clear_partition_cache()
+        storage_policy.forget()
+        alert_rules.reset_state()
+        engine.dispose()
+    print("✅ 缓存代数变化后清除数据接收缓存测试通过")
+
+
+if __name__ == "__main__":
+    test_generation_change_clears_ingest_caches()
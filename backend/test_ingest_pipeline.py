@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试数据接收流水线的三种队列溢出策略：block、drop_oldest、spill（含重启后回放遗留的溢出消息），
+消息分片在各进程中一致，以及多线程提交时的统计
+"""
+import sys
+import os
+import subprocess
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.ingest_pipeline import (
+    IngestPipeline, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL
+)
+
+
+def wait_processed(pipeline, count, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and pipeline.processed < count:
+        time.sleep(0.02)
+
+
+def test_block_policy():
+    handled = []
+    pipeline = IngestPipeline(lambda m: handled.append(m.payload), workers=1, queue_size=2,
+                              overflow_policy=OVERFLOW_BLOCK, spill_dir=tempfile.mkdtemp())
+    pipeline.start()
+    try:
+        for i in range(20):
+            assert pipeline.submit("dev/1/data", str(i).encode())
+        wait_processed(pipeline, 20)
+    finally:
+        pipeline.stop()
+    # 同一设备的消息按顺序处理，不丢弃
+    assert handled == [str(i).encode() for i in range(20)]
+    assert pipeline.dropped == 0
+    print("✅ block 策略测试通过")
+
+
+def test_block_policy_counts_drop_on_stop():
+    pipeline = IngestPipeline(lambda m: None, workers=1, queue_size=1,
+                              overflow_policy=OVERFLOW_BLOCK, spill_dir=tempfile.mkdtemp())
+    # 不启动工作线程，第一条消息占满队列，第二条阻塞到流水线停止
+    assert pipeline.submit("dev/1/data", b"1")
+    result = []
+    submitter = threading.Thread(target=lambda: result.append(pipeline.submit("dev/1/data", b"2")))
+    submitter.start()
+    time.sleep(0.2)
+    pipeline.stop()
+    submitter.join(timeout=5)
+    assert result == [False]
+    assert pipeline.dropped == 1
+    print("✅ block 策略停止时丢弃计数测试通过")
+
+
+def test_drop_oldest_policy():
+    handled = []
+    pipeline = IngestPipeline(lambda m: handled.append(m.payload), workers=1, queue_size=2,
+                              overflow_policy=OVERFLOW_DROP_OLDEST, spill_dir=tempfile.mkdtemp())
+    for i in range(5):
+        assert pipeline.submit("dev/1/data", str(i).encode())
+    assert pipeline.dropped == 3
+    pipeline.start()
+    try:
+        wait_processed(pipeline, 2)
+    finally:
+        pipeline.stop()
+    # 保留最新的消息
+    assert handled == [b"3", b"4"]
+    print("✅ drop_oldest 策略测试通过")
+
+
+def test_spill_policy_recovers_after_restart():
+    spill_dir = tempfile.mkdtemp()
+    first = IngestPipeline(lambda m: None, workers=1, queue_size=2,
+                           overflow_policy=OVERFLOW_SPILL, spill_dir=spill_dir)
+    for i in range(5):
+        assert first.submit("dev/1/data", str(i).encode())
+    assert first.spilled == 3
+    assert first.depth == 5
+    assert os.path.exists(os.path.join(spill_dir, "spill-0.jsonl"))
+
+    # 模拟进程退出：内存队列丢失，溢出文件保留，新进程启动时按顺序回放
+    handled = []
+    second = IngestPipeline(lambda m: handled.append(m.payload), workers=1, queue_size=2,
+                            overflow_policy=OVERFLOW_SPILL, spill_dir=spill_dir)
+    second.start()
+    try:
+        wait_processed(second, 3)
+    finally:
+        second.stop()
+    assert handled == [b"2", b"3", b"4"]
+    assert second.dropped == 0
+    assert not os.path.exists(os.path.join(spill_dir, "spill-0.jsonl"))
+    print("✅ spill 策略重启回放测试通过")
+
+
+def test_shard_index_stable_across_processes():
+    # hash() 在每个进程中随机，分片必须使用与进程无关的哈希
+    code = (
+        "from services.ingest_pipeline import IngestPipeline\n"
+        "p = IngestPipeline(lambda m: None, workers=4)\n"
+        "print([p._shard_index(f'dev/{i}/data') for i in range(20)])"
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    results = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        results.add(output.splitlines()[-1])
+    assert len(results) == 1
+    print("✅ 消息分片跨进程一致测试通过")
+
+
+def test_spill_recovers_when_worker_count_changes():
+    spill_dir = tempfile.mkdtemp()
+    first = IngestPipeline(lambda m: None, workers=3, queue_size=3,
+                           overflow_policy=OVERFLOW_SPILL, spill_dir=spill_dir)
+    for i in range(30):
+        assert first.submit(f"dev/{i % 6}/data", str(i).encode(), received_at=1000.0 + i)
+    assert os.path.exists(os.path.join(spill_dir, "spill-2.jsonl"))
+    spilled = first.spilled
+
+    # 新进程只有 2 个工作线程：spill-2.jsonl 中的消息也要回放，且同一设备按顺序处理
+    handled = []
+    lock = threading.Lock()
+
+    def handle(message):
+        with lock:
+            handled.append((message.topic, int(message.payload)))
+
+    second = IngestPipeline(handle, workers=2, queue_size=3,
+                            overflow_policy=OVERFLOW_SPILL, spill_dir=spill_dir)
+    second.start()
+    try:
+        wait_processed(second, spilled)
+    finally:
+        second.stop()
+    assert second.processed == spilled
+    for device in range(6):
+        values = [value for topic, value in handled if topic == f"dev/{device}/data"]
+        assert values == sorted(values)
+    assert not [name for name in os.listdir(spill_dir) if name.startswith("spill-")]
+    print("✅ 工作线程数变化后回放全部溢出消息测试通过")
+
+
+def test_counters_under_concurrent_submit():
+    pipeline = IngestPipeline(lambda m: None, workers=4, queue_size=8, overflow_policy=OVERFLOW_DROP_OLDEST)
+    pipeline.start()
+
+    def submit_many(n):
+        for i in range(2000):
+            pipeline.submit(f"dev/{n}/data", b"x")
+
+    threads = [threading.Thread(target=submit_many, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pipeline.stop()
+    assert pipeline.submitted == 16000
+    assert pipeline.processed + pipeline.dropped == 16000
+    print("✅ 多线程提交统计测试通过")
+
+
+if __name__ == "__main__":
+    test_block_policy()
+    test_block_policy_counts_drop_on_stop()
+    test_drop_oldest_policy()
+    test_spill_policy_recovers_after_restart()
+    test_shard_index_stable_across_processes()
+    test_spill_recovers_when_worker_count_changes()
+    test_counters_under_concurrent_submit()
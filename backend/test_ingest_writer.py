@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试数据接收的写入都经过专用写连接
+
+多个接收工作线程自动创建设备、传感器配置，并与写缓冲的批量写入共用一个写连接（连接池大小 1）：
+写入在进程内排队，不会因为争抢 SQLite 写锁出现 database is locked，每条消息处理完连接都会归还。
+API 的连接短暂持有写锁时，接收线程等待而不是失败。
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from core.database import Base, SessionLocal, WriterSessionLocal, bind_engine, create_database_engine
+from models import DeviceModel
+from services import alert_rules, metrics, sensor_config_service, sensor_partitions, storage_policy, topic_config_service
+from services.mqtt_service import MQTTService
+
+DEVICES = 8
+MESSAGES = 200
+
+
+def test_ingest_writes_use_writer_connection():
+    tmp_dir = tempfile.mkdtemp()
+    database_url = f"sqlite:///{os.path.join(tmp_dir, 'writer.db')}"
+    api_engine = create_database_engine(database_url)
+    writer_engine = create_database_engine(database_url, pool_size=1, max_overflow=0, pool_timeout=10)
+    Base.metadata.create_all(bind=api_engine)
+    bind_engine(api_engine)
+    WriterSessionLocal.configure(bind=writer_engine)
+    topic_config_service.invalidate_routing_table()
+    sensor_config_service.invalidate_sensor_config_cache()
+
+    errors_before = metrics.INGEST_ERRORS.value()
+    service = MQTTService()
+    service.pipeline.start()
+    service.write_buffer.start()
+    try:
+        # API 连接持有写锁期间提交消息，接收线程按 busy_timeout 等待
+        locked = threading.Event()
+
+        def hold_write_lock():
+            with api_engine.connect() as conn:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                locked.set()
+                time.sleep(0.3)
+                conn.exec_driver_sql("ROLLBACK")
+
+        holder = threading.Thread(target=hold_write_lock)
+        holder.start()
+        locked.wait(5)
+        for i in range(MESSAGES):
+            service.pipeline.submit(f"writer/dev{i % DEVICES}/data", f'{{"temperature": {20 + i % 50}}}'.encode())
+        service.pipeline.submit("malformed", b'{"temperature": 1}')  # 主题格式不正确，不写入
+        holder.join()
+
+        deadline = time.time() + 20
+        while time.time() < deadline and service.pipeline.processed < service.pipeline.submitted:
+            time.sleep(0.05)
+        assert service.pipeline.processed == service.pipeline.submitted
+        service.write_buffer.flush()
+
+        assert metrics.INGEST_ERRORS.value() == errors_before
+        assert all(session.get_bind() is writer_engine for session in service._ingest_sessions)
+        assert writer_engine.pool.checkedout() == 0, "消息处理完后写连接应归还连接池"
+
+        db = SessionLocal()
+        try:
+            assert sensor_partitions.count_rows(db) == MESSAGES
+            assert db.query(DeviceModel).count() == DEVICES
+            assert db.execute(text("SELECT COUNT(*) FROM sensor_configs")).scalar() == DEVICES
+        finally:
+            db.close()
+    finally:
+        service.stop()
+        bind_engine()
+        topic_config_service.invalidate_routing_table()
+        sensor_config_service.invalidate_sensor_config_cache()
+        sensor_partitions.clear_partition_cache()
+        storage_policy.forget()
+        alert_rules.reset_state()
+        writer_engine.dispose()
+        api_engine.dispose()
+    print("✅ 数据接收写入使用专用写连接测试通过")
+
+
+if __name__ == "__main__":
+    test_ingest_writes_use_writer_connection()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试同一主机上的多个接收进程使用不同的MQTT客户端ID
+
+多个进程使用相同的配置（未设置 MQTT_CLIENT_ID）时默认客户端ID相同，服务器会互相踢下线，
+持久会话记录文件也会互相覆盖。每个连接通过会话目录下的锁文件占用客户端ID，
+已被占用时依次加 -2、-3 … 后缀。（文件锁按打开的文件区分，同一进程内的两个连接可以模拟两个进程）
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import settings
+from services.mqtt_broker import BrokerConnection
+from services.mqtt_service import MQTTService
+
+
+def _connection(client_id, session_dir):
+    return BrokerConnection(
+        mqtt_config_id=1,
+        name="test",
+        server="127.0.0.1",
+        port=1883,
+        topics=["sensors/+/data"],
+        shared_group="ingest",
+        client_id=client_id,
+        clean_session=False,
+        qos=1,
+        session_dir=session_dir
+    )
+
+
+def test_two_instances_on_one_host():
+    """两个实例的默认客户端ID相同，连接后客户端ID和会话记录文件各不相同"""
+    original_client_id = settings.mqtt_client_id
+    settings.mqtt_client_id = ""
+    try:
+        base_id = MQTTService()._client_id(1)
+        assert base_id == MQTTService()._client_id(1)
+    finally:
+        settings.mqtt_client_id = original_client_id
+
+    with tempfile.TemporaryDirectory() as session_dir:
+        first = _connection(base_id, session_dir)
+        second = _connection(base_id, session_dir)
+        try:
+            assert first.client_id == base_id
+            assert second.client_id == f"{base_id}-2"
+            assert first._session_file != second._session_file
+        finally:
+            first.stop()
+            second.stop()
+    print("✅ 同一主机两个实例的客户端ID测试通过")
+
+
+def test_client_id_reclaimed_after_stop():
+    """实例停止后释放客户端ID，新实例（如重启的进程）重新使用原来的ID，持久会话可以恢复"""
+    with tempfile.TemporaryDirectory() as session_dir:
+        first = _connection("mqtt-iot-test-1", session_dir)
+        second = _connection("mqtt-iot-test-1", session_dir)
+        first.stop()
+
+        restarted = _connection("mqtt-iot-test-1", session_dir)
+        try:
+            assert restarted.client_id == "mqtt-iot-test-1"
+            assert restarted._session_file == first._session_file
+            assert second.client_id == "mqtt-iot-test-1-2"
+        finally:
+            restarted.stop()
+            second.stop()
+    print("✅ 客户端ID释放后重新占用测试通过")
+
+
+if __name__ == "__main__":
+    test_two_instances_on_one_host()
+    test_client_id_reclaimed_after_stop()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试消息编解码器：struct 定长结构体的解码、缩放和时间戳，以及创建时拒绝无效的格式
+"""
+import sys
+import os
+import json
+import struct
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.payload_codecs import create_codec
+
+STRUCT_OPTIONS = {
+    "format": "<IhhB",
+    "fields": [
+        {"timestamp": True},
+        {"type": "Temperature1", "scale": 0.1, "unit": "°C", "display_name": "温度1"},
+        {"type": "Humidity1", "scale": 0.1, "unit": "%"},
+        "Relay Status"
+    ]
+}
+
+
+def struct_codec(options):
+    return create_codec("struct", json.dumps(options))
+
+
+def assert_rejected(options, message):
+    try:
+        struct_codec(options)
+    except ValueError as e:
+        assert message in str(e), e
+    else:
+        raise AssertionError(f"应拒绝 codec_options: {options}")
+
+
+def test_struct_decode():
+    codec = struct_codec(STRUCT_OPTIONS)
+    payload = struct.pack("<IhhB", 1773576000, 255, 603, 1) + struct.pack("<IhhB", 1773576060, -15, 600, 0)
+    readings = codec.decode(payload)
+    first = datetime(2026, 3, 15, 12, 0, 0)
+    assert [(t, r[0], round(r[1], 6), r[2]) for t, r in readings] == [
+        (first, "Temperature1", 25.5, "°C"),
+        (first, "Humidity1", 60.3, "%"),
+        (first, "Relay Status", 1, ""),
+        (datetime(2026, 3, 15, 12, 1, 0), "Temperature1", -1.5, "°C"),
+        (datetime(2026, 3, 15, 12, 1, 0), "Humidity1", 60.0, "%"),
+        (datetime(2026, 3, 15, 12, 1, 0), "Relay Status", 0, ""),
+    ]
+    try:
+        codec.decode(payload[:-1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("消息长度不是结构体长度的整数倍时应报错")
+    print("✅ struct 解码测试通过")
+
+
+def test_struct_skips_padding_and_non_finite():
+    codec = struct_codec({"format": "<2xfB", "fields": ["Voltage", None]})
+    readings = codec.decode(struct.pack("<2xfB", 3.5, 7) + struct.pack("<2xfB", float("nan"), 7))
+    assert readings == [(None, ("Voltage", 3.5, "", None))]
+    print("✅ struct 填充字节和 NaN 测试通过")
+
+
+def test_struct_rejects_non_numeric_formats():
+    for fmt in ("<4sh", "<?h", "<ch", "<5ph"):
+        assert_rejected({"format": fmt, "fields": ["a", "b"]}, "只能包含数值字段")
+    assert_rejected({"format": "<hh", "fields": ["a"]}, "fields 数量")
+    assert_rejected({"format": "<hz", "fields": ["a", "b"]}, "format")
+    assert_rejected({"fields": ["a"]}, "需要 format")
+    print("✅ struct 无效格式测试通过")
+
+
+def test_create_codec_errors():
+    for name, options in (("unknown", None), ("struct", "not json"), ("struct", "[1, 2]")):
+        try:
+            create_codec(name, options)
+        except ValueError:
+            continue
+        raise AssertionError(f"应拒绝编解码器 {name} / {options}")
+    assert create_codec("json").decode(b'{"t": 1}') == {"t": 1}
+    print("✅ 编解码器创建测试通过")
+
+
+if __name__ == "__main__":
+    test_struct_decode()
+    test_struct_skips_padding_and_non_finite()
+    test_struct_rejects_non_numeric_formats()
+    test_create_codec_errors()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试设备时间戳解析和批量消息拆分，包括超出接收时间前后允许范围的时间回退为接收时间
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.payload_parser import check_timestamp, parse_timestamp, split_batch
+
+RECEIVED = datetime(2026, 3, 15, 12, 0, 0)
+
+
+def test_parse_timestamp():
+    assert parse_timestamp(1773576000) == RECEIVED  # 秒
+    assert parse_timestamp(1773576000000) == RECEIVED  # 毫秒
+    assert parse_timestamp("2026-03-15T12:00:00Z") == RECEIVED
+    assert parse_timestamp("2026-03-15T20:00:00+08:00") == RECEIVED
+    assert parse_timestamp("not a time") is None
+    assert parse_timestamp(True) is None
+    assert parse_timestamp(None) is None
+    print("✅ 时间戳解析测试通过")
+
+
+def test_check_timestamp_window():
+    assert check_timestamp(RECEIVED - timedelta(days=2), RECEIVED) == RECEIVED - timedelta(days=2)
+    assert check_timestamp(RECEIVED + timedelta(seconds=30), RECEIVED) == RECEIVED + timedelta(seconds=30)
+    assert check_timestamp(None, RECEIVED) == RECEIVED
+    # 时钟未校准（1970 年附近）、运行时长或未来时间都使用接收时间
+    assert check_timestamp(parse_timestamp(12345), RECEIVED) == RECEIVED
+    assert check_timestamp(RECEIVED - timedelta(days=400), RECEIVED) == RECEIVED
+    assert check_timestamp(RECEIVED + timedelta(days=1), RECEIVED) == RECEIVED
+    print("✅ 时间范围检查测试通过")
+
+
+def test_split_batch_offsets():
+    batch = split_batch({
+        "base_ts": "2026-03-15T11:00:00Z",
+        "readings": [{"offset": 0, "t": 1}, {"offset": 60, "t": 2}, {"t": 3}]
+    }, RECEIVED)
+    base = RECEIVED - timedelta(hours=1)
+    assert batch == [
+        (base, {"t": 1}),
+        (base + timedelta(seconds=60), {"t": 2}),
+        (base, {"t": 3}),
+    ]
+    assert split_batch({"t": 1}, RECEIVED) is None
+    print("✅ 批量消息拆分测试通过")
+
+
+def test_split_batch_rejects_implausible_timestamps():
+    batch = split_batch([
+        {"ts": 1773575940, "t": 1},  # 一分钟前，保留
+        {"ts": 3600, "t": 2},  # 运行时长（1970 年）
+        {"ts": "2099-01-01T00:00:00Z", "t": 3},  # 未来时间
+    ], RECEIVED)
+    assert batch == [
+        (RECEIVED - timedelta(minutes=1), {"t": 1}),
+        (RECEIVED, {"t": 2}),
+        (RECEIVED, {"t": 3}),
+    ]
+
+    # 基准时间超出范围时，偏移基于接收时间
+    batch = split_batch({"base_ts": 0, "readings": [{"offset": -30, "t": 1}]}, RECEIVED)
+    assert batch == [(RECEIVED - timedelta(seconds=30), {"t": 1})]
+    print("✅ 超出范围的设备时间测试通过")
+
+
+if __name__ == "__main__":
+    test_parse_timestamp()
+    test_check_timestamp_window()
+    test_split_batch_offsets()
+    test_split_batch_rejects_implausible_timestamps()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试发布命令跟踪：PUBACK 先于消息ID登记到达、超时判定、命令表容量
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.publish_tracker import (
+    PublishTracker,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_PUBLISHED,
+    STATUS_TIMEOUT,
+)
+
+
+def test_ack_after_sent():
+    """正常顺序：登记消息ID后收到 on_publish"""
+    tracker = PublishTracker(timeout=10)
+    command = tracker.create("devices/1/cmd", "relayon", 1)
+    tracker.sent(command, broker_id=1, mid=7)
+    assert command.status == STATUS_PENDING
+
+    tracker.published(broker_id=2, mid=7)  # 其他MQTT服务器的同一消息ID
+    assert command.status == STATUS_PENDING
+    tracker.published(broker_id=1, mid=7)
+    assert command.status == STATUS_PUBLISHED
+    assert command.completed_at is not None
+    print("✅ 登记后确认测试通过")
+
+
+def test_early_ack_stash():
+    """on_publish 在网络线程中先于 sent 到达：先记入 _early_acks，登记时完成命令"""
+    tracker = PublishTracker(timeout=10)
+    command = tracker.create("devices/1/cmd", "relayon", 1)
+    tracker.published(broker_id=1, mid=3)
+    assert (1, 3) in tracker._early_acks
+    assert command.status == STATUS_PENDING
+
+    tracker.sent(command, broker_id=1, mid=3)
+    assert command.status == STATUS_PUBLISHED
+    assert (1, 3) not in tracker._early_acks
+    assert (1, 3) not in tracker._by_mid
+
+    # 已消费的提前确认不会完成之后复用同一消息ID的命令
+    later = tracker.create("devices/1/cmd", "relayoff", 1)
+    tracker.sent(later, broker_id=1, mid=3)
+    assert later.status == STATUS_PENDING
+    print("✅ 提前到达的确认测试通过")
+
+
+def test_early_ack_cleanup():
+    """没有对应命令的提前确认超过容量时清理超时的记录"""
+    tracker = PublishTracker(timeout=10, max_commands=2)
+    tracker.published(1, 1)
+    tracker.published(1, 2)
+    stale = time.monotonic() - 60
+    tracker._early_acks = {key: stale for key in tracker._early_acks}
+    tracker.published(1, 3)
+    assert list(tracker._early_acks) == [(1, 3)]
+    print("✅ 提前确认清理测试通过")
+
+
+def test_get_marks_timeout():
+    """超过 timeout 秒未完成的命令在查询时标记为超时，之后的确认不再改变状态"""
+    tracker = PublishTracker(timeout=5)
+    command = tracker.create("devices/1/cmd", "relayon", 1)
+    tracker.sent(command, broker_id=1, mid=9)
+
+    assert tracker.get(command.command_id).status == STATUS_PENDING
+    command._created -= 6
+    assert tracker.get(command.command_id).status == STATUS_TIMEOUT
+    assert "5" in command.error
+    assert (1, 9) not in tracker._by_mid
+
+    tracker.published(broker_id=1, mid=9)
+    assert command.status == STATUS_TIMEOUT
+    assert tracker.get("unknown") is None
+    print("✅ 查询超时测试通过")
+
+
+def test_completed_command_not_timed_out():
+    """已完成的命令（成功或失败）不会在查询时被改为超时"""
+    tracker = PublishTracker(timeout=5)
+    failed = tracker.create("devices/1/cmd", "relayon", 1)
+    tracker.fail(failed, "未连接")
+    failed._created -= 60
+    assert tracker.get(failed.command_id).status == STATUS_FAILED
+    print("✅ 已完成命令不超时测试通过")
+
+
+def test_max_commands_evicts_oldest():
+    """只保留最近 max_commands 条命令，淘汰命令的消息ID映射一并删除"""
+    tracker = PublishTracker(timeout=10, max_commands=2)
+    first = tracker.create("t", "1", 1)
+    tracker.sent(first, 1, 1)
+    tracker.create("t", "2", 1)
+    tracker.create("t", "3", 1)
+    assert tracker.get(first.command_id) is None
+    assert (1, 1) not in tracker._by_mid
+    print("✅ 命令表容量测试通过")
+
+
+def test_wait_for_completion():
+    """wait_for 在命令完成时返回 True，到达截止时间返回 False"""
+    tracker = PublishTracker(timeout=10)
+    command = tracker.create("t", "1", 1)
+    assert not tracker.wait_for(lambda: command.done, time.monotonic() + 0.05)
+    tracker.sent(command, 1, 1)
+    tracker.published(1, 1)
+    assert tracker.wait_for(lambda: command.done, time.monotonic() + 0.05)
+    print("✅ 等待完成测试通过")
+
+
+if __name__ == "__main__":
+    test_ack_after_sent()
+    test_early_ack_stash()
+    test_early_ack_cleanup()
+    test_get_marks_timeout()
+    test_completed_command_not_timed_out()
+    test_max_commands_evicts_oldest()
+    test_wait_for_completion()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试继电器命令确认：确认、未生效、超时、被新命令取代，以及命令回显不能确认命令
+
+状态转换测试只使用内存中的命令表；回显测试使用临时SQLite数据库，无需真实的MQTT服务器。
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models import DeviceModel
+from services import alert_rules, sensor_config_service, sensor_partitions, storage_policy, topic_config_service
+from services.mqtt_service import MQTTService
+from services.relay_commands import (
+    RelayCommandTable,
+    STATUS_CONFIRMED,
+    STATUS_CONTRADICTED,
+    STATUS_PENDING,
+    STATUS_SUPERSEDED,
+    STATUS_TIMEOUT,
+)
+
+SENT_AT = datetime(2026, 3, 15, 12, 0, 0)
+
+
+def test_confirmed():
+    """命令发出后上报的状态与命令一致时确认，命令发出前的读数不参与判断"""
+    table = RelayCommandTable(timeout=3600, grace=2)
+    command = table.register("c1", device_id=1, expected_value=1, created_at=SENT_AT)
+
+    table.observe(1, "relay_status", 1, SENT_AT - timedelta(seconds=5))
+    assert command.status == STATUS_PENDING
+    table.observe(2, "relay_status", 1, SENT_AT + timedelta(seconds=1))  # 其他设备
+    table.observe(1, "temperature", 1, SENT_AT + timedelta(seconds=1))  # 非继电器状态读数
+    assert command.status == STATUS_PENDING
+
+    table.observe(1, "Relay Status", 1.0, SENT_AT + timedelta(seconds=1))
+    assert command.status == STATUS_CONFIRMED
+    assert command.observed_value == 1.0
+    assert table._pending == {}
+    print("✅ 命令确认测试通过")
+
+
+def test_contradicted_after_grace():
+    """grace 秒内上报的不一致状态视为设备尚未处理命令，之后仍不一致判定为未生效"""
+    table = RelayCommandTable(timeout=3600, grace=2)
+    command = table.register("c1", device_id=1, expected_value=0, created_at=SENT_AT)
+
+    table.observe(1, "relay_status", 1, SENT_AT + timedelta(seconds=1))
+    assert command.status == STATUS_PENDING
+    table.observe(1, "relay_status", 1, SENT_AT + timedelta(seconds=3))
+    assert command.status == STATUS_CONTRADICTED
+    assert command.observed_value == 1
+
+    # 已判定的命令不再被之后的读数改变
+    table.observe(1, "relay_status", 0, SENT_AT + timedelta(seconds=4))
+    assert command.status == STATUS_CONTRADICTED
+    print("✅ 命令未生效测试通过")
+
+
+def test_sensor_type_specific_command():
+    """指定了传感器类型的命令只由该类型的读数确认"""
+    table = RelayCommandTable(timeout=3600, grace=2)
+    command = table.register("c1", device_id=1, expected_value=1, sensor_type="relay2", created_at=SENT_AT)
+    table.observe(1, "relay_status", 1, SENT_AT + timedelta(seconds=1))
+    assert command.status == STATUS_PENDING
+    table.observe(1, "relay2", 1, SENT_AT + timedelta(seconds=1))
+    assert command.status == STATUS_CONFIRMED
+    print("✅ 指定传感器类型的命令测试通过")
+
+
+def test_timeout():
+    """timeout 秒内没有上报的命令在查询时判定为超时"""
+    table = RelayCommandTable(timeout=15, grace=2)
+    stale = table.register("c1", device_id=1, expected_value=1, created_at=datetime.utcnow() - timedelta(seconds=20))
+    fresh = table.register("c2", device_id=2, expected_value=1)
+
+    assert table.get("c1").status == STATUS_TIMEOUT
+    assert stale.observed_value is None
+    assert table.get("c2").status == STATUS_PENDING
+    assert [c.command_id for c in table.query(device_ids=[1])] == ["c1"]
+
+    # 超时后的上报不再改变结果
+    table.observe(1, "relay_status", 1, datetime.utcnow())
+    assert stale.status == STATUS_TIMEOUT
+    assert fresh.status == STATUS_PENDING
+    print("✅ 命令超时测试通过")
+
+
+def test_superseded():
+    """确认前同一继电器又发出新命令时，旧命令被取代，上报的状态只确认新命令"""
+    table = RelayCommandTable(timeout=3600, grace=2)
+    first = table.register("c1", device_id=1, expected_value=1, created_at=SENT_AT)
+    second = table.register("c2", device_id=1, expected_value=0, created_at=SENT_AT + timedelta(seconds=1))
+    assert first.status == STATUS_SUPERSEDED
+
+    table.observe(1, "relay_status", 0, SENT_AT + timedelta(seconds=2))
+    assert first.status == STATUS_SUPERSEDED
+    assert second.status == STATUS_CONFIRMED
+    assert [c.command_id for c in table.query()] == ["c2", "c1"]
+    print("✅ 命令被取代测试通过")
+
+
+def test_max_commands_times_out_evicted():
+    """超过 max_commands 条时淘汰最早的命令，仍待确认的标记为超时并移出待确认表"""
+    table = RelayCommandTable(timeout=3600, grace=2, max_commands=1)
+    first = table.register("c1", device_id=1, expected_value=1, created_at=SENT_AT)
+    table.register("c2", device_id=2, expected_value=1, created_at=SENT_AT)
+    assert first.status == STATUS_TIMEOUT
+    assert table.get("c1") is None
+    assert 1 not in table._pending
+    print("✅ 命令表容量测试通过")
+
+
+def test_echoed_command_stays_pending():
+    """命令主题上收到的 relayon/relayoff（服务器回显的本系统命令）只记录状态，不确认命令"""
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'relay.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    topic_config_service.invalidate_routing_table()
+    sensor_config_service.invalidate_sensor_config_cache()
+    service = MQTTService()
+    try:
+        db = SessionLocal()
+        device = DeviceModel(name="relay_dev1", device_type="relay")
+        db.add(device)
+        db.commit()
+        device_id = device.id
+        db.close()
+
+        now = datetime.utcnow()
+        command = service.relay_commands.register("c1", device_id, 1, created_at=now)
+        service.process_sensor_data(b"relayon", "relay/dev1/cmd", now + timedelta(seconds=1))
+        assert command.status == STATUS_PENDING
+        assert service.write_buffer.pending == 1  # 回显的状态仍然记录
+
+        # 设备自己上报的继电器状态确认命令
+        service.process_sensor_data(b'{"relay_status": 1}', "relay/dev1/status", now + timedelta(seconds=2))
+        assert command.status == STATUS_CONFIRMED
+    finally:
+        for db in service._ingest_sessions:
+            db.close()
+        bind_engine()
+        topic_config_service.invalidate_routing_table()
+        sensor_config_service.invalidate_sensor_config_cache()
+        sensor_partitions.clear_partition_cache()
+        storage_policy.forget()
+        alert_rules.reset_state()
+        test_engine.dispose()
+    print("✅ 命令回显不确认命令测试通过")
+
+
+if __name__ == "__main__":
+    test_confirmed()
+    test_contradicted_after_grace()
+    test_sensor_type_specific_command()
+    test_timeout()
+    test_superseded()
+    test_max_commands_times_out_evicted()
+    test_echoed_command_stays_pending()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试数据保留任务只在一个进程中执行：同一主机的多个进程共用锁文件，只有持有者执行，持有者停止后由其他进程接替
+
+文件锁按打开的文件区分，同一进程内的两个保留任务实例可以模拟两个进程。
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.retention import RetentionScheduler
+
+
+def test_single_leader():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lock_file = os.path.join(tmp_dir, "retention.lock")
+        first = RetentionScheduler(lock_file=lock_file)
+        second = RetentionScheduler(lock_file=lock_file)
+        try:
+            assert first.is_leader()
+            assert not second.is_leader()
+            assert first.status()["leader"] and not second.status()["leader"]
+
+            # 持有者停止（进程退出）后由其他进程接替
+            first.stop()
+            assert second.is_leader()
+            assert not RetentionScheduler(lock_file=lock_file).is_leader()
+        finally:
+            first.stop()
+            second.stop()
+    print("✅ 保留任务单进程执行测试通过")
+
+
+def test_without_lock_file():
+    """未设置锁文件时每个实例都执行（单进程部署）"""
+    assert RetentionScheduler(lock_file=None).is_leader()
+    print("✅ 未设置锁文件测试通过")
+
+
+if __name__ == "__main__":
+    test_single_leader()
+    test_without_lock_file()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试传感器数据写缓冲的失败处理：坏读数只丢弃自身，数据库错误整批重试，停止时重试写入剩余数据
+
+使用临时SQLite数据库，无需已有的数据库文件。
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.exc import OperationalError
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from services import alert_rules, metrics, sensor_partitions, storage_policy
+from services.sensor_data_buffer import SensorDataWriteBuffer
+
+START = datetime(2026, 3, 15, 12, 0, 0)
+
+
+def _open_database():
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'buffer.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    sensor_partitions.clear_partition_cache()
+    return test_engine
+
+
+def _close_database(test_engine):
+    bind_engine()
+    sensor_partitions.clear_partition_cache()
+    storage_policy.forget()
+    alert_rules.reset_state()
+    test_engine.dispose()
+
+
+def _rows(count, config_id=1):
+    return [
+        {"sensor_config_id": config_id, "value": float(i), "timestamp": START + timedelta(seconds=i), "alert_status": "normal"}
+        for i in range(count)
+    ]
+
+
+def _stored_rows():
+    db = SessionLocal()
+    try:
+        return sensor_partitions.count_rows(db)
+    finally:
+        db.close()
+
+
+class FlakySessionFactory:
+    """前 failures 次创建会话时抛出数据库错误（模拟数据库被锁定），之后正常"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("BEGIN", {}, Exception("database is locked"))
+        return SessionLocal()
+
+
+def test_bad_row_dropped_alone():
+    """一条无法写入的读数（value 为空）只丢弃自身，同批的其他读数正常写入，并清除该配置的状态"""
+    test_engine = _open_database()
+    try:
+        bad = {"sensor_config_id": 2, "value": None, "timestamp": START, "alert_status": "alert"}
+        storage_policy._last_stored[2] = (None, START)
+        alert_rules._states[2] = alert_rules._AlertState(2)
+        dropped_before = metrics.ROWS_DROPPED.value()
+
+        buffer = SensorDataWriteBuffer(batch_size=100, session_factory=SessionLocal)
+        rows = _rows(9)
+        buffer.add(rows[:4] + [bad] + rows[4:])
+        assert buffer.flush() == 9
+        assert buffer.pending == 0
+        assert _stored_rows() == 9
+        assert metrics.ROWS_DROPPED.value() == dropped_before + 1
+        assert 2 not in storage_policy._last_stored
+        assert 2 not in alert_rules._states
+    finally:
+        _close_database(test_engine)
+    print("✅ 坏读数单独丢弃测试通过")
+
+
+def test_database_error_retries_whole_batch():
+    """数据库错误时整批放回缓冲，下次刷盘写入，不拆分也不丢弃"""
+    test_engine = _open_database()
+    try:
+        buffer = SensorDataWriteBuffer(batch_size=100, session_factory=FlakySessionFactory(1))
+        buffer.add(_rows(5))
+        assert buffer.flush() == 0
+        assert buffer.pending == 5
+        buffer.add(_rows(1, config_id=3))
+        assert buffer.flush() == 6
+        assert _stored_rows() == 6
+    finally:
+        _close_database(test_engine)
+    print("✅ 数据库错误整批重试测试通过")
+
+
+def test_stop_retries_until_written():
+    """停止时写入失败会重试，直到缓冲为空"""
+    test_engine = _open_database()
+    try:
+        buffer = SensorDataWriteBuffer(batch_size=100, flush_interval_ms=10, session_factory=FlakySessionFactory(2))
+        buffer.add(_rows(5))
+        buffer.stop(timeout=5)
+        assert buffer.pending == 0
+        assert _stored_rows() == 5
+    finally:
+        _close_database(test_engine)
+    print("✅ 停止时重试写入测试通过")
+
+
+def test_stop_counts_unwritten_rows():
+    """停止时始终无法写入的数据计入丢弃数，缓冲清空"""
+    test_engine = _open_database()
+    try:
+        dropped_before = metrics.ROWS_DROPPED.value()
+        buffer = SensorDataWriteBuffer(batch_size=100, flush_interval_ms=10, session_factory=FlakySessionFactory(100))
+        buffer.add(_rows(5))
+        buffer.stop(timeout=0.05)
+        assert buffer.pending == 0
+        assert metrics.ROWS_DROPPED.value() == dropped_before + 5
+        assert _stored_rows() == 0
+    finally:
+        _close_database(test_engine)
+    print("✅ 停止时丢弃计数测试通过")
+
+
+if __name__ == "__main__":
+    test_bad_row_dropped_alone()
+    test_database_error_retries_whole_batch()
+    test_stop_retries_until_written()
+    test_stop_counts_unwritten_rows()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试传感器最新读数表：乱序读数不覆盖当前读数，删除传感器配置或设备时一并删除最新读数
+
+使用临时SQLite数据库，无需已有的数据库文件。
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models import DeviceModel
+from models.sensor_config import SensorConfigModel
+from services import (
+    alert_rules,
+    device_service,
+    sensor_config_service,
+    sensor_latest,
+    sensor_partitions,
+    storage_policy,
+)
+
+START = datetime(2026, 3, 15, 12, 0, 0)
+
+
+def _open_database():
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'latest.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    sensor_partitions.clear_partition_cache()
+    sensor_config_service.invalidate_sensor_config_cache()
+    return test_engine
+
+
+def _close_database(test_engine):
+    bind_engine()
+    sensor_partitions.clear_partition_cache()
+    sensor_config_service.invalidate_sensor_config_cache()
+    storage_policy.forget()
+    alert_rules.reset_state()
+    test_engine.dispose()
+
+
+def _write(db, rows):
+    """与写缓冲相同：写入分区后用全局ID更新最新读数"""
+    ids = sensor_partitions.insert_rows(db, rows)
+    sensor_latest.apply_rows(db, rows, ids)
+    db.commit()
+    return ids
+
+
+def _row(config_id, value, minutes):
+    return {"sensor_config_id": config_id, "value": value, "timestamp": START + timedelta(minutes=minutes), "alert_status": "normal"}
+
+
+def test_out_of_order_rows_do_not_overwrite():
+    """同一批和之后批次中更早的读数（补发、回放）不覆盖当前读数，时间相同的读数以后写入的为准"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        ids = _write(db, [_row(1, 10.0, 5), _row(1, 8.0, 3), _row(2, 1.0, 0)])
+        latest = {row.sensor_config_id: row for row in sensor_latest.fetch_latest(db)}
+        assert (latest[1].value, latest[1].id) == (10.0, ids[0])
+
+        _write(db, [_row(1, 7.0, 4)])  # 补发的旧读数
+        assert sensor_latest.fetch_latest(db, [1])[0].value == 10.0
+
+        ids = _write(db, [_row(1, 11.0, 5)])  # 与当前读数时间相同
+        row = sensor_latest.fetch_latest(db, [1])[0]
+        assert (row.value, row.id) == (11.0, ids[0])
+
+        _write(db, [_row(2, 2.0, 6)])
+        assert [row.sensor_config_id for row in sensor_latest.fetch_latest(db)] == [2, 1]  # 按时间倒序
+        assert [row.sensor_config_id for row in sensor_latest.fetch_latest(db, limit=1)] == [2]
+        assert sensor_latest.fetch_latest(db, []) == []
+        assert sensor_latest.apply_rows(db, [], []) == 0
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 乱序读数测试通过")
+
+
+def test_delete_config_removes_latest():
+    """删除传感器配置后其最新读数一并删除，复用该配置ID的新配置不会显示旧读数；删除设备同理"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        device = DeviceModel(name="latest_dev1", device_type="sensor")
+        other_device = DeviceModel(name="latest_dev2", device_type="sensor")
+        db.add_all([device, other_device])
+        db.commit()
+        kept = SensorConfigModel(device_id=device.id, type="humidity", unit="%")
+        other = SensorConfigModel(device_id=other_device.id, type="temperature", unit="°C")
+        removed = SensorConfigModel(device_id=device.id, type="temperature", unit="°C")
+        db.add_all([kept, other])
+        db.commit()
+        db.add(removed)
+        db.commit()
+        kept_id, other_id, removed_id = kept.id, other.id, removed.id
+        _write(db, [_row(kept_id, 50.0, 0), _row(other_id, 21.0, 0), _row(removed_id, 20.0, 1)])
+
+        assert sensor_config_service.delete_sensor_config(db, removed_id)
+        assert {row.sensor_config_id for row in sensor_latest.fetch_latest(db)} == {kept_id, other_id}
+        assert sensor_latest.fetch_latest(db, [removed_id]) == []
+        assert sensor_partitions.fetch_rows(db, [removed_id]) == []
+
+        # SQLite 会复用被删除的最大ID
+        reused = SensorConfigModel(device_id=device.id, type="pressure", unit="kPa")
+        db.add(reused)
+        db.commit()
+        assert reused.id == removed_id
+        assert sensor_latest.fetch_latest(db, [reused.id]) == []
+
+        assert device_service.delete_device(db, device.id)
+        assert [row.sensor_config_id for row in sensor_latest.fetch_latest(db)] == [other_id]
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 删除配置和设备时删除最新读数测试通过")
+
+
+if __name__ == "__main__":
+    test_out_of_order_rows_do_not_overwrite()
+    test_delete_config_removes_latest()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试传感器数据月分区：全局ID编码、分区创建、跨月（及旧表）查询、批量删除过期读数和整月分区删除，
+以及其他进程创建或删除的分区
+
+使用临时SQLite数据库，无需已有的数据库文件。
+"""
+import sys
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models.sensor_data_new import SensorDataModel
+from services import sensor_partitions
+from services.sensor_partitions import ID_STRIDE
+
+
+def _open_database(legacy_rows=()):
+    """新建临时数据库（legacy_rows 写入未分区的旧表 sensor_data），返回引擎"""
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'partitions.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    sensor_partitions.clear_partition_cache()
+    if legacy_rows:
+        db = SessionLocal()
+        db.add_all(SensorDataModel(**row) for row in legacy_rows)
+        db.commit()
+        db.close()
+    return test_engine
+
+
+def _close_database(test_engine):
+    bind_engine()
+    sensor_partitions.clear_partition_cache()
+    test_engine.dispose()
+
+
+def _row(config_id, value, timestamp):
+    return {"sensor_config_id": config_id, "value": value, "timestamp": timestamp, "alert_status": "normal"}
+
+
+def test_global_id_encoding():
+    """全局ID = 分区键(YYYYMM) * ID_STRIDE + 分区内ID，按全局ID可以查回读数；旧表ID小于 ID_STRIDE"""
+    test_engine = _open_database([_row(1, 5.0, datetime(2025, 12, 31, 8))])
+    db = SessionLocal()
+    try:
+        ids = sensor_partitions.insert_rows(db, [
+            _row(1, 10.0, datetime(2026, 1, 31, 23, 59)),
+            _row(1, 11.0, datetime(2026, 2, 1, 0, 1)),
+            _row(2, 12.0, datetime(2026, 1, 15)),
+        ])
+        db.commit()
+        assert ids == [202601 * ID_STRIDE + 1, 202602 * ID_STRIDE + 1, 202601 * ID_STRIDE + 2], ids
+        assert divmod(ids[1], ID_STRIDE) == (202602, 1)
+
+        single = sensor_partitions.insert_row(db, _row(2, 13.0, datetime(2026, 2, 2)))
+        db.commit()
+        assert single == 202602 * ID_STRIDE + 2
+
+        row = sensor_partitions.get_row(db, ids[1])
+        assert (row.id, row.value, row.timestamp) == (ids[1], 11.0, datetime(2026, 2, 1, 0, 1))
+        legacy = sensor_partitions.get_row(db, 1)
+        assert (legacy.id, legacy.value) == (1, 5.0)
+        assert sensor_partitions.get_row(db, 202312 * ID_STRIDE + 1) is None  # 不存在的分区
+        assert sensor_partitions.count_rows(db) == 5
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 全局ID编码测试通过")
+
+
+def test_get_partition_creates_table():
+    """get_partition 在分区不存在时建表，重新加载分区后仍能找到"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        assert sensor_partitions.load_partitions(db) == 0
+        table = sensor_partitions.get_partition(db, 202603)
+        assert table.name == "sensor_data_202603"
+        assert sensor_partitions.get_partition(db, 202603) is table
+        assert "sensor_data_202603" in inspect(test_engine).get_table_names()
+        assert sensor_partitions.partition_bounds(202612) == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+
+        sensor_partitions.clear_partition_cache()
+        assert sensor_partitions.load_partitions(db) == 1
+        assert [key for key, _ in sensor_partitions.partitions()] == [202603]
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 分区创建测试通过")
+
+
+def test_fetch_rows_across_month_boundary():
+    """跨月查询合并相邻分区和旧表的读数，按时间排序并正确应用 limit"""
+    test_engine = _open_database([_row(1, 1.0, datetime(2026, 1, 31, 12))])
+    db = SessionLocal()
+    try:
+        sensor_partitions.insert_rows(db, [
+            _row(1, 2.0, datetime(2026, 1, 31, 23, 59)),
+            _row(1, 3.0, datetime(2026, 2, 1, 0, 1)),
+            _row(2, 9.0, datetime(2026, 2, 1, 0, 2)),
+            _row(1, 4.0, datetime(2026, 3, 5)),
+        ])
+        db.commit()
+        start, end = datetime(2026, 1, 31), datetime(2026, 2, 1, 1)
+
+        rows = sensor_partitions.fetch_rows(db, [1], start, end)
+        assert [row.value for row in rows] == [1.0, 2.0, 3.0]
+        assert [row.id for row in rows] == [1, 202601 * ID_STRIDE + 1, 202602 * ID_STRIDE + 1]
+
+        rows = sensor_partitions.fetch_rows(db, [1], start, end, limit=2, newest_first=True)
+        assert [row.value for row in rows] == [3.0, 2.0]
+
+        rows = sensor_partitions.fetch_rows(db, None, start, end)
+        assert [row.value for row in rows] == [1.0, 2.0, 3.0, 9.0]
+        assert sensor_partitions.fetch_rows(db, [], start, end) == []
+
+        latest = sensor_partitions.latest_rows(db, [1, 2], before=datetime(2026, 3, 1))
+        assert latest[1].value == 3.0 and latest[2].value == 9.0
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 跨月查询测试通过")
+
+
+def test_prune_batch():
+    """每批最多删除 batch_size 条 cutoff 之前的读数（包括旧表），其他传感器和未过期读数保留"""
+    test_engine = _open_database([_row(1, 0.0, datetime(2025, 12, 1))])
+    db = SessionLocal()
+    try:
+        sensor_partitions.insert_rows(db, [
+            _row(1, 1.0, datetime(2026, 1, 1)),
+            _row(1, 2.0, datetime(2026, 1, 2)),
+            _row(1, 3.0, datetime(2026, 1, 3)),
+            _row(2, 4.0, datetime(2026, 1, 3)),
+            _row(1, 5.0, datetime(2026, 2, 10)),
+        ])
+        db.commit()
+        cutoff = datetime(2026, 2, 1)
+
+        deleted = []
+        while True:
+            count = sensor_partitions.prune_batch(db, [1], cutoff, batch_size=2)
+            db.commit()
+            if not count:
+                break
+            deleted.append(count)
+        assert deleted == [2, 1, 1], deleted
+
+        remaining = sensor_partitions.fetch_rows(db)
+        assert [(row.sensor_config_id, row.value) for row in remaining] == [(2, 4.0), (1, 5.0)]
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 批量删除过期读数测试通过")
+
+
+def test_drop_partitions_before():
+    """只删除结束时间不晚于 cutoff 的整月分区"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        sensor_partitions.insert_rows(db, [
+            _row(1, 1.0, datetime(2026, 1, 10)),
+            _row(1, 2.0, datetime(2026, 2, 10)),
+            _row(1, 3.0, datetime(2026, 3, 10)),
+        ])
+        db.commit()
+
+        dropped = sensor_partitions.drop_partitions_before(db, datetime(2026, 3, 1))
+        assert dropped == ["sensor_data_202601", "sensor_data_202602"], dropped
+        assert [key for key, _ in sensor_partitions.partitions()] == [202603]
+        table_names = inspect(test_engine).get_table_names()
+        assert "sensor_data_202601" not in table_names and "sensor_data_202603" in table_names
+        assert [row.value for row in sensor_partitions.fetch_rows(db)] == [3.0]
+
+        assert sensor_partitions.drop_partitions_before(db, datetime(2026, 3, 31)) == []
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 整月分区删除测试通过")
+
+
+def test_partition_dropped_by_other_process():
+    """分区表被其他进程删除后：查询跳过该分区，写入失败一次后重新建表"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        sensor_partitions.insert_rows(db, [
+            _row(1, 1.0, datetime(2026, 1, 10)),
+            _row(1, 2.0, datetime(2026, 2, 10)),
+        ])
+        db.commit()
+
+        # 模拟另一个进程的数据保留任务删除一月分区（本进程的分区缓存不变）
+        with test_engine.begin() as conn:
+            conn.execute(text("DROP TABLE sensor_data_202601"))
+
+        assert [row.value for row in sensor_partitions.fetch_rows(db)] == [2.0]
+        assert [key for key, _ in sensor_partitions.partitions()] == [202602]
+        db.commit()
+
+        with test_engine.begin() as conn:
+            conn.execute(text("DROP TABLE sensor_data_202602"))
+        try:
+            sensor_partitions.insert_rows(db, [_row(1, 3.0, datetime(2026, 2, 11))])
+            assert False, "写入已删除的分区应当失败"
+        except OperationalError:
+            db.rollback()
+        assert sensor_partitions.partitions() == []
+
+        # 写缓冲重试时重新创建分区
+        ids = sensor_partitions.insert_rows(db, [_row(1, 3.0, datetime(2026, 2, 11))])
+        db.commit()
+        assert ids == [202602 * ID_STRIDE + 1]
+        assert sensor_partitions.count_rows(db) == 1
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 分区被其他进程删除测试通过")
+
+
+def test_partition_created_by_other_process():
+    """其他进程新建的分区：查询、按ID读取、计数和删除读数时都能看到"""
+    test_engine = _open_database()
+    db = SessionLocal()
+    try:
+        sensor_partitions.insert_rows(db, [_row(1, 1.0, datetime(2026, 1, 10))])
+        db.commit()
+
+        # 另一个进程写入了本进程还没有缓存的 2026-05 分区
+        conn = sqlite3.connect(test_engine.url.database)
+        conn.execute(
+            "CREATE TABLE sensor_data_202605 (id INTEGER PRIMARY KEY, sensor_config_id INTEGER NOT NULL, "
+            "value FLOAT NOT NULL, timestamp DATETIME NOT NULL, alert_status VARCHAR)"
+        )
+        conn.execute("INSERT INTO sensor_data_202605 VALUES (1, 1, 5.0, '2026-05-02 00:00:00.000000', 'normal')")
+        conn.commit()
+        conn.close()
+
+        row = sensor_partitions.get_row(db, 202605 * ID_STRIDE + 1)
+        assert row is not None and row.value == 5.0
+        assert [row.value for row in sensor_partitions.fetch_rows(db, [1])] == [1.0, 5.0]
+        assert sensor_partitions.count_rows(db) == 2
+        assert sensor_partitions.delete_config_rows(db, [1]) == 2
+        db.commit()
+        assert sensor_partitions.count_rows(db) == 0
+    finally:
+        db.close()
+        _close_database(test_engine)
+    print("✅ 分区由其他进程创建测试通过")
+
+
+if __name__ == "__main__":
+    test_global_id_encoding()
+    test_get_partition_creates_table()
+    test_fetch_rows_across_month_boundary()
+    test_prune_batch()
+    test_drop_partitions_before()
+    test_partition_dropped_by_other_process()
+    test_partition_created_by_other_process()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试传感器数据汇总：自动选择粒度的边界、内存汇总、增量更新合并到已有汇总、按汇总粒度返回的历史数据ID
+
+增量更新使用临时SQLite数据库，无需已有的数据库文件。
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models import DeviceModel, SensorConfigModel
+from models.sensor_rollup import SensorRollupModel
+from schemas.sensor import SensorData
+from services import sensor_partitions, sensor_rollups, sensor_service
+from services.sensor_rollups import (
+    HOURLY_MAX_SPAN,
+    RAW_MAX_SPAN,
+    RESOLUTION_DAY,
+    RESOLUTION_HOUR,
+    RESOLUTION_MINUTE,
+    RESOLUTION_RAW,
+)
+
+START = datetime(2026, 3, 1, 0, 0, 0)
+
+
+def test_choose_resolution_boundaries():
+    """不超过 2 天返回原始读数，不超过 90 天使用小时汇总，更长使用天汇总（边界值包含在较细的粒度内）"""
+    choose = sensor_rollups.choose_resolution
+    second = timedelta(seconds=1)
+    assert choose(None, START) == RESOLUTION_RAW
+    assert choose(START, START + RAW_MAX_SPAN) == RESOLUTION_RAW
+    assert choose(START, START + RAW_MAX_SPAN + second) == RESOLUTION_HOUR
+    assert choose(START, START + timedelta(days=7)) == RESOLUTION_HOUR
+    assert choose(START, START + HOURLY_MAX_SPAN) == RESOLUTION_HOUR
+    assert choose(START, START + HOURLY_MAX_SPAN + second) == RESOLUTION_DAY
+    # 没有结束时间时按当前时间计算
+    assert choose(datetime.utcnow() - timedelta(days=1), None) == RESOLUTION_RAW
+    assert choose(datetime.utcnow() - timedelta(days=30), None) == RESOLUTION_HOUR
+    print("✅ 自动选择粒度边界测试通过")
+
+
+def test_aggregate():
+    """同一时间段的读数合并为一行，last_value 取时间最晚的读数（与到达顺序无关）"""
+    readings = [
+        (1, 10.0, START + timedelta(minutes=0, seconds=30)),
+        (1, 30.0, START + timedelta(minutes=0, seconds=50)),
+        (1, 20.0, START + timedelta(minutes=0, seconds=10)),  # 乱序到达的较早读数
+        (1, 5.0, START + timedelta(minutes=1)),
+        (2, 7.0, START + timedelta(hours=1)),
+    ]
+    rows = {(row["resolution"], row["sensor_config_id"], row["bucket"]): row for row in sensor_rollups.aggregate(readings)}
+    assert len(rows) == 4 + 3  # 配置1：两个分钟段、一个小时段、一个天段；配置2：各一个
+
+    minute = rows[(RESOLUTION_MINUTE, 1, START)]
+    assert (minute["sample_count"], minute["value_sum"], minute["value_min"], minute["value_max"]) == (3, 60.0, 10.0, 30.0)
+    assert (minute["last_value"], minute["last_timestamp"]) == (30.0, START + timedelta(seconds=50))
+
+    hour = rows[(RESOLUTION_HOUR, 1, START)]
+    assert (hour["sample_count"], hour["value_min"], hour["last_value"]) == (4, 5.0, 5.0)
+    assert rows[(RESOLUTION_DAY, 2, START)]["sample_count"] == 1
+    assert sensor_rollups.aggregate([]) == []
+    print("✅ 内存汇总测试通过")
+
+
+def test_apply_rows_merges_existing():
+    """增量更新与已有汇总合并：条数和总和累加、最值取两者、last_value 只被更晚的读数覆盖"""
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'rollups.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    db = SessionLocal()
+    try:
+        def row(value, timestamp):
+            return {"sensor_config_id": 1, "value": value, "timestamp": timestamp}
+
+        assert sensor_rollups.apply_rows(db, [row(10.0, START + timedelta(minutes=5)), row(14.0, START + timedelta(minutes=20))]) == 4
+        db.commit()
+        # 第二批：一条更晚的读数和一条乱序到达的更早读数
+        sensor_rollups.apply_rows(db, [row(2.0, START + timedelta(minutes=30)), row(40.0, START + timedelta(minutes=1))])
+        db.commit()
+        # 第三批只有更早的读数，不改变 last_value
+        sensor_rollups.apply_rows(db, [row(8.0, START + timedelta(minutes=2))])
+        db.commit()
+        assert sensor_rollups.apply_rows(db, []) == 0
+
+        hour = db.query(SensorRollupModel).filter_by(resolution=RESOLUTION_HOUR, sensor_config_id=1).one()
+        assert (hour.bucket, hour.sample_count, hour.value_sum) == (START, 5, 74.0)
+        assert (hour.value_min, hour.value_max) == (2.0, 40.0)
+        assert (hour.last_value, hour.last_timestamp) == (2.0, START + timedelta(minutes=30))
+
+        minutes = sensor_rollups.fetch_rollups(db, [1], RESOLUTION_MINUTE)
+        assert [r.bucket.minute for r in minutes] == [1, 2, 5, 20, 30]
+        assert [r.bucket.minute for r in sensor_rollups.fetch_rollups(db, [1], RESOLUTION_MINUTE, limit=2)] == [20, 30]
+        assert db.query(SensorRollupModel).filter_by(resolution=RESOLUTION_DAY).one().sample_count == 5
+    finally:
+        db.close()
+        bind_engine()
+        sensor_partitions.clear_partition_cache()
+        test_engine.dispose()
+    print("✅ 增量汇总合并测试通过")
+
+
+def test_rollup_history_ids():
+    """按汇总粒度返回的历史数据：ID 带粒度前缀，不与原始读数ID重复，并返回 resolution"""
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'rollups.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    db = SessionLocal()
+    try:
+        device = DeviceModel(name="rollup_dev1", device_type="sensor")
+        db.add(device)
+        db.flush()
+        config = SensorConfigModel(device_id=device.id, type="temperature", unit="°C")
+        db.add(config)
+        db.commit()
+        rows = [{"sensor_config_id": config.id, "value": value, "timestamp": START + timedelta(minutes=i)}
+                for i, value in enumerate([10.0, 20.0])]
+        raw_ids = sensor_partitions.insert_rows(db, [dict(row, alert_status="normal") for row in rows])
+        sensor_rollups.apply_rows(db, rows)
+        db.commit()
+
+        points = sensor_service.get_device_sensor_rollups(db, device.id, RESOLUTION_HOUR)
+        assert len(points) == 1
+        point = SensorData.model_validate(points[0])
+        assert point.resolution == RESOLUTION_HOUR and point.value == 15.0 and point.sample_count == 2
+        assert point.id == f"{RESOLUTION_HOUR}:{db.query(SensorRollupModel).filter_by(resolution=RESOLUTION_HOUR).one().id}"
+        assert point.id not in raw_ids
+
+        raw = SensorData.model_validate(sensor_service.get_device_sensors_by_time_range(db, device.id)[0])
+        assert raw.id == raw_ids[0] and raw.resolution is None
+    finally:
+        db.close()
+        bind_engine()
+        sensor_partitions.clear_partition_cache()
+        test_engine.dispose()
+    print("✅ 汇总历史数据ID测试通过")
+
+
+if __name__ == "__main__":
+    test_choose_resolution_boundaries()
+    test_aggregate()
+    test_apply_rows_merges_existing()
+    test_rollup_history_ids()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试共享订阅模式：多个后端实例使用同一分组时，消息被分摊而不是重复入库
+
+使用本地的模拟MQTT服务器（按 $share 分组轮询投递）和临时SQLite数据库，无需真实的EMQX。
+"""
+import sys
+import os
+import tempfile
+import time
+import itertools
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import paho.mqtt.client as paho_mqtt
+
+from core.config import settings
+from core.database import Base, SessionLocal, bind_engine, create_database_engine
+from models import DeviceModel
+from models.mqtt_config import MQTTConfigModel
+from models.topic_config import TopicConfigModel
+from services import mqtt_broker, sensor_config_service, topic_config_service, sensor_partitions
+from services.mqtt_service import MQTTService
+
+SHARED_GROUP = "ingest"
+INSTANCES = 3
+MESSAGES = 60
+
+
+class FakeBroker:
+    """本地模拟MQTT服务器：普通订阅每个客户端都收到，同一 $share 分组内轮询投递给一个客户端"""
+
+    def __init__(self):
+        self.subscriptions = []  # (client, 主题过滤器, 分组)
+        self._round_robin = {}
+
+    def subscribe(self, client, topic_filter):
+        group = None
+        if topic_filter.startswith("$share/"):
+            _, group, topic_filter = topic_filter.split("/", 2)
+        self.subscriptions.append((client, topic_filter, group))
+
+    def publish(self, topic, payload):
+        plain, shared = [], {}
+        for client, topic_filter, group in self.subscriptions:
+            if not paho_mqtt.topic_matches_sub(topic_filter, topic):
+                continue
+            if group is None:
+                plain.append(client)
+            else:
+                shared.setdefault((group, topic_filter), []).append(client)
+        receivers = list(plain)
+        for key, members in shared.items():
+            counter = self._round_robin.setdefault(key, itertools.count())
+            receivers.append(members[next(counter) % len(members)])
+        message = paho_mqtt.MQTTMessage(topic=topic.encode())
+        message.payload = payload.encode()
+        for client in receivers:
+            client.on_message(client, None, message)
+
+
+class FakeClient:
+    """替代 paho 客户端，连接到本地模拟服务器"""
+    broker: FakeBroker = None
+
+    def __init__(self, client_id="", clean_session=None, **kwargs):
+        self.client_id = client_id
+        self.clean_session = clean_session
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_connect_fail = None
+        self.on_message = None
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        pass
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topics, qos=0):
+        for topic, _ in topics:
+            self.broker.subscribe(self, topic)
+        return paho_mqtt.MQTT_ERR_SUCCESS, 1
+
+
+def test_shared_subscription():
+    tmp_dir = tempfile.mkdtemp()
+    test_engine = create_database_engine(f"sqlite:///{os.path.join(tmp_dir, 'shared.db')}")
+    Base.metadata.create_all(bind=test_engine)
+    bind_engine(test_engine)
+    topic_config_service.invalidate_routing_table()
+    sensor_config_service.invalidate_sensor_config_cache()
+
+    original_client = mqtt_broker.mqtt.Client
+    original_group = settings.mqtt_shared_group
+    original_client_id = settings.mqtt_client_id
+    original_session_dir = settings.mqtt_session_dir
+    FakeClient.broker = FakeBroker()
+    mqtt_broker.mqtt.Client = FakeClient
+    settings.mqtt_shared_group = SHARED_GROUP
+    settings.mqtt_session_dir = os.path.join(tmp_dir, "mqtt_session")
+    services = []
+    try:
+        db = SessionLocal()
+        mqtt_config = MQTTConfigModel(name="local", server="127.0.0.1", port=1883, is_active=True)
+        db.add(mqtt_config)
+        db.commit()
+        db.add(TopicConfigModel(
+            name="shared", subscribe_topics="sensors/+/data", is_active=True, mqtt_config_id=mqtt_config.id
+        ))
+        db.commit()
+        db.close()
+
+        # 模拟 INSTANCES 个后端进程
+        for index in range(INSTANCES):
+            # 每个进程使用不同的固定客户端ID，否则服务器会互相踢下线
+            settings.mqtt_client_id = f"shared-test-{index}"
+            service = MQTTService()
+            assert service.init_mqtt_client()
+            assert service.start()
+            services.append(service)
+
+        for broker in (b for s in services for b in s.brokers.values()):
+            assert broker.is_connected
+            assert broker.shared_group == SHARED_GROUP
+        client_ids = [b.client.client_id for s in services for b in s.brokers.values()]
+        assert len(set(client_ids)) == INSTANCES, client_ids
+        assert all(not b.client.clean_session for s in services for b in s.brokers.values())
+        filters = {topic_filter for _, topic_filter, group in FakeClient.broker.subscriptions if group == SHARED_GROUP}
+        assert filters == {"sensors/+/data"}, filters
+
+        for i in range(MESSAGES):
+            FakeClient.broker.publish(f"sensors/dev{i % 4}/data", f'{{"temperature": {20 + i}}}')
+
+        deadline = time.time() + 10
+        while time.time() < deadline and any(s.pipeline.processed < s.pipeline.submitted for s in services):
+            time.sleep(0.05)
+        for service in services:
+            service.write_buffer.flush()
+
+        received = [service.pipeline.submitted for service in services]
+        print(f"各实例收到的消息数: {received}")
+        assert sum(received) == MESSAGES
+        assert all(count > 0 for count in received)
+
+        db = SessionLocal()
+        stored = sensor_partitions.count_rows(db)
+        devices = db.query(DeviceModel).count()
+        db.close()
+        print(f"入库读数: {stored}，设备: {devices}")
+        assert stored == MESSAGES, f"期望 {MESSAGES} 条读数，实际 {stored} 条（存在重复或丢失）"
+        assert devices == 4
+    finally:
+        for service in services:
+            service.stop()
+        mqtt_broker.mqtt.Client = original_client
+        settings.mqtt_shared_group = original_group
+        settings.mqtt_client_id = original_client_id
+        settings.mqtt_session_dir = original_session_dir
+        bind_engine()
+        topic_config_service.invalidate_routing_table()
+        sensor_config_service.invalidate_sensor_config_cache()
+        sensor_partitions.clear_partition_cache()
+        test_engine.dispose()
+
+    print("✅ 测试通过")
+
+
+if __name__ == "__main__":
+    test_shared_subscription()
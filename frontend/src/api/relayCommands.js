@@ -0,0 +1,13 @@
+import axios from 'axios'
+
+// 查询继电器命令的确认结果（command_id -> 状态），请求失败返回 null
+// expectedStates: 继电器期望状态表（Map，值中带 commandId）
+export const fetchRelayCommandStatuses = async (expectedStates) => {
+  const params = new URLSearchParams()
+  expectedStates.forEach(exp => { if (exp.commandId) params.append('command_id', exp.commandId) })
+  if (!params.has('command_id')) return new Map()
+  try {
+    const res = await axios.get(`/api/mqtt-publish/relay/commands?${params}`)
+    return new Map(res.data.map(c => [c.command_id, c.status]))
+  } catch (e) { return null }
+}